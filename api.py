@@ -0,0 +1,282 @@
+"""HTTP API over the PaperScope services.
+
+Run with ``VECTOR_STORE_BACKEND=numpy uvicorn api:app --workers 4``.
+Workers share the job table, vector store, embedding cache and judge
+store on disk, so any worker can answer for any indexed document and any
+worker's job threads may pick up queued work. The Chroma backend cannot
+be shared between processes: with it, only one process (one worker, and
+no Streamlit app on the same data) may run, and startup fails otherwise.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+
+from services.aio import on_client_loop, run_blocking
+from services.embedding_client import cache_stats
+from services.eval_service import arun_qa_evaluation, arun_summary_evaluation
+from services.gemini_client import DEFAULT_MODEL
+from services.jobs import Job, get_job_queue, submit_document, upload_path
+from services.llm_provider import get_provider
+from services.llm_scheduler import scheduler_metrics
+from services.pdf_parser import parse_document
+from services.rag_indexer import is_index_current, list_indexed_documents
+from services.rag_qa import aanswer_corpus_question_with_debug, aanswer_question_with_debug
+from services.vector_store import VECTOR_STORE_BACKEND, check_environment, claim_chroma_dir
+
+
+API_MAX_UPLOAD_BYTES = int(os.getenv("API_MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+# Longest a GET /summary?wait=... request may hold the connection.
+API_MAX_WAIT_SECONDS = float(os.getenv("API_MAX_WAIT_SECONDS", "60"))
+_WAIT_POLL_SECONDS = 0.5
+
+app = FastAPI(title="PaperScope API")
+
+
+class AskRequest(BaseModel):
+    question: str
+    history: List[Dict[str, str]] = Field(default_factory=list)
+    stream: bool = False
+
+
+class CorpusAskRequest(AskRequest):
+    doc_ids: Optional[List[str]] = None
+
+
+class SummaryEvalRequest(BaseModel):
+    doc_id: str
+    # Defaults to the document's latest finished summary.
+    summary: Optional[str] = None
+    use_judge: bool = True
+
+
+class QAEvalRequest(BaseModel):
+    items: List[Dict[str, Any]]
+    use_judge: bool = True
+
+
+@app.on_event("startup")
+async def _startup() -> None:
+    check_environment()
+    if VECTOR_STORE_BACKEND == "chroma" and not claim_chroma_dir():
+        raise RuntimeError(
+            "Another process is using the Chroma data directory. Run a single "
+            "process or set VECTOR_STORE_BACKEND=numpy."
+        )
+    # Start this worker's job threads so queued jobs are picked up.
+    await run_blocking(get_job_queue)
+    try:
+        await on_client_loop(get_provider().awarm_up(DEFAULT_MODEL, 0.2))
+    except Exception as exc:  # noqa: BLE001
+        print(f"Gemini warm-up skipped: {exc}")
+
+
+def _job_payload(job: Optional[Job]) -> Optional[Dict[str, Any]]:
+    if job is None:
+        return None
+    payload = asdict(job)
+    payload["finished"] = job.finished
+    return payload
+
+
+def _require_upload(doc_id: str) -> None:
+    if not upload_path(doc_id).exists():
+        raise HTTPException(status_code=404, detail=f"Unknown document: {doc_id}")
+
+
+def _ndjson(event: Dict[str, Any]) -> bytes:
+    return (json.dumps(event, default=str) + "\n").encode("utf-8")
+
+
+async def _stream_answer(
+    answer: Callable[[Callable[[str], None]], Awaitable[Dict[str, object]]],
+) -> AsyncIterator[bytes]:
+    """Yield ``delta`` events as the answer streams, then the full ``answer``.
+
+    The final answer is authoritative: the reference check may replace
+    the streamed text.
+    """
+    loop = asyncio.get_running_loop()
+    updates: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    task = asyncio.ensure_future(
+        answer(lambda text: loop.call_soon_threadsafe(updates.put_nowait, text))
+    )
+    task.add_done_callback(lambda _: updates.put_nowait(None))
+    sent = ""
+    try:
+        while True:
+            text = await updates.get()
+            if text is None:
+                break
+            delta = text[len(sent):] if text.startswith(sent) else text
+            sent = text
+            if delta:
+                yield _ndjson({"event": "delta", "text": delta})
+        yield _ndjson({"event": "answer", **task.result()})
+    except Exception as exc:  # noqa: BLE001
+        yield _ndjson({"event": "error", "detail": f"{type(exc).__name__}: {exc}"})
+    finally:
+        task.cancel()
+
+
+async def _respond(
+    answer: Callable[[Optional[Callable[[str], None]]], Awaitable[Dict[str, object]]],
+    stream: bool,
+) -> Any:
+    if stream:
+        return StreamingResponse(_stream_answer(answer), media_type="application/x-ndjson")
+    return await answer(None)
+
+
+@app.get("/health")
+async def health() -> Dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics() -> Dict[str, Any]:
+    return {"scheduler": scheduler_metrics(), "embedding_cache": cache_stats()}
+
+
+@app.post("/documents", status_code=202)
+async def upload_document(file: UploadFile = File(...)) -> Dict[str, Any]:
+    """Store a PDF and start indexing and summarizing it."""
+    pdf_bytes = await file.read(API_MAX_UPLOAD_BYTES + 1)
+    if len(pdf_bytes) > API_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="PDF is too large.")
+    if not pdf_bytes.startswith(b"%PDF"):
+        raise HTTPException(status_code=400, detail="Upload is not a PDF.")
+    jobs = await run_blocking(submit_document, pdf_bytes, title=file.filename)
+    return {
+        "doc_id": jobs["index"].doc_id,
+        "jobs": {kind: _job_payload(job) for kind, job in jobs.items()},
+    }
+
+
+@app.get("/documents")
+async def list_documents() -> List[Dict[str, Any]]:
+    """Every document with a current index."""
+    return await run_blocking(list_indexed_documents)
+
+
+@app.post("/documents/{doc_id}/index", status_code=202)
+async def build_index(doc_id: str, force: bool = False) -> Dict[str, Any]:
+    """Queue (or return the existing) index job for an uploaded document."""
+    _require_upload(doc_id)
+    job = await run_blocking(
+        get_job_queue().submit, "index", doc_id, upload_path(doc_id), force=force
+    )
+    return _job_payload(job)
+
+
+@app.get("/documents/{doc_id}/index")
+async def index_status(doc_id: str) -> Dict[str, Any]:
+    indexed, job = await asyncio.gather(
+        run_blocking(is_index_current, doc_id),
+        run_blocking(get_job_queue().latest, doc_id, "index"),
+    )
+    return {"doc_id": doc_id, "indexed": indexed, "job": _job_payload(job)}
+
+
+@app.post("/documents/{doc_id}/summary", status_code=202)
+async def regenerate_summary(doc_id: str) -> Dict[str, Any]:
+    """Queue a fresh summary job, ignoring any finished one."""
+    _require_upload(doc_id)
+    job = await run_blocking(
+        get_job_queue().submit, "summary", doc_id, upload_path(doc_id), force=True
+    )
+    return _job_payload(job)
+
+
+@app.get("/documents/{doc_id}/summary")
+async def get_summary(doc_id: str, wait: float = 0.0) -> JSONResponse:
+    """Return the summary, or 202 with the partial text while it is generated.
+
+    Starts a summary job if the document has none. ``wait`` holds the
+    request for up to that many seconds for the job to finish.
+    """
+    _require_upload(doc_id)
+    queue = get_job_queue()
+    job = await run_blocking(queue.submit, "summary", doc_id, upload_path(doc_id))
+    deadline = asyncio.get_running_loop().time() + min(max(wait, 0.0), API_MAX_WAIT_SECONDS)
+    while not job.finished and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(_WAIT_POLL_SECONDS)
+        job = await run_blocking(queue.get, job.id) or job
+    payload = {"doc_id": doc_id, "summary": job.result, "job": _job_payload(job)}
+    return JSONResponse(payload, status_code=200 if job.finished else 202)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> Dict[str, Any]:
+    job = await run_blocking(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return _job_payload(job)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    """Cancel a queued job, or ask a running one to stop."""
+    queue = get_job_queue()
+    cancelled = await run_blocking(queue.cancel, job_id)
+    job = await run_blocking(queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return {"cancelled": cancelled, "job": _job_payload(job)}
+
+
+@app.post("/documents/{doc_id}/ask")
+async def ask(doc_id: str, request: AskRequest) -> Any:
+    """Answer a question about one document; ``stream`` returns NDJSON events."""
+    if not await run_blocking(is_index_current, doc_id):
+        raise HTTPException(status_code=409, detail="Document is not indexed yet.")
+    return await _respond(
+        lambda on_partial: aanswer_question_with_debug(
+            doc_id,
+            request.question,
+            request.history,
+            on_partial=on_partial,
+        ),
+        request.stream,
+    )
+
+
+@app.post("/ask")
+async def ask_corpus(request: CorpusAskRequest) -> Any:
+    """Answer a question across every indexed document (or ``doc_ids``)."""
+    return await _respond(
+        lambda on_partial: aanswer_corpus_question_with_debug(
+            request.question,
+            request.history,
+            doc_ids=request.doc_ids,
+            on_partial=on_partial,
+        ),
+        request.stream,
+    )
+
+
+@app.post("/eval/summary")
+async def evaluate_summary(request: SummaryEvalRequest) -> Dict[str, Any]:
+    _require_upload(request.doc_id)
+    summary = request.summary
+    if summary is None:
+        job = await run_blocking(get_job_queue().latest, request.doc_id, "summary")
+        if job is None or job.status != "done" or not job.result:
+            raise HTTPException(status_code=409, detail="No finished summary to evaluate.")
+        summary = job.result
+    path = upload_path(request.doc_id)
+    parsed = await run_blocking(lambda: parse_document(path.read_bytes(), request.doc_id))
+    return await arun_summary_evaluation(summary, parsed.full_text, request.use_judge)
+
+
+@app.post("/eval/qa")
+async def evaluate_qa(request: QAEvalRequest) -> Dict[str, Any]:
+    """Score Q&A items with ``question``, ``answer`` and ``retrieved_chunks``."""
+    return await arun_qa_evaluation(request.items, request.use_judge)
@@ -1,16 +1,19 @@
 from __future__ import annotations
 
-import hashlib
-from io import BytesIO
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import streamlit as st
 
-from services.pdf_parser import extract_pages_from_pdf, extract_text_from_pdf
+from services.answer_format import NOT_FOUND_ANSWER
+from services.embedding_client import cache_stats
+from services.pdf_parser import compute_doc_id, parse_document
 from services.eval_service import run_qa_evaluation, run_summary_evaluation
-from services.rag_indexer import index_document
-from services.rag_qa import answer_question_with_debug
-from services.summarizer import summarize_whitepaper
+from services.gemini_client import warm_up
+from services.jobs import Job, get_job_queue, submit_document
+from services.llm_scheduler import scheduler_metrics
+from services.rag_indexer import is_index_current
+from services.rag_qa import answer_corpus_question_with_debug, answer_question_with_debug
+from services.vector_store import check_environment
 
 
 def _init_session_state() -> None:
@@ -28,10 +31,22 @@ def _init_session_state() -> None:
         st.session_state["qa_debug"] = []
     if "eval_report" not in st.session_state:
         st.session_state["eval_report"] = {}
+    if "jobs" not in st.session_state:
+        st.session_state["jobs"] = {}
+
+
+@st.cache_resource
+def _startup() -> None:
+    """Run one-time process setup shared by all sessions."""
+    check_environment()
+    try:
+        warm_up()
+    except Exception as exc:  # noqa: BLE001
+        print(f"Gemini warm-up skipped: {exc}")
 
 
 def _compute_doc_id(file_bytes: bytes) -> str:
-    return hashlib.sha256(file_bytes).hexdigest()[:16]
+    return compute_doc_id(file_bytes)
 
 
 def _get_recent_history(
@@ -49,6 +64,60 @@ def _get_recent_history(
     return list(reversed(recent))
 
 
+def _current_job(kind: str) -> Optional[Job]:
+    job_id = st.session_state["jobs"].get(kind)
+    return get_job_queue().get(job_id) if job_id else None
+
+
+def _render_job(kind: str) -> None:
+    """Show a background job's progress; rerun the app once its result lands."""
+    job = _current_job(kind)
+    if job is None:
+        return
+    if not job.finished:
+        total = job.progress_total or 0
+        label = f"{kind.title()} job {job.status}"
+        if kind == "index" and total:
+            label += f": {job.progress_done}/~{total} chunks embedded"
+        elif kind == "summary" and total > 1 and not job.result:
+            label += f": {job.progress_done}/{total} segments summarized"
+        fraction = min(1.0, job.progress_done / total) if total else 0.0
+        st.progress(fraction, text=label)
+        if kind == "summary" and job.result:
+            st.text(job.result)
+        if st.button("Cancel", key=f"cancel_{kind}_job"):
+            get_job_queue().cancel(job.id)
+    elif job.status == "done":
+        if kind == "summary" and st.session_state["summary_output"] != job.result:
+            st.session_state["summary_output"] = job.result
+            st.rerun()
+        if kind == "index" and not st.session_state["indexed"]:
+            st.session_state["indexed"] = True
+            st.rerun()
+    elif job.status == "failed":
+        st.error(f"{kind.title()} job failed: {job.error}")
+    else:
+        st.warning(f"{kind.title()} job cancelled.")
+
+
+def _job_panel(kind: str) -> None:
+    """Render ``_render_job`` in a fragment that polls while the job runs."""
+    job = _current_job(kind)
+    active = job is not None and not job.finished
+    st.fragment(run_every=1.0 if active else None)(_render_job)(kind)
+
+
+def _submit_job(kind: str, *, force: bool = False) -> None:
+    job = get_job_queue().submit(
+        kind,
+        st.session_state["doc_id"],
+        st.session_state["upload_path"],
+        title=st.session_state.get("uploaded_file_name"),
+        force=force,
+    )
+    st.session_state["jobs"][kind] = job.id
+
+
 def reset_app_state() -> None:
     keys_to_clear = [
         "doc_id",
@@ -62,6 +131,8 @@ def reset_app_state() -> None:
         "chat_history",
         "qa_debug",
         "eval_report",
+        "jobs",
+        "upload_path",
     ]
     for key in keys_to_clear:
         if key in st.session_state:
@@ -74,6 +145,7 @@ st.set_page_config(page_title="Whitepaper Intelligence - MVP")
 # which conflicts with chromadb==0.3.23 (pydantic<2).
 st.title("Whitepaper Intelligence - MVP")
 
+_startup()
 _init_session_state()
 
 st.header("File Upload")
@@ -97,41 +169,36 @@ if uploaded_file:
     if doc_id != st.session_state["doc_id"]:
         st.session_state["doc_id"] = doc_id
         st.session_state["file_bytes"] = file_bytes
-        st.session_state["indexed"] = False
+        st.session_state["uploaded_file_name"] = uploaded_file.name
+        st.session_state["indexed"] = is_index_current(doc_id)
         st.session_state["chat_history"] = []
         st.session_state["summary_output"] = None
         st.session_state["qa_debug"] = []
         st.session_state["eval_report"] = {}
+        # Indexing and summarization start right away in the background.
+        jobs = submit_document(file_bytes, title=uploaded_file.name)
+        st.session_state["upload_path"] = jobs["summary"].source
+        st.session_state["jobs"] = {kind: job.id for kind, job in jobs.items()}
 
 summary_tab, qa_tab, eval_tab = st.tabs(["Summary", "Q&A", "Evaluation"])
 
 with summary_tab:
     st.header("Generate Summary")
-    generate_clicked = st.button("Generate Summary", type="primary")
-
-    st.header("Summary Output Display")
-    output_container = st.empty()
-
+    generate_clicked = st.button(
+        "Regenerate Summary" if st.session_state.get("summary_output") else "Generate Summary",
+        type="primary",
+    )
     if generate_clicked:
         if not st.session_state["file_bytes"]:
             st.error("Please upload a PDF file before generating a summary.")
         else:
-            try:
-                with st.spinner("Extracting text from PDF..."):
-                    whitepaper_text = extract_text_from_pdf(
-                        BytesIO(st.session_state["file_bytes"])
-                    )
-                if not whitepaper_text:
-                    st.error("No text could be extracted from the PDF.")
-                else:
-                    with st.spinner("Generating summary with Gemini..."):
-                        summary = summarize_whitepaper(whitepaper_text)
-                    st.session_state["summary_output"] = summary
-                    output_container.text(summary)
-            except Exception as exc:
-                st.error(f"An error occurred: {exc}")
-    elif st.session_state.get("summary_output"):
-        output_container.text(st.session_state["summary_output"])
+            st.session_state["summary_output"] = None
+            _submit_job("summary", force=True)
+
+    st.header("Summary Output Display")
+    _job_panel("summary")
+    if st.session_state.get("summary_output"):
+        st.text(st.session_state["summary_output"])
 
 with qa_tab:
     st.header("Build Q&A Index")
@@ -141,19 +208,26 @@ with qa_tab:
         disabled=not bool(st.session_state["file_bytes"]),
     )
     if build_clicked:
-        try:
-            with st.spinner("Indexing document for Q&A..."):
-                pages = extract_pages_from_pdf(
-                    BytesIO(st.session_state["file_bytes"])
-                )
-                index_document(st.session_state["doc_id"], pages)
-                st.session_state["indexed"] = True
-            st.success("Q&A index built successfully.")
-        except Exception as exc:
-            st.error(f"Failed to build index: {exc}")
+        _submit_job("index")
+    _job_panel("index")
+    if st.session_state["indexed"]:
+        stats = cache_stats()
+        st.caption(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses")
+        embed_metrics = scheduler_metrics().get("embed")
+        if embed_metrics:
+            st.caption(
+                f"Embedding requests: {embed_metrics['admitted']} sent, "
+                f"{embed_metrics['throttled']} throttled, "
+                f"p95 queue wait {embed_metrics['wait_p95_s']:.2f}s"
+            )
 
     st.header("Q&A Chat")
-    if not st.session_state["indexed"]:
+    corpus_mode = st.toggle(
+        "Search all indexed whitepapers",
+        value=False,
+        help="Answer from every previously indexed document, citing each source.",
+    )
+    if not st.session_state["indexed"] and not corpus_mode:
         st.info("Build the Q&A index before asking questions.")
 
     for msg in st.session_state["chat_history"]:
@@ -161,28 +235,37 @@ with qa_tab:
 
     question = st.chat_input("Ask a question about the whitepaper")
     if question:
-        if not st.session_state["indexed"]:
+        if not st.session_state["indexed"] and not corpus_mode:
             st.error("Please build the Q&A index first.")
         else:
             st.session_state["chat_history"].append(
                 {"role": "user", "content": question}
             )
             recent_history = _get_recent_history(st.session_state["chat_history"])
+            answer_container = st.chat_message("assistant").empty()
             with st.spinner("Searching the document..."):
                 try:
-                    result = answer_question_with_debug(
-                        st.session_state["doc_id"],
-                        question,
-                        recent_history,
-                    )
+                    if corpus_mode:
+                        result = answer_corpus_question_with_debug(
+                            question,
+                            recent_history,
+                            on_partial=answer_container.markdown,
+                        )
+                    else:
+                        result = answer_question_with_debug(
+                            st.session_state["doc_id"],
+                            question,
+                            recent_history,
+                            on_partial=answer_container.markdown,
+                        )
                 except Exception as exc:
                     result = {
-                        "answer_text": "Information not found in the document.",
+                        "answer_text": NOT_FOUND_ANSWER,
                         "retrieved_chunks": [],
                     }
                     st.error(f"Q&A failed: {exc}")
 
-            response = str(result.get("answer_text", "Information not found in the document."))
+            response = str(result.get("answer_text", NOT_FOUND_ANSWER))
             st.session_state["chat_history"].append(
                 {"role": "assistant", "content": response}
             )
@@ -191,9 +274,20 @@ with qa_tab:
                     "question": question,
                     "answer": response,
                     "retrieved_chunks": result.get("retrieved_chunks", []),
+                    "cache": result.get("cache", {"hit": False}),
+                    "context": result.get("context", {}),
                 }
             )
-            st.chat_message("assistant").write(response)
+            answer_container.write(response)
+            context_stats = result.get("context")
+            if context_stats:
+                st.caption(
+                    f"Context: {context_stats['blocks']} blocks, "
+                    f"{context_stats['context_tokens']} tokens "
+                    f"({context_stats['tokens_saved']} saved)"
+                )
+            if result.get("cache", {}).get("hit"):
+                st.caption(f"Answered from cache ({result['cache']['match']} match)")
 
 with eval_tab:
     st.header("Summary Evaluation")
@@ -207,9 +301,10 @@ with eval_tab:
         else:
             try:
                 with st.spinner("Evaluating summary..."):
-                    whitepaper_text = extract_text_from_pdf(
-                        BytesIO(st.session_state["file_bytes"])
-                    )
+                    whitepaper_text = parse_document(
+                        st.session_state["file_bytes"],
+                        st.session_state["doc_id"],
+                    ).full_text
                     report = run_summary_evaluation(
                         st.session_state["summary_output"],
                         whitepaper_text,
@@ -230,8 +325,10 @@ with eval_tab:
             st.error("Failures:")
             st.write(summary_report["failures"])
         if summary_report.get("judge"):
-            st.write("Judge:")
+            st.write("Judge (stored result):" if summary_report.get("judge_cached") else "Judge:")
             st.json(summary_report["judge"])
+        if summary_report.get("judge_error"):
+            st.warning(summary_report["judge_error"])
 
     st.header("Q&A Evaluation")
     eval_qa_clicked = st.button("Evaluate Q&A", type="secondary")
@@ -277,10 +374,13 @@ with eval_tab:
                     st.write(item["failures"])
                 st.write("Retrieved Chunks:")
                 for chunk in item.get("retrieved_chunks", []):
+                    source = f"{chunk['title']} | " if chunk.get("title") else ""
                     st.write(
-                        f"Page {chunk.get('page')} | Section: {chunk.get('section')}"
+                        f"{source}Page {chunk.get('page')} | Section: {chunk.get('section')}"
                     )
                     st.write(chunk.get("text", ""))
                 if item.get("judge"):
-                    st.write("Judge:")
+                    st.write("Judge (stored result):" if item.get("judge_cached") else "Judge:")
                     st.json(item["judge"])
+                if item.get("judge_error"):
+                    st.warning(item["judge_error"])
@@ -0,0 +1,108 @@
+"""Load-test a running PaperScope API (see ``api.py``).
+
+Uploads one synthetic whitepaper, waits for its index, then asks questions
+concurrently and reports throughput and latency like ``bench_end_to_end``.
+Start the server first, e.g. with LLM_PROVIDER=replay for an offline run.
+
+Usage: python -m benchmarks.bench_api [--url http://127.0.0.1:8000]
+           [--requests 200] [--concurrency 50] [--stream] [--output api.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import urllib.request
+import uuid
+from typing import Any, Dict, Optional
+
+from benchmarks.bench_end_to_end import QUESTIONS, _run_stage
+from benchmarks.synthetic_pdf import make_whitepaper_pdf
+
+
+def _request(
+    url: str,
+    *,
+    body: Optional[bytes] = None,
+    content_type: str = "application/json",
+    timeout: float = 300.0,
+) -> bytes:
+    request = urllib.request.Request(url, data=body, method="POST" if body is not None else "GET")
+    if body is not None:
+        request.add_header("Content-Type", content_type)
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.read()
+
+
+def _upload(base_url: str, pdf_bytes: bytes) -> Dict[str, Any]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="bench.pdf"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode("utf-8") + pdf_bytes + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return json.loads(
+        _request(
+            f"{base_url}/documents",
+            body=body,
+            content_type=f"multipart/form-data; boundary={boundary}",
+        )
+    )
+
+
+def _wait_for_index(base_url: str, doc_id: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = json.loads(_request(f"{base_url}/documents/{doc_id}/index"))
+        if status["indexed"]:
+            return
+        job = status.get("job") or {}
+        if job.get("status") in ("failed", "cancelled"):
+            raise RuntimeError(f"Index job {job['status']}: {job.get('error')}")
+        time.sleep(0.5)
+    raise TimeoutError(f"Document {doc_id} was not indexed within {timeout:.0f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--pages", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--stream", action="store_true", help="Ask for streamed answers.")
+    parser.add_argument("--index-timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    doc_id = _upload(base_url, make_whitepaper_pdf(args.pages, seed=args.seed))["doc_id"]
+    _wait_for_index(base_url, doc_id, args.index_timeout)
+
+    def _ask(question: str) -> None:
+        body = json.dumps({"question": question, "stream": args.stream}).encode("utf-8")
+        _request(f"{base_url}/documents/{doc_id}/ask", body=body)
+
+    rows = [
+        _run_stage(
+            "ask_stream" if args.stream else "ask",
+            [
+                lambda question=QUESTIONS[idx % len(QUESTIONS)]: _ask(question)
+                for idx in range(args.requests)
+            ],
+            args.concurrency,
+        )
+    ]
+    report = {
+        "config": vars(args),
+        "results": rows,
+        "server": json.loads(_request(f"{base_url}/metrics")),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
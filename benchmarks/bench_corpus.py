@@ -0,0 +1,96 @@
+"""Measure corpus search latency as the corpus outgrows the store pool.
+
+Indexes small synthetic whitepapers offline (replay provider, NumPy backend,
+temporary data directory) and times ``search_corpus`` at each corpus size.
+Sizes above ``CHROMA_COLLECTION_CACHE_SIZE`` (default 32) check that the
+pool holds the corpus while queries run instead of reopening stores;
+``--fixed-pool`` keeps the pool at its configured size for comparison.
+
+Usage: python -m benchmarks.bench_corpus [--docs 8 32 64 128] [--pages 4]
+           [--queries 50] [--fixed-pool] [--output corpus.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import nullcontext
+from typing import Any, Dict, List
+
+from benchmarks.bench_end_to_end import QUESTIONS, _percentile, _use_scratch_environment
+from benchmarks.synthetic_pdf import make_whitepaper_pdf
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    import services.corpus_search as corpus_search
+    from services import vector_store
+    from services.llm_provider import ReplayProvider, set_provider
+    from services.pdf_parser import iter_pages, parse_document
+    from services.rag_indexer import index_document
+
+    set_provider(ReplayProvider(latency="fixed:0", embed_latency="fixed:0", dim=args.dim))
+    if args.fixed_pool:
+        corpus_search.reserved_stores = lambda count: nullcontext()
+
+    doc_ids: List[str] = []
+    rows = []
+    for size in sorted(args.docs):
+        while len(doc_ids) < size:
+            pdf_bytes = make_whitepaper_pdf(args.pages, seed=len(doc_ids))
+            doc_id = parse_document(pdf_bytes).doc_id
+            index_document(doc_id, iter_pages(pdf_bytes, doc_id), title=f"doc-{len(doc_ids)}")
+            doc_ids.append(doc_id)
+        # Warm the query embeddings and the pool before timing.
+        for question in QUESTIONS:
+            corpus_search.search_corpus(question, doc_ids=doc_ids)
+        latencies = []
+        for idx in range(args.queries):
+            start = time.perf_counter()
+            corpus_search.search_corpus(QUESTIONS[idx % len(QUESTIONS)], doc_ids=doc_ids)
+            latencies.append(time.perf_counter() - start)
+        rows.append(
+            {
+                "docs": size,
+                "queries": args.queries,
+                "p50_ms": round(statistics.median(latencies) * 1000, 2),
+                "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+                "ms_per_doc": round(statistics.median(latencies) * 1000 / size, 3),
+                "pooled_stores": len(vector_store._stores),
+            }
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, nargs="+", default=[8, 32, 64, 128])
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--dim", type=int, default=768, help="Replay embedding dimension.")
+    parser.add_argument(
+        "--fixed-pool",
+        action="store_true",
+        help="Do not grow the store pool to the corpus size.",
+    )
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="paperscope-corpus-")
+    _use_scratch_environment(data_dir)
+    try:
+        rows = run(args)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {"config": vars(args), "results": rows}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Measure end-to-end throughput offline against the replay provider.
+
+Indexes, summarizes, questions and (optionally) judges synthetic whitepapers
+with LLM_PROVIDER=replay, so no network access is needed. All data goes to a
+temporary directory.
+
+Usage: python -m benchmarks.bench_end_to_end [--docs 4] [--pages 32]
+           [--latency lognormal:800:0.4] [--error-rate 0.02] [--output e2e.json]
+           [--async-concurrency 200]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List
+
+from benchmarks.synthetic_pdf import make_whitepaper_pdf
+
+
+QUESTIONS = [
+    "What is the total token supply?",
+    "How does the consensus mechanism reach finality?",
+    "Who audits the protocol?",
+    "How are validator rewards and slashing handled?",
+    "What does the governance proposal process look like?",
+]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _run_stage(
+    name: str,
+    tasks: List[Callable[[], Any]],
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Run tasks on a thread pool and summarize throughput and latency."""
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    def _timed(task: Callable[[], Any]) -> None:
+        start = time.perf_counter()
+        try:
+            task()
+        except Exception as exc:  # noqa: BLE001
+            errors.append(f"{type(exc).__name__}: {exc}")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        list(executor.map(_timed, tasks))
+    elapsed = time.perf_counter() - start
+    return {
+        "stage": name,
+        "ops": len(tasks),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "ops_per_s": round(len(tasks) / elapsed, 2) if elapsed else None,
+        "p50_s": round(statistics.median(latencies), 3) if latencies else None,
+        "p95_s": round(_percentile(latencies, 95), 3) if latencies else None,
+        "errors": len(errors),
+        "sample_errors": errors[:3],
+    }
+
+
+def _run_async_stage(
+    name: str,
+    tasks: List[Callable[[], Awaitable[Any]]],
+    concurrency: int,
+) -> Dict[str, Any]:
+    """Like ``_run_stage``, but awaits coroutines on one event loop."""
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def _timed(task: Callable[[], Awaitable[Any]]) -> None:
+        start = time.perf_counter()
+        try:
+            await task()
+        except Exception as exc:  # noqa: BLE001
+            errors.append(f"{type(exc).__name__}: {exc}")
+        latencies.append(time.perf_counter() - start)
+
+    async def _run_all() -> None:
+        from services.aio import gather_limited
+
+        await gather_limited(concurrency, [lambda task=task: _timed(task) for task in tasks])
+
+    start = time.perf_counter()
+    asyncio.run(_run_all())
+    elapsed = time.perf_counter() - start
+    return {
+        "stage": name,
+        "ops": len(tasks),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "ops_per_s": round(len(tasks) / elapsed, 2) if elapsed else None,
+        "p50_s": round(statistics.median(latencies), 3) if latencies else None,
+        "p95_s": round(_percentile(latencies, 95), 3) if latencies else None,
+        "errors": len(errors),
+        "sample_errors": errors[:3],
+    }
+
+
+def _use_scratch_environment(data_dir: str) -> None:
+    """Point every store at ``data_dir``; must run before services are imported."""
+    os.environ.setdefault("LLM_PROVIDER", "replay")
+    os.environ.setdefault("VECTOR_STORE_BACKEND", "numpy")
+    os.environ.setdefault("CHROMA_DIR", os.path.join(data_dir, "chroma"))
+    os.environ.setdefault("NUMPY_VECTOR_DIR", os.path.join(data_dir, "vectors"))
+    os.environ.setdefault("PARSED_DOC_CACHE_DIR", os.path.join(data_dir, "parsed"))
+    os.environ.setdefault("EMBED_CACHE_PATH", os.path.join(data_dir, "embeddings.sqlite3"))
+    os.environ.setdefault("EVAL_STORE_PATH", os.path.join(data_dir, "eval.sqlite3"))
+    os.environ.setdefault("ANSWER_CACHE_ENABLED", "0")
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    from services.llm_provider import ReplayProvider, set_provider
+    from services.pdf_parser import iter_pages, parse_document
+    from services.rag_indexer import index_document
+    from services.rag_qa import aanswer_question_with_debug, answer_question_with_debug
+    from services.summarizer import summarize_whitepaper
+
+    set_provider(
+        ReplayProvider(
+            latency=args.latency,
+            embed_latency=args.embed_latency or args.latency,
+            error_rate=args.error_rate,
+        )
+    )
+    docs = []
+    for seed in range(args.docs):
+        pdf_bytes = make_whitepaper_pdf(args.pages, seed=seed)
+        docs.append((parse_document(pdf_bytes).doc_id, pdf_bytes))
+
+    rows = [
+        _run_stage(
+            "index",
+            [
+                lambda doc_id=doc_id, pdf=pdf: index_document(doc_id, iter_pages(pdf, doc_id))
+                for doc_id, pdf in docs
+            ],
+            args.concurrency,
+        ),
+        _run_stage(
+            "summarize",
+            [
+                lambda pdf=pdf: summarize_whitepaper(
+                    parse_document(pdf).full_text,
+                    pages=parse_document(pdf).pages,
+                )
+                for _, pdf in docs
+            ],
+            args.concurrency,
+        ),
+    ]
+
+    answers: List[Dict[str, Any]] = []
+
+    def _ask(doc_id: str, question: str) -> None:
+        result = answer_question_with_debug(doc_id, question, [])
+        answers.append(
+            {
+                "question": question,
+                "answer": result["answer_text"],
+                "retrieved_chunks": result["retrieved_chunks"],
+            }
+        )
+
+    rows.append(
+        _run_stage(
+            "ask",
+            [
+                lambda doc_id=doc_id, question=question: _ask(doc_id, question)
+                for doc_id, _ in docs
+                for question in QUESTIONS[: args.questions]
+            ],
+            args.concurrency,
+        )
+    )
+
+    if args.async_concurrency:
+        rows.append(
+            _run_async_stage(
+                "ask_async",
+                [
+                    lambda doc_id=doc_id, question=question: aanswer_question_with_debug(
+                        doc_id, question, []
+                    )
+                    for doc_id, _ in docs
+                    for question in QUESTIONS[: args.questions]
+                    for _ in range(args.async_repeat)
+                ],
+                args.async_concurrency,
+            )
+        )
+
+    if args.eval:
+        from eval.runner import evaluate_qa
+
+        rows.append(
+            _run_stage("evaluate_qa", [lambda: evaluate_qa(answers, use_judge=True)], 1)
+        )
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=32)
+    parser.add_argument("--questions", type=int, default=len(QUESTIONS))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", default="lognormal:800:0.4", help="Generation latency spec.")
+    parser.add_argument("--embed-latency", default="lognormal:150:0.3")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--async-concurrency",
+        type=int,
+        default=0,
+        help="Also run the questions through the async API with this many in flight.",
+    )
+    parser.add_argument("--async-repeat", type=int, default=10, help="Copies of each async question.")
+    parser.add_argument("--eval", action="store_true", help="Also judge the answers.")
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="paperscope-bench-")
+    _use_scratch_environment(data_dir)
+    try:
+        rows = run(args)
+        from services.llm_scheduler import scheduler_metrics
+
+        scheduler = scheduler_metrics()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {"config": vars(args), "results": rows, "scheduler": scheduler}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compare serial and parallel PDF page extraction across page counts.
+
+Run it on the machine that will serve the app: the pool only pays off with
+several cores, and the suggested ``PDF_PARALLEL_MIN_PAGES`` is the smallest
+page count whose speedup clears ``--min-speedup``.
+
+Usage: python -m benchmarks.bench_pdf_extraction [--pages 16 64 256 512]
+           [--workers 4] [--min-speedup 1.2]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+from benchmarks.synthetic_pdf import make_whitepaper_pdf
+from services.pdf_parser import PDF_MAX_PROCESSES, extract_page_texts
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(page_counts: List[int], workers: int, repeat: int) -> List[Dict[str, float]]:
+    rows = []
+    for pages in page_counts:
+        pdf_bytes = make_whitepaper_pdf(pages)
+        serial = _best_of(lambda: extract_page_texts(pdf_bytes, parallel=False), repeat)
+        parallel = _best_of(
+            lambda: extract_page_texts(pdf_bytes, parallel=True, max_workers=workers),
+            repeat,
+        )
+        rows.append(
+            {
+                "pages": pages,
+                "workers": workers,
+                "cpus": os.cpu_count() or 1,
+                "serial_s": round(serial, 4),
+                "parallel_s": round(parallel, 4),
+                "speedup": round(serial / parallel, 2) if parallel else 0.0,
+            }
+        )
+    return rows
+
+
+def suggested_min_pages(rows: List[Dict[str, float]], min_speedup: float) -> Optional[int]:
+    """Smallest page count from which every measured speedup clears ``min_speedup``."""
+    suggestion = None
+    for row in sorted(rows, key=lambda row: row["pages"], reverse=True):
+        if row["speedup"] < min_speedup:
+            break
+        suggestion = int(row["pages"])
+    return suggestion
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[16, 64, 256, 512])
+    parser.add_argument("--workers", type=int, default=max(2, PDF_MAX_PROCESSES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-speedup", type=float, default=1.2)
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table.")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    if cpus < args.workers:
+        print(
+            f"warning: {args.workers} workers on {cpus} CPU(s); the parallel "
+            "timings will not show a real speedup.",
+            file=sys.stderr,
+        )
+    rows = run(args.pages, args.workers, args.repeat)
+    suggestion = suggested_min_pages(rows, args.min_speedup)
+    if args.json:
+        print(json.dumps({"results": rows, "suggested_min_pages": suggestion}, indent=2))
+        return
+    print(f"{'pages':>6} {'workers':>7} {'serial_s':>9} {'parallel_s':>10} {'speedup':>7}")
+    for row in rows:
+        print(
+            f"{row['pages']:>6} {row['workers']:>7} {row['serial_s']:>9} "
+            f"{row['parallel_s']:>10} {row['speedup']:>7}"
+        )
+    if suggestion is None:
+        print(f"No page count reached a {args.min_speedup}x speedup; keep PDF_PARALLEL_MIN_PAGES=0.")
+    else:
+        print(f"Suggested PDF_PARALLEL_MIN_PAGES={suggestion}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Time the CPU-bound pipeline stages offline across document sizes.
+
+Every stage runs on synthetic whitepapers; no API calls are made.
+
+Usage: python -m benchmarks.bench_pipeline [--pages 16 64 256] [--output results.json]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.synthetic_pdf import make_whitepaper_pdf
+from eval.scorers import (
+    check_numeric_hallucination,
+    check_qa_reference_format,
+    check_qa_structure,
+    check_reference_validity,
+    check_summary_missing_info_phrase,
+    check_summary_required_sections,
+    check_summary_word_limit,
+)
+from services.context_builder import ContextChunk, assemble_context
+from services.pdf_parser import _parse_pdf_bytes, compute_doc_id
+from services.rag_indexer import _chunk_pages
+from services.rag_qa import _format_context, _has_keyword_overlap
+from services.sectionizer import iter_lines_with_section
+
+
+EMBEDDING_DIM = 768
+# No word of this question occurs in the synthetic text, so the overlap
+# check has to scan every chunk.
+MISS_QUESTION = "What jurisdiction regulates the custodial exchange listings?"
+
+
+def _measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best wall time over ``repeat`` runs, then one traced run for peak memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_kib": peak / 1024}
+
+
+def _answer_for(chunks: List[Dict[str, Any]]) -> str:
+    refs = "\n".join(f"- Page {c['page']} | Section: {c['section']}" for c in chunks[:10])
+    return (
+        "ANSWER\nThe supply is 21000000 tokens with 2.5% yearly emission.\n\n"
+        "EVIDENCE\n- Supply is fixed at genesis.\n\n"
+        f"REFERENCES\n{refs}\n"
+    )
+
+
+def _stages(pdf_bytes: bytes) -> Tuple[Dict[str, Callable[[], Any]], int]:
+    """Build the stage closures for one document and return its chunk count."""
+    doc_id = compute_doc_id(pdf_bytes)
+    parsed = _parse_pdf_bytes(doc_id, pdf_bytes)
+    chunks = list(_chunk_pages(parsed.pages))
+    texts = [chunk["text"] for chunk in chunks]
+    metadatas = [
+        {
+            "page": chunk["page"],
+            "page_end": chunk["page_end"],
+            "section": chunk["section"],
+            "char_start": chunk["char_start"],
+            "char_end": chunk["char_end"],
+        }
+        for chunk in chunks
+    ]
+    rng = random.Random(0)
+    candidates = [
+        ContextChunk(
+            chunk_id=str(idx),
+            text=text,
+            metadata=meta,
+            distance=rng.uniform(0.1, 0.5),
+            embedding=[rng.gauss(0.0, 1.0) for _ in range(EMBEDDING_DIM)],
+        )
+        for idx, (text, meta) in enumerate(zip(texts, metadatas))
+    ]
+    candidates.sort(key=lambda chunk: chunk.distance)
+    retrieved = [
+        {"page": meta["page"], "section": meta["section"], "text": text}
+        for text, meta in zip(texts, metadatas)
+    ]
+    answer = _answer_for(retrieved)
+    lines = parsed.full_text.splitlines()
+
+    def _scorers() -> None:
+        check_qa_structure(answer)
+        check_qa_reference_format(answer)
+        check_reference_validity(answer, retrieved)
+        check_numeric_hallucination(answer, retrieved)
+        check_summary_required_sections(parsed.full_text)
+        check_summary_word_limit(parsed.full_text)
+        check_summary_missing_info_phrase(parsed.full_text)
+
+    return {
+        "parse": lambda: _parse_pdf_bytes(doc_id, pdf_bytes),
+        "chunk": lambda: list(_chunk_pages(parsed.pages)),
+        "sectionize": lambda: list(iter_lines_with_section(lines)),
+        "keyword_overlap": lambda: _has_keyword_overlap(MISS_QUESTION, texts),
+        "format_context": lambda: _format_context(texts, metadatas),
+        "assemble_context": lambda: assemble_context(
+            candidates,
+            baseline_k=5,
+            max_chunks=len(candidates),
+            distance_margin=1.0,
+        ),
+        "scorers": _scorers,
+    }, len(chunks)
+
+
+def run(page_counts: List[int], repeat: int, stages: List[str]) -> List[Dict[str, Any]]:
+    rows = []
+    for pages in page_counts:
+        pdf_bytes = make_whitepaper_pdf(pages)
+        closures, chunk_count = _stages(pdf_bytes)
+        for name in stages:
+            result = _measure(closures[name], repeat)
+            seconds = result["seconds"]
+            rows.append(
+                {
+                    "stage": name,
+                    "pages": pages,
+                    "chunks": chunk_count,
+                    "seconds": round(seconds, 5),
+                    "pages_per_s": round(pages / seconds, 1) if seconds else None,
+                    "chunks_per_s": round(chunk_count / seconds, 1) if seconds else None,
+                    "peak_kib": round(result["peak_kib"], 1),
+                }
+            )
+    return rows
+
+
+STAGES = [
+    "parse",
+    "chunk",
+    "sectionize",
+    "keyword_overlap",
+    "format_context",
+    "assemble_context",
+    "scorers",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table.")
+    args = parser.parse_args()
+
+    rows = run(args.pages, args.repeat, args.stages)
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": rows,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(
+        f"{'stage':<17} {'pages':>6} {'chunks':>7} {'seconds':>9} "
+        f"{'pages/s':>10} {'chunks/s':>10} {'peak_kib':>10}"
+    )
+    for row in rows:
+        print(
+            f"{row['stage']:<17} {row['pages']:>6} {row['chunks']:>7} {row['seconds']:>9} "
+            f"{row['pages_per_s']!s:>10} {row['chunks_per_s']!s:>10} {row['peak_kib']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
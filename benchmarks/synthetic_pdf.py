@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import random
+from typing import List
+
+import fitz  # PyMuPDF
+
+
+SECTION_TITLES = [
+    "Introduction",
+    "Consensus Mechanism",
+    "Token Economics",
+    "Governance",
+    "Security Model",
+    "Roadmap",
+    "Risk Factors",
+]
+
+_WORDS = (
+    "protocol validator stake token supply emission ledger consensus block "
+    "finality smart contract bridge liquidity treasury governance proposal "
+    "audit signature shard rollup fee burn reward epoch slashing oracle"
+).split()
+
+
+def _paragraph(rng: random.Random, sentences: int) -> List[str]:
+    lines = []
+    for _ in range(sentences):
+        words = [rng.choice(_WORDS) for _ in range(rng.randint(8, 16))]
+        words[0] = words[0].capitalize()
+        if rng.random() < 0.3:
+            words.append(f"{rng.randint(1, 100)}%")
+        lines.append(" ".join(words) + ".")
+    return lines
+
+
+def make_whitepaper_pdf(pages: int, *, seed: int = 7, lines_per_page: int = 48) -> bytes:
+    """Build a text-only whitepaper-like PDF with headings on every few pages."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    section_idx = 0
+    for page_idx in range(pages):
+        page = doc.new_page()
+        lines: List[str] = []
+        if page_idx % 3 == 0:
+            title = SECTION_TITLES[section_idx % len(SECTION_TITLES)]
+            lines.append(f"{section_idx + 1}. {title.upper()}")
+            section_idx += 1
+        while len(lines) < lines_per_page:
+            lines.extend(_paragraph(rng, 4))
+            lines.append("")
+        y = 48
+        for line in lines[:lines_per_page]:
+            page.insert_text((48, y), line[:95], fontsize=9)
+            y += 14
+    data = doc.tobytes()
+    doc.close()
+    return data
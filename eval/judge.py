@@ -3,9 +3,15 @@ from __future__ import annotations
 import json
 from typing import Any, Dict, List, Optional
 
-from services.gemini_client import generate_text
+from services.aio import run_sync
+from services.answer_format import CORPUS_NOT_FOUND_ANSWER, NOT_FOUND_ANSWER
+from services.gemini_client import agenerate_text
 
 
+# Bump when either judge prompt or the judge input format changes; stored
+# judge results are keyed on it.
+JUDGE_PROMPT_VERSION = "2"
+
 SUMMARY_JUDGE_PROMPT = """
 You are a strict evaluator. Use only the provided whitepaper sample text.
 Evaluate the summary for faithfulness and coverage.
@@ -15,14 +21,15 @@ If unsupported claims exist, lower faithfulness.
 """.strip()
 
 
-QA_JUDGE_PROMPT = """
+QA_JUDGE_PROMPT = f"""
 You are a strict evaluator. Use only the provided retrieved chunks.
 Evaluate answer groundedness, whether it answers the question, and citation quality.
 Return JSON only, with fields:
-{"grounded": 0-5, "answers_question": 0-5, "citation_quality": 0-5,
- "notes": "...", "hallucination_flags": ["..."]}
+{{"grounded": 0-5, "answers_question": 0-5, "citation_quality": 0-5,
+ "notes": "...", "hallucination_flags": ["..."]}}
 If claims are not supported by chunks, grounded must be low.
-If "Information not found in the document." is correct, grounded can be high.
+If "{NOT_FOUND_ANSWER}" (or "{CORPUS_NOT_FOUND_ANSWER}" for a
+multi-document question) is correct, grounded can be high.
 """.strip()
 
 
@@ -41,7 +48,7 @@ def _parse_json(text: str) -> Optional[Dict[str, Any]]:
     return None
 
 
-def judge_summary(whitepaper_sample: str, summary: str) -> Optional[Dict[str, Any]]:
+async def ajudge_summary(whitepaper_sample: str, summary: str) -> Optional[Dict[str, Any]]:
     prompt = (
         f"{SUMMARY_JUDGE_PROMPT}\n\n"
         "WHITEPAPER SAMPLE:\n"
@@ -49,11 +56,11 @@ def judge_summary(whitepaper_sample: str, summary: str) -> Optional[Dict[str, An
         "SUMMARY:\n"
         f"{summary}\n"
     )
-    response = generate_text(prompt)
+    response = await agenerate_text(prompt)
     return _parse_json(response)
 
 
-def judge_qa(
+async def ajudge_qa(
     question: str,
     answer: str,
     retrieved_chunks: List[Dict[str, Any]],
@@ -64,6 +71,7 @@ def judge_qa(
             f"[Chunk {idx}] Page {chunk.get('page')} | Section: {chunk.get('section')}\n"
             f"{chunk.get('text')}"
         )
+    chunks_block = "\n\n".join(chunk_lines)
     prompt = (
         f"{QA_JUDGE_PROMPT}\n\n"
         "QUESTION:\n"
@@ -71,7 +79,19 @@ def judge_qa(
         "ANSWER:\n"
         f"{answer}\n\n"
         "RETRIEVED CHUNKS:\n"
-        f"{'\n\n'.join(chunk_lines)}\n"
+        f"{chunks_block}\n"
     )
-    response = generate_text(prompt)
+    response = await agenerate_text(prompt)
     return _parse_json(response)
+
+
+def judge_summary(whitepaper_sample: str, summary: str) -> Optional[Dict[str, Any]]:
+    return run_sync(ajudge_summary(whitepaper_sample, summary))
+
+
+def judge_qa(
+    question: str,
+    answer: str,
+    retrieved_chunks: List[Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    return run_sync(ajudge_qa(question, answer, retrieved_chunks))
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+STORE_PATH = Path(os.getenv("EVAL_STORE_PATH", "data/eval_results.sqlite3"))
+STORE_ENABLED = os.getenv("EVAL_STORE_ENABLED", "1") not in ("0", "false", "False")
+
+
+def judge_key(kind: str, prompt_version: str, model: str, *parts: Any) -> str:
+    """Stable hash of everything a judge verdict depends on."""
+    payload = json.dumps(
+        [kind, prompt_version, model, *parts],
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class JudgeResultStore:
+    """SQLite table of judge verdicts keyed by ``judge_key``.
+
+    Only successful verdicts are stored, so failed or timed-out judge
+    calls are retried on the next evaluation.
+    """
+
+    def __init__(self, path: Path = STORE_PATH) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS judge_results ("
+            " key TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " result TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        found: Dict[str, Dict[str, Any]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                part = unique[start : start + 500]
+                placeholders = ",".join("?" for _ in part)
+                rows = self._conn.execute(
+                    f"SELECT key, result FROM judge_results WHERE key IN ({placeholders})",
+                    part,
+                ).fetchall()
+                for key, result in rows:
+                    try:
+                        found[key] = json.loads(result)
+                    except ValueError:
+                        continue
+        return found
+
+    def put(self, key: str, kind: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO judge_results (key, kind, result, created)"
+                " VALUES (?, ?, ?, ?)",
+                (key, kind, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+
+_store: Optional[JudgeResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[JudgeResultStore]:
+    """Return the process-wide store, or ``None`` when it is disabled."""
+    global _store
+    if not STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JudgeResultStore()
+    return _store
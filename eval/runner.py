@@ -1,8 +1,11 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from eval import judge
+from eval.result_store import get_result_store, judge_key
 from eval.schemas import QAEvalItem, QAEvalReport, SummaryEvalResult
 from eval.scorers import (
     check_not_found_format,
@@ -14,6 +17,42 @@ from eval.scorers import (
     check_summary_required_sections,
     check_summary_word_limit,
 )
+from services.aio import gather_limited, run_blocking, run_sync
+from services.gemini_client import DEFAULT_MODEL
+from services.llm_provider import model_tag
+from services.llm_scheduler import PRIORITY_BULK, attempt_timeout, request_priority
+
+
+JUDGE_MAX_WORKERS = int(os.getenv("EVAL_JUDGE_MAX_WORKERS", "4"))
+# Per provider attempt, once the scheduler admits it.
+JUDGE_TIMEOUT_SECONDS = float(os.getenv("EVAL_JUDGE_TIMEOUT_SECONDS", "90"))
+
+_JudgeCall = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+_JudgeOutcome = Tuple[Optional[Dict[str, Any]], Optional[str]]
+
+
+@request_priority(PRIORITY_BULK)
+async def _run_judge(kind: str, key: str, call: _JudgeCall, timeout: float) -> _JudgeOutcome:
+    """Await one judge call as a (judge, error) pair.
+
+    ``timeout`` limits each provider attempt once the scheduler admits it;
+    waiting behind other calls and retry backoff do not count. Calls run
+    at bulk priority so interactive Q&A is scheduled ahead of them. A
+    successful verdict is persisted as soon as it lands.
+    """
+    try:
+        with attempt_timeout(timeout):
+            result = await call()
+    except asyncio.TimeoutError:
+        return None, f"Judge timed out after {timeout:g}s per attempt"
+    except Exception as exc:  # noqa: BLE001
+        return None, f"Judge failed: {exc}"
+    if result is None:
+        return None, "Judge response was not valid JSON"
+    store = get_result_store()
+    if store is not None:
+        await run_blocking(store.put, key, kind, result)
+    return result, None
 
 
 def _sample_whitepaper(text: str, chunk_size: int = 12000) -> str:
@@ -22,11 +61,7 @@ def _sample_whitepaper(text: str, chunk_size: int = 12000) -> str:
     return f"{text[:chunk_size]}\n\n...\n\n{text[-chunk_size:]}"
 
 
-def evaluate_summary(
-    summary_text: str,
-    whitepaper_text: str,
-    use_judge: bool,
-) -> SummaryEvalResult:
+def _score_summary(summary_text: str) -> Tuple[Dict[str, Any], List[str]]:
     metrics: Dict[str, Any] = {}
     failures: List[str] = []
 
@@ -40,60 +75,188 @@ def evaluate_summary(
         metrics[name] = message
         if not passed:
             failures.append(f"{name}: {message}")
+    return metrics, failures
 
-    judge_result = None
+
+async def aevaluate_summary(
+    summary_text: str,
+    whitepaper_text: str,
+    use_judge: bool,
+    *,
+    judge_timeout: float = JUDGE_TIMEOUT_SECONDS,
+) -> SummaryEvalResult:
+    judging: Optional[asyncio.Future] = None
+    stored: Optional[Dict[str, Any]] = None
     if use_judge:
         whitepaper_sample = _sample_whitepaper(whitepaper_text)
-        judge_result = judge.judge_summary(whitepaper_sample, summary_text)
+        key = judge_key(
+            "summary",
+            judge.JUDGE_PROMPT_VERSION,
+            model_tag(DEFAULT_MODEL),
+            whitepaper_sample,
+            summary_text,
+        )
+        store = get_result_store()
+        if store is not None:
+            stored = (await run_blocking(store.get_many, [key])).get(key)
+        if stored is None:
+            # Start the judge first so the deterministic checks overlap with it.
+            judging = asyncio.ensure_future(
+                _run_judge(
+                    "summary",
+                    key,
+                    lambda: judge.ajudge_summary(whitepaper_sample, summary_text),
+                    judge_timeout,
+                )
+            )
+
+    metrics, failures = await run_blocking(_score_summary, summary_text)
+    judge_result, judge_error = await judging if judging is not None else (stored, None)
 
     return SummaryEvalResult(
         metrics=metrics,
         passed=len(failures) == 0,
         failures=failures,
         judge=judge_result,
+        judge_error=judge_error,
+        judge_cached=stored is not None,
     )
 
 
-def evaluate_qa(
+def evaluate_summary(
+    summary_text: str,
+    whitepaper_text: str,
+    use_judge: bool,
+    *,
+    judge_timeout: float = JUDGE_TIMEOUT_SECONDS,
+) -> SummaryEvalResult:
+    return run_sync(
+        aevaluate_summary(summary_text, whitepaper_text, use_judge, judge_timeout=judge_timeout)
+    )
+
+
+def _qa_judge_call(item: Dict[str, Any]) -> _JudgeCall:
+    return lambda: judge.ajudge_qa(
+        item.get("question", ""),
+        item.get("answer", ""),
+        item.get("retrieved_chunks", []),
+    )
+
+
+def _qa_judge_key(item: Dict[str, Any]) -> str:
+    chunks = [
+        [chunk.get("page"), chunk.get("section"), chunk.get("text")]
+        for chunk in item.get("retrieved_chunks", [])
+    ]
+    return judge_key(
+        "qa",
+        judge.JUDGE_PROMPT_VERSION,
+        model_tag(DEFAULT_MODEL),
+        item.get("question", ""),
+        item.get("answer", ""),
+        chunks,
+    )
+
+
+def _score_qa_item(item: Dict[str, Any]) -> QAEvalItem:
+    question = item.get("question", "")
+    answer = item.get("answer", "")
+    retrieved_chunks = item.get("retrieved_chunks", [])
+
+    metrics: Dict[str, Any] = {}
+    failures: List[str] = []
+
+    checks = [
+        ("qa_structure_valid", check_qa_structure(answer)),
+        ("citation_presence_format", check_qa_reference_format(answer)),
+        ("not_found_correctness", check_not_found_format(answer)),
+        ("citation_validity_vs_retrieval", check_reference_validity(answer, retrieved_chunks)),
+        ("hallucination_risk_numeric", check_numeric_hallucination(answer, retrieved_chunks)),
+    ]
+
+    for name, (passed, message) in checks:
+        metrics[name] = message
+        if not passed:
+            failures.append(f"{name}: {message}")
+
+    return QAEvalItem(
+        question=question,
+        answer=answer,
+        metrics=metrics,
+        passed=len(failures) == 0,
+        failures=failures,
+        retrieved_chunks=retrieved_chunks,
+    )
+
+
+async def aevaluate_qa(
     qa_items: List[Dict[str, Any]],
     use_judge: bool,
+    *,
+    max_workers: int = JUDGE_MAX_WORKERS,
+    judge_timeout: float = JUDGE_TIMEOUT_SECONDS,
 ) -> QAEvalReport:
-    items: List[QAEvalItem] = []
-    for item in qa_items:
-        question = item.get("question", "")
-        answer = item.get("answer", "")
-        retrieved_chunks = item.get("retrieved_chunks", [])
-
-        metrics: Dict[str, Any] = {}
-        failures: List[str] = []
-
-        checks = [
-            ("qa_structure_valid", check_qa_structure(answer)),
-            ("citation_presence_format", check_qa_reference_format(answer)),
-            ("not_found_correctness", check_not_found_format(answer)),
-            ("citation_validity_vs_retrieval", check_reference_validity(answer, retrieved_chunks)),
-            ("hallucination_risk_numeric", check_numeric_hallucination(answer, retrieved_chunks)),
-        ]
-
-        for name, (passed, message) in checks:
-            metrics[name] = message
-            if not passed:
-                failures.append(f"{name}: {message}")
-
-        judge_result = None
-        if use_judge:
-            judge_result = judge.judge_qa(question, answer, retrieved_chunks)
-
-        items.append(
-            QAEvalItem(
-                question=question,
-                answer=answer,
-                metrics=metrics,
-                passed=len(failures) == 0,
-                failures=failures,
-                retrieved_chunks=retrieved_chunks,
-                judge=judge_result,
+    """Score Q&A items, judging up to ``max_workers`` of them concurrently.
+
+    Judge calls start before the deterministic checks and results keep the
+    input order. A judge that fails or exceeds ``judge_timeout`` only sets
+    that item's ``judge_error``. Verdicts are persisted, so items judged
+    before (same prompt version, question, answer and chunks) are not
+    judged again.
+    """
+    judging: Optional[asyncio.Future] = None
+    keys: List[str] = []
+    stored: Dict[str, Dict[str, Any]] = {}
+    pending: List[int] = []
+    if use_judge and qa_items:
+        keys = [_qa_judge_key(item) for item in qa_items]
+        store = get_result_store()
+        if store is not None:
+            stored = await run_blocking(store.get_many, keys)
+        pending = [idx for idx, key in enumerate(keys) if key not in stored]
+        if pending:
+            judging = asyncio.ensure_future(
+                gather_limited(
+                    max_workers,
+                    [
+                        lambda idx=idx: _run_judge(
+                            "qa",
+                            keys[idx],
+                            _qa_judge_call(qa_items[idx]),
+                            judge_timeout,
+                        )
+                        for idx in pending
+                    ],
+                )
             )
-        )
+
+    items = await run_blocking(lambda: [_score_qa_item(item) for item in qa_items])
+
+    for idx, key in enumerate(keys):
+        if key in stored:
+            items[idx].judge = stored[key]
+            items[idx].judge_cached = True
+    if judging is not None:
+        for idx, (judge_result, judge_error) in zip(pending, await judging):
+            items[idx].judge = judge_result
+            items[idx].judge_error = judge_error
 
     return QAEvalReport(items=items)
+
+
+def evaluate_qa(
+    qa_items: List[Dict[str, Any]],
+    use_judge: bool,
+    *,
+    max_workers: int = JUDGE_MAX_WORKERS,
+    judge_timeout: float = JUDGE_TIMEOUT_SECONDS,
+) -> QAEvalReport:
+    """Blocking ``aevaluate_qa``."""
+    return run_sync(
+        aevaluate_qa(
+            qa_items,
+            use_judge,
+            max_workers=max_workers,
+            judge_timeout=judge_timeout,
+        )
+    )
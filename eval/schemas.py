@@ -10,6 +10,8 @@ class SummaryEvalResult:
     passed: bool
     failures: List[str] = field(default_factory=list)
     judge: Optional[Dict[str, Any]] = None
+    judge_error: Optional[str] = None
+    judge_cached: bool = False
 
 
 @dataclass
@@ -21,6 +23,8 @@ class QAEvalItem:
     failures: List[str] = field(default_factory=list)
     retrieved_chunks: List[Dict[str, Any]] = field(default_factory=list)
     judge: Optional[Dict[str, Any]] = None
+    judge_error: Optional[str] = None
+    judge_cached: bool = False
 
 
 @dataclass
@@ -3,6 +3,8 @@ from __future__ import annotations
 import re
 from typing import Dict, List, Tuple
 
+from services.answer_format import NOT_FOUND_ANSWER, is_not_found_answer
+
 
 REQUIRED_HEADINGS = [
     "EXECUTIVE SUMMARY",
@@ -35,7 +37,7 @@ def check_summary_word_limit(summary: str, max_words: int = 2000) -> Tuple[bool,
 
 
 def check_summary_missing_info_phrase(summary: str) -> Tuple[bool, str]:
-    exact_phrase = "Information not found in the document."
+    exact_phrase = NOT_FOUND_ANSWER
     lowered = summary.lower()
     if exact_phrase.lower() in lowered:
         return True, "Uses required missing-info phrase"
@@ -86,7 +88,7 @@ def check_qa_reference_format(answer: str) -> Tuple[bool, str]:
 
 
 def check_not_found_format(answer: str) -> Tuple[bool, str]:
-    if answer.strip() == "Information not found in the document.":
+    if is_not_found_answer(answer):
         return True, "Exact not-found response used"
     return True, "Not-found response not used"
 
@@ -95,7 +97,7 @@ def check_reference_validity(
     answer: str,
     retrieved_chunks: List[Dict[str, object]],
 ) -> Tuple[bool, str]:
-    if answer.strip() == "Information not found in the document.":
+    if is_not_found_answer(answer):
         return True, "Not-found response; skipping reference validation"
 
     refs = parse_references(answer)
@@ -116,7 +118,7 @@ def check_numeric_hallucination(
     answer: str,
     retrieved_chunks: List[Dict[str, object]],
 ) -> Tuple[bool, str]:
-    if answer.strip() == "Information not found in the document.":
+    if is_not_found_answer(answer):
         return True, "Not-found response; skipping numeric check"
 
     answer_text = extract_section(answer, "ANSWER", "EVIDENCE") or answer
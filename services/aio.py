@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Iterator, List, Optional, TypeVar
+
+
+T = TypeVar("T")
+U = TypeVar("U")
+
+# Threads for blocking work (vector store queries, SQLite caches) awaited
+# from async code.
+AIO_BLOCKING_WORKERS = int(os.getenv("AIO_BLOCKING_WORKERS", "32"))
+
+_END = object()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide client loop, starting its thread on first use.
+
+    The SDK's async client binds its connections to the loop it was first
+    used on, so every provider call runs on this one loop; see
+    ``on_client_loop``.
+    """
+    global _loop, _loop_thread
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever,
+                    name="llm-client-loop",
+                    daemon=True,
+                )
+                thread.start()
+                _loop_thread = thread
+                _loop = loop
+    return _loop
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=AIO_BLOCKING_WORKERS,
+                    thread_name_prefix="aio-blocking",
+                )
+    return _executor
+
+
+def _submit(coro: Coroutine[Any, Any, T]) -> "Future[T]":
+    loop = get_loop()
+    if threading.current_thread() is _loop_thread:
+        coro.close()
+        raise RuntimeError("Sync API called on the client event loop; await the async API.")
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Run ``coro`` on the client loop and block until it finishes."""
+    future = _submit(coro)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def run_sync_with_updates(
+    make_coro: Callable[[Optional[Callable[[U], None]]], Coroutine[Any, Any, T]],
+    on_update: Optional[Callable[[U], None]],
+) -> T:
+    """Like ``run_sync``, but deliver ``on_update`` calls on the calling thread.
+
+    ``make_coro`` receives a thread-safe callback to pass down (or ``None``).
+    Updates are cumulative (e.g. the answer text so far), so when several
+    are pending only the latest is delivered.
+    """
+    if on_update is None:
+        return run_sync(make_coro(None))
+    updates: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+    future = _submit(make_coro(updates.put))
+    future.add_done_callback(lambda _: updates.put(_END))
+    try:
+        while True:
+            pending = [updates.get()]
+            while True:
+                try:
+                    pending.append(updates.get_nowait())
+                except queue.Empty:
+                    break
+            finished = pending[-1] is _END
+            if finished:
+                pending.pop()
+            if pending:
+                on_update(pending[-1])
+            if finished:
+                return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def iterate_sync(stream: AsyncIterator[T]) -> Iterator[T]:
+    """Consume an async iterator on the client loop from a sync caller."""
+    items: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+
+    async def _pump() -> None:
+        async for item in stream:
+            items.put(item)
+
+    future = _submit(_pump())
+    future.add_done_callback(lambda _: items.put(_END))
+    try:
+        while True:
+            item = items.get()
+            if item is _END:
+                break
+            yield item
+        future.result()
+    finally:
+        future.cancel()
+
+
+async def on_client_loop(coro: Coroutine[Any, Any, T]) -> T:
+    """Await ``coro`` on the client loop from any event loop."""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+async def aiter_on_client_loop(stream: AsyncIterator[T]) -> AsyncIterator[T]:
+    """Iterate ``stream`` on the client loop, yielding on the caller's loop."""
+    loop = get_loop()
+    caller = asyncio.get_running_loop()
+    if caller is loop:
+        async for item in stream:
+            yield item
+        return
+
+    items: "asyncio.Queue[Any]" = asyncio.Queue()
+
+    async def _pump() -> None:
+        try:
+            async for item in stream:
+                caller.call_soon_threadsafe(items.put_nowait, item)
+        except Exception as exc:  # noqa: BLE001
+            caller.call_soon_threadsafe(items.put_nowait, exc)
+        caller.call_soon_threadsafe(items.put_nowait, _END)
+
+    future = asyncio.run_coroutine_threadsafe(_pump(), loop)
+    try:
+        while True:
+            item = await items.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        future.cancel()
+
+
+async def run_blocking(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call on the shared worker threads, keeping context vars.
+
+    ``fn`` must not call back into the sync service API.
+    """
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), call)
+
+
+async def gather_limited(
+    limit: int,
+    calls: List[Callable[[], Awaitable[T]]],
+) -> List[T]:
+    """Await ``calls`` concurrently, at most ``limit`` at a time, keeping order."""
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def _run(call: Callable[[], Awaitable[T]]) -> T:
+        async with semaphore:
+            return await call()
+
+    return list(await asyncio.gather(*(_run(call) for call in calls)))
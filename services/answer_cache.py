@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") not in ("0", "false", "False")
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Cosine similarity between question embeddings at which a past answer is
+# reused for a differently worded question. 0 disables the semantic lookup.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+_Key = Tuple[str, str, str]
+
+
+def normalize_question(question: str) -> str:
+    """Casefold, collapse whitespace and drop trailing punctuation."""
+    text = " ".join(question.casefold().split())
+    return re.sub(r"[\s?!.]+$", "", text)
+
+
+def context_digest(*parts: str) -> str:
+    """Digest of everything besides the question that shapes the answer."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@dataclass
+class _Entry:
+    result: Dict[str, Any]
+    created: float
+    embedding: Optional[np.ndarray]
+
+
+class AnswerCache:
+    """In-memory answer cache keyed by (doc_id, question, context digest).
+
+    Entries expire after ``ttl_seconds`` and the least recently used are
+    evicted beyond ``max_entries``. ``lookup_similar`` compares a question
+    embedding against past questions with the same doc and context digest.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[_Key, _Entry]" = OrderedDict()
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created > self.ttl_seconds
+
+    def _hit(
+        self,
+        key: _Key,
+        entry: _Entry,
+        match: str,
+        similarity: float,
+        now: float,
+    ) -> Dict[str, Any]:
+        self._entries.move_to_end(key)
+        self.hits += 1
+        result = dict(entry.result)
+        result["cache"] = {
+            "hit": True,
+            "match": match,
+            "similarity": round(similarity, 4),
+            "age_seconds": round(now - entry.created, 1),
+        }
+        return result
+
+    def lookup(self, doc_id: str, question: str, digest: str) -> Optional[Dict[str, Any]]:
+        """Exact lookup on the normalized question; counts as one lookup."""
+        key = (doc_id, normalize_question(question), digest)
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry, now):
+                del self._entries[key]
+                return None
+            return self._hit(key, entry, "exact", 1.0, now)
+
+    def lookup_similar(
+        self,
+        doc_id: str,
+        embedding: Sequence[float],
+        digest: str,
+        threshold: float,
+    ) -> Optional[Dict[str, Any]]:
+        """Return the answer of the most similar past question above ``threshold``."""
+        query = _unit(embedding)
+        now = time.time()
+        best_key: Optional[_Key] = None
+        best_score = threshold
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if key[0] != doc_id or key[2] != digest or entry.embedding is None:
+                    continue
+                if self._expired(entry, now):
+                    del self._entries[key]
+                    continue
+                score = float(entry.embedding @ query)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                return None
+            return self._hit(best_key, self._entries[best_key], "semantic", best_score, now)
+
+    def store(
+        self,
+        doc_id: str,
+        question: str,
+        digest: str,
+        result: Dict[str, Any],
+        embedding: Optional[Sequence[float]] = None,
+    ) -> None:
+        key = (doc_id, normalize_question(question), digest)
+        entry = _Entry(
+            result={k: v for k, v in result.items() if k != "cache"},
+            created=time.time(),
+            embedding=_unit(embedding) if embedding is not None else None,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_id: str) -> None:
+        """Drop every answer for a document, e.g. after it is re-indexed."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == doc_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "entries": len(self._entries),
+            }
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
+
+
+_cache: Optional[AnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Return the process-wide cache, or ``None`` when caching is disabled."""
+    global _cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
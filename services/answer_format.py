@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+import re
+
+
+# Exact replies the Q&A prompts require when the context has no answer.
+NOT_FOUND_ANSWER = "Information not found in the document."
+CORPUS_NOT_FOUND_ANSWER = "Information not found in the documents."
+
+_NOT_FOUND_RE = re.compile(r"information not found in the documents?\.?", re.IGNORECASE)
+
+
+def is_not_found_answer(answer: str) -> bool:
+    """Whether ``answer`` is the single- or multi-document not-found reply."""
+    return bool(_NOT_FOUND_RE.fullmatch(answer.strip()))
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from services.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+
+# Upper bound on chunks sent to the model; adaptive k usually keeps fewer.
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "8"))
+CONTEXT_MIN_CHUNKS = int(os.getenv("CONTEXT_MIN_CHUNKS", "2"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Vector hits further than this from the best hit's distance are dropped.
+CONTEXT_DISTANCE_MARGIN = float(os.getenv("CONTEXT_DISTANCE_MARGIN", "0.08"))
+# MMR trade-off: 1.0 ranks purely by relevance, 0.0 purely by novelty.
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+# Chunks of the same page and section closer than this many characters
+# are merged into one block.
+MERGE_GAP_CHARS = 2
+
+
+@dataclass
+class ContextChunk:
+    chunk_id: str
+    text: str
+    metadata: Dict[str, Any]
+    distance: Optional[float] = None
+    embedding: Optional[Sequence[float]] = None
+
+
+def _adaptive_cut(
+    chunks: List[ContextChunk],
+    margin: float,
+    min_chunks: int,
+) -> List[ContextChunk]:
+    """Keep chunks whose distance is within ``margin`` of the closest one.
+
+    Hits without a vector distance (lexical-only) are kept; their rank
+    already earned them a place in the fused list.
+    """
+    distances = [chunk.distance for chunk in chunks if chunk.distance is not None]
+    if not distances:
+        return chunks
+    cutoff = min(distances) + margin
+    kept = [c for c in chunks if c.distance is None or c.distance <= cutoff]
+    if len(kept) < min_chunks:
+        kept = chunks[:min_chunks]
+    return kept
+
+
+def _unit_rows(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    rows = np.asarray(vectors, dtype=np.float32)
+    if rows.ndim == 1:
+        rows = rows[None, :]
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows / np.where(norms == 0.0, 1.0, norms)
+
+
+def _mmr(
+    chunks: List[ContextChunk],
+    k: int,
+    mmr_lambda: float,
+    query_embedding: Optional[Sequence[float]] = None,
+) -> List[ContextChunk]:
+    """Maximal marginal relevance over the candidates' chunk embeddings.
+
+    Relevance is cosine similarity to the query: computed from
+    ``query_embedding`` when given, else taken from the vector distance.
+    Candidates that cannot be scored (no embedding, or lexical-only with
+    no query embedding) keep their rank position; the rest are reordered
+    by MMR in the remaining slots.
+    """
+    if len(chunks) <= 1:
+        return chunks[:k]
+    scored = [
+        idx
+        for idx, chunk in enumerate(chunks)
+        if chunk.embedding is not None
+        and (query_embedding is not None or chunk.distance is not None)
+    ]
+    if len(scored) <= 1:
+        return chunks[:k]
+    rows = _unit_rows([chunks[idx].embedding for idx in scored])
+    if query_embedding is not None:
+        relevance = rows @ _unit_rows(query_embedding)[0]
+    else:
+        relevance = np.asarray([1.0 - chunks[idx].distance for idx in scored])
+    similarity = rows @ rows.T
+    order: List[int] = []
+    remaining = list(range(len(scored)))
+    while remaining:
+        if order:
+            redundancy = similarity[np.ix_(remaining, order)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1.0 - mmr_lambda) * redundancy
+        # argmax takes the first maximum, so rank order breaks ties.
+        best = remaining[int(np.argmax(scores))]
+        order.append(best)
+        remaining.remove(best)
+    result = list(chunks)
+    for slot, pick in zip(scored, order):
+        result[slot] = chunks[scored[pick]]
+    return result[:k]
+
+
+def _span(chunk: ContextChunk) -> Optional[Tuple[int, int]]:
+    start = chunk.metadata.get("char_start")
+    end = chunk.metadata.get("char_end")
+    if start is None or end is None:
+        return None
+    return int(start), int(end)
+
+
+def _merge_adjacent(chunks: List[ContextChunk]) -> Tuple[List[ContextChunk], int]:
+    """Merge overlapping or touching chunks of the same page and section.
+
+    Chunk text is the document slice ``[char_start, char_end)``, so the
+    overlap is removed by offset rather than by comparing strings. Blocks
+    keep the position of their best-ranked member. Returns the blocks and
+    the number of merges done.
+    """
+    groups: Dict[Tuple[Any, Any], List[int]] = {}
+    for idx, chunk in enumerate(chunks):
+        if _span(chunk) is not None:
+            key = (chunk.metadata.get("page"), chunk.metadata.get("section"))
+            groups.setdefault(key, []).append(idx)
+
+    owner_of: Dict[int, int] = {}
+    blocks: Dict[int, ContextChunk] = {}
+    merges = 0
+    for members in groups.values():
+        members.sort(key=lambda idx: _span(chunks[idx])[0])
+        head = members[0]
+        block = chunks[head]
+        for idx in members[1:]:
+            chunk = chunks[idx]
+            start, end = _span(chunk)
+            block_end = _span(block)[1]
+            if start > block_end + MERGE_GAP_CHARS:
+                blocks[head] = block
+                head, block = idx, chunk
+                continue
+            tail = chunk.text[max(0, block_end - start):] if end > block_end else ""
+            joiner = "\n" if tail and start > block_end else ""
+            metadata = dict(block.metadata)
+            metadata["char_end"] = max(end, block_end)
+            metadata["page_end"] = max(
+                block.metadata.get("page_end", block.metadata.get("page")),
+                chunk.metadata.get("page_end", chunk.metadata.get("page")),
+            )
+            distances = [d for d in (block.distance, chunk.distance) if d is not None]
+            block = ContextChunk(
+                chunk_id=f"{block.chunk_id}+{chunk.chunk_id}",
+                text=block.text + joiner + tail,
+                metadata=metadata,
+                distance=min(distances) if distances else None,
+            )
+            owner_of[idx] = head
+            merges += 1
+        blocks[head] = block
+
+    # Emit each block once, at the rank of its best member.
+    result: List[ContextChunk] = []
+    emitted = set()
+    for idx, chunk in enumerate(chunks):
+        owner = owner_of.get(idx, idx)
+        if owner in emitted:
+            continue
+        emitted.add(owner)
+        result.append(blocks.get(owner, chunk))
+    return result, merges
+
+
+def _pack(chunks: List[ContextChunk], token_budget: int) -> List[ContextChunk]:
+    """Take blocks in rank order while they fit the budget.
+
+    The top block is truncated rather than dropped when it alone is over
+    budget, so there is always some context.
+    """
+    packed: List[ContextChunk] = []
+    used = 0
+    for chunk in chunks:
+        tokens = estimate_tokens(chunk.text)
+        if used + tokens <= token_budget:
+            packed.append(chunk)
+            used += tokens
+        elif not packed:
+            text = chunk.text[: token_budget * CHARS_PER_TOKEN]
+            packed.append(ContextChunk(chunk.chunk_id, text, chunk.metadata, chunk.distance))
+            used += estimate_tokens(text)
+    return packed
+
+
+def assemble_context(
+    chunks: List[ContextChunk],
+    *,
+    baseline_k: int,
+    max_chunks: int = CONTEXT_MAX_CHUNKS,
+    min_chunks: int = CONTEXT_MIN_CHUNKS,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    distance_margin: float = CONTEXT_DISTANCE_MARGIN,
+    mmr_lambda: float = CONTEXT_MMR_LAMBDA,
+    query_embedding: Optional[Sequence[float]] = None,
+) -> Tuple[List[ContextChunk], Dict[str, int]]:
+    """Select, dedupe and budget retrieved chunks for the answer prompt.
+
+    ``chunks`` are retrieval candidates in rank order. They are cut to an
+    adaptive k by distance, diversified with MMR, merged where they
+    overlap on the same page, and packed into ``token_budget``. Pass
+    ``query_embedding`` so MMR can also score lexical-only hits. The stats
+    compare against passing the first ``baseline_k`` chunks whole.
+    """
+    baseline_tokens = sum(estimate_tokens(chunk.text) for chunk in chunks[:baseline_k])
+    kept = _adaptive_cut(chunks[:max_chunks], distance_margin, min_chunks)
+    diverse = _mmr(kept, len(kept), mmr_lambda, query_embedding)
+    merged, merges = _merge_adjacent(diverse)
+    packed = _pack(merged, token_budget)
+    context_tokens = sum(estimate_tokens(chunk.text) for chunk in packed)
+    stats = {
+        "candidates": len(chunks),
+        "adaptive_k": len(kept),
+        "merged": merges,
+        "blocks": len(packed),
+        "baseline_tokens": baseline_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": baseline_tokens - context_tokens,
+    }
+    return packed, stats
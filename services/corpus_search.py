@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import heapq
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from services.aio import gather_limited, run_blocking, run_sync
+from services.embedding_client import aembed_text
+from services.rag_indexer import build_or_load_index, list_indexed_documents
+from services.vector_store import reserved_stores
+
+
+# Per-document searches run this many at a time; each is a small
+# in-process top-k, so wall time grows with docs / workers, not docs.
+CORPUS_MAX_WORKERS = int(os.getenv("CORPUS_MAX_WORKERS", "16"))
+CORPUS_TOP_K = int(os.getenv("CORPUS_TOP_K", "8"))
+# Candidates taken from each document before the global merge.
+CORPUS_PER_DOC_K = int(os.getenv("CORPUS_PER_DOC_K", "3"))
+
+
+def _search_document(
+    manifest: Dict[str, Any],
+    query_embedding: Sequence[float],
+    n_results: int,
+) -> List[Dict[str, Any]]:
+    doc_id = str(manifest["doc_id"])
+    result = build_or_load_index(doc_id).query(query_embedding, n_results)
+    hits = []
+    for chunk_id, doc, meta, dist in zip(
+        result["ids"],
+        result["documents"],
+        result["metadatas"],
+        result["distances"],
+    ):
+        hits.append(
+            {
+                "doc_id": doc_id,
+                "title": manifest.get("title") or doc_id,
+                "chunk_id": chunk_id,
+                "page": meta.get("page", "Unknown"),
+                "section": meta.get("section", "Unknown Section"),
+                "text": doc,
+                "distance": float(dist),
+            }
+        )
+    return hits
+
+
+async def asearch_corpus(
+    question: str,
+    *,
+    doc_ids: Optional[Sequence[str]] = None,
+    n_results: int = CORPUS_TOP_K,
+    per_doc_k: int = CORPUS_PER_DOC_K,
+    max_workers: int = CORPUS_MAX_WORKERS,
+) -> List[Dict[str, Any]]:
+    """Search every indexed document (or ``doc_ids``) and merge the top hits.
+
+    The question is embedded once and up to ``max_workers`` document
+    stores are queried concurrently. Hits are merged globally by cosine
+    distance and carry ``doc_id`` and ``title`` so answers can cite the
+    source document. Documents whose store fails to open or query are
+    skipped.
+    """
+    if not question.strip():
+        return []
+    manifests = await run_blocking(list_indexed_documents)
+    if doc_ids is not None:
+        wanted = set(doc_ids)
+        manifests = [m for m in manifests if m["doc_id"] in wanted]
+    if not manifests:
+        return []
+    query_embedding = await aembed_text(question, task_type="retrieval_query")
+
+    async def _run(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+        try:
+            return await run_blocking(_search_document, manifest, query_embedding, per_doc_k)
+        except Exception as exc:  # noqa: BLE001
+            print(f"Corpus search skipped {manifest.get('doc_id')}: {exc}")
+            return []
+
+    with reserved_stores(len(manifests)):
+        per_doc = await gather_limited(
+            max_workers,
+            [lambda manifest=manifest: _run(manifest) for manifest in manifests],
+        )
+    return heapq.nsmallest(
+        n_results,
+        (hit for hits in per_doc for hit in hits),
+        key=lambda hit: hit["distance"],
+    )
+
+
+def search_corpus(
+    question: str,
+    *,
+    doc_ids: Optional[Sequence[str]] = None,
+    n_results: int = CORPUS_TOP_K,
+    per_doc_k: int = CORPUS_PER_DOC_K,
+    max_workers: int = CORPUS_MAX_WORKERS,
+) -> List[Dict[str, Any]]:
+    """Blocking ``asearch_corpus``."""
+    return run_sync(
+        asearch_corpus(
+            question,
+            doc_ids=doc_ids,
+            n_results=n_results,
+            per_doc_k=per_doc_k,
+            max_workers=max_workers,
+        )
+    )
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+
+CACHE_PATH = Path(os.getenv("EMBED_CACHE_PATH", "data/embedding_cache.sqlite3"))
+CACHE_MAX_BYTES = int(os.getenv("EMBED_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+_EVICT_BATCH = 256
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed embedding store keyed by (model, task_type, sha256(text)).
+
+    Vectors are stored as float32 blobs. When the stored bytes exceed
+    ``max_bytes`` the least recently used rows are evicted.
+    """
+
+    def __init__(self, path: Path = CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " task_type TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, task_type, text_hash))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used"
+            " ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        row = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        self._total_bytes = int(row[0])
+
+    def get_many(
+        self,
+        model: str,
+        task_type: str,
+        texts: Sequence[str],
+    ) -> List[Optional[List[float]]]:
+        """Return cached vectors in input order, ``None`` for misses."""
+        digests = [text_digest(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        now = time.time()
+        with self._lock:
+            unique = list(dict.fromkeys(digests))
+            for start in range(0, len(unique), 500):
+                part = unique[start : start + 500]
+                placeholders = ",".join("?" for _ in part)
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings"
+                    f" WHERE model = ? AND task_type = ? AND text_hash IN ({placeholders})",
+                    (model, task_type, *part),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[text_hash] = vec.tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ?"
+                    " WHERE model = ? AND task_type = ? AND text_hash = ?",
+                    [(now, model, task_type, digest) for digest in found],
+                )
+                self._conn.commit()
+            results = [found.get(digest) for digest in digests]
+            hit_count = sum(1 for vec in results if vec is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(
+        self,
+        model: str,
+        task_type: str,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+    ) -> None:
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array("f", vector).tobytes()
+            rows.append((model, task_type, text_digest(text), blob, now))
+        if not rows:
+            return
+        with self._lock:
+            for row in rows:
+                previous = self._conn.execute(
+                    "SELECT LENGTH(vector) FROM embeddings"
+                    " WHERE model = ? AND task_type = ? AND text_hash = ?",
+                    row[:3],
+                ).fetchone()
+                if previous:
+                    self._total_bytes -= int(previous[0])
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO embeddings"
+                    " (model, task_type, text_hash, vector, last_used)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    row,
+                )
+                self._total_bytes += len(row[3])
+            self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT model, task_type, text_hash, LENGTH(vector) FROM embeddings"
+                " ORDER BY last_used LIMIT ?",
+                (_EVICT_BATCH,),
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            victims = []
+            for model, task_type, text_hash, size in rows:
+                victims.append((model, task_type, text_hash))
+                self._total_bytes -= int(size)
+                if self._total_bytes <= self.max_bytes:
+                    break
+            self._conn.executemany(
+                "DELETE FROM embeddings"
+                " WHERE model = ? AND task_type = ? AND text_hash = ?",
+                victims,
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": int(entries),
+                "bytes": self._total_bytes,
+            }
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide cache, or ``None`` when caching is disabled."""
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
@@ -1,61 +1,165 @@
 from __future__ import annotations
 
 import os
-import time
-from typing import List
+from typing import Dict, List, Optional, Sequence
 
-from dotenv import load_dotenv
-import google.generativeai as genai
+from services.aio import gather_limited, on_client_loop, run_blocking, run_sync
+from services.embedding_cache import get_embedding_cache
+from services.llm_provider import get_provider, model_tag
+from services.llm_scheduler import get_scheduler
+from services.tokens import estimate_tokens
 
 
-def _get_api_key() -> str:
-    """Load the Gemini API key from environment."""
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError(
-            "API key missing. Set GEMINI_API_KEY (preferred) or GOOGLE_API_KEY."
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+# batchEmbedContents accepts at most 100 texts per request.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", "4"))
+
+
+async def _aembed_batch(
+    texts: Sequence[str],
+    *,
+    task_type: str,
+    retries: int,
+    delay_seconds: float,
+) -> List[List[float]]:
+    """Embed one provider-sized batch through the shared request scheduler.
+
+    ``delay_seconds`` is the base of the scheduler's jittered exponential
+    backoff between attempts.
+    """
+    provider = get_provider()
+    try:
+        return await get_scheduler("embed").acall(
+            lambda: on_client_loop(
+                provider.aembed(texts, model=EMBEDDING_MODEL, task_type=task_type)
+            ),
+            tokens=sum(estimate_tokens(text) for text in texts),
+            retries=retries,
+            backoff_base=delay_seconds,
         )
-    return api_key
+    except Exception as exc:  # noqa: BLE001
+        raise RuntimeError(f"Embedding failed after {retries} attempts: {exc}") from exc
 
 
-def embed_text(
+async def aembed_text(
     text: str,
     *,
     task_type: str = "retrieval_document",
     retries: int = 3,
     delay_seconds: float = 1.0,
 ) -> List[float]:
-    """Create an embedding for the given text using Gemini embeddings API."""
+    """Create an embedding for the given text with the configured provider."""
     if not text.strip():
         raise ValueError("Text for embedding is empty.")
 
-    api_key = _get_api_key()
-    genai.configure(api_key=api_key)
-
-    model = "models/gemini-embedding-001"
-    last_error: Exception | None = None
-    for attempt in range(1, retries + 1):
-        try:
-            response = genai.embed_content(
-                model=model,
-                content=text,
-                task_type=task_type,
-            )
-            embedding = response.get("embedding") if isinstance(response, dict) else None
-            if embedding:
-                return embedding
-            if hasattr(response, "embedding") and response.embedding:
-                return response.embedding
-            raise RuntimeError("Empty embedding response.")
-        except Exception as exc:  # noqa: BLE001
-            last_error = exc
-            if attempt < retries:
-                time.sleep(delay_seconds)
-            else:
-                break
-
-    raise RuntimeError(f"Embedding failed after {retries} attempts: {last_error}")
+    vectors = await aembed_texts(
+        [text],
+        task_type=task_type,
+        retries=retries,
+        delay_seconds=delay_seconds,
+    )
+    return vectors[0]
+
+
+async def aembed_texts(
+    texts: Sequence[str],
+    *,
+    task_type: str = "retrieval_document",
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_workers: int = EMBED_MAX_WORKERS,
+    retries: int = 3,
+    delay_seconds: float = 1.0,
+) -> List[List[float]]:
+    """Embed many texts in batches, ``max_workers`` at a time, preserving order.
+
+    Texts already present in the embedding cache are not sent to the API.
+    """
+    if not texts:
+        return []
+    if any(not text.strip() for text in texts):
+        raise ValueError("Text for embedding is empty.")
+
+    cache = get_embedding_cache()
+    cache_model = model_tag(EMBEDDING_MODEL)
+    if cache is not None:
+        vectors: List[Optional[List[float]]] = await run_blocking(
+            cache.get_many, cache_model, task_type, texts
+        )
+    else:
+        vectors = [None] * len(texts)
+
+    pending = list(dict.fromkeys(t for t, vec in zip(texts, vectors) if vec is None))
+    if pending:
+        batch_size = max(1, batch_size)
+        batches = [pending[i : i + batch_size] for i in range(0, len(pending), batch_size)]
+        results = await gather_limited(
+            max_workers,
+            [
+                lambda batch=batch: _aembed_batch(
+                    batch,
+                    task_type=task_type,
+                    retries=retries,
+                    delay_seconds=delay_seconds,
+                )
+                for batch in batches
+            ],
+        )
+        fresh = [vec for batch_vectors in results for vec in batch_vectors]
+        if cache is not None:
+            await run_blocking(cache.put_many, cache_model, task_type, pending, fresh)
+        by_text = dict(zip(pending, fresh))
+        vectors = [vec if vec is not None else by_text[t] for t, vec in zip(texts, vectors)]
+
+    return [list(vec) for vec in vectors if vec is not None]
+
+
+def embed_text(
+    text: str,
+    *,
+    task_type: str = "retrieval_document",
+    retries: int = 3,
+    delay_seconds: float = 1.0,
+) -> List[float]:
+    """Blocking ``aembed_text``."""
+    return run_sync(
+        aembed_text(
+            text,
+            task_type=task_type,
+            retries=retries,
+            delay_seconds=delay_seconds,
+        )
+    )
+
+
+def embed_texts(
+    texts: Sequence[str],
+    *,
+    task_type: str = "retrieval_document",
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_workers: int = EMBED_MAX_WORKERS,
+    retries: int = 3,
+    delay_seconds: float = 1.0,
+) -> List[List[float]]:
+    """Blocking ``aembed_texts``."""
+    return run_sync(
+        aembed_texts(
+            texts,
+            task_type=task_type,
+            batch_size=batch_size,
+            max_workers=max_workers,
+            retries=retries,
+            delay_seconds=delay_seconds,
+        )
+    )
+
+
+def cache_stats() -> Dict[str, int]:
+    """Return embedding cache hit/miss counters for this process."""
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"hits": 0, "misses": 0, "entries": 0, "bytes": 0}
+    return cache.stats()
 
 
 def sanity_test() -> bool:
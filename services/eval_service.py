@@ -2,28 +2,22 @@ from __future__ import annotations
 
 from typing import Any, Dict, List
 
-from eval.runner import evaluate_qa, evaluate_summary
+from eval.runner import aevaluate_qa, aevaluate_summary, evaluate_qa, evaluate_summary
+from eval.schemas import QAEvalReport, SummaryEvalResult
 
 
-def run_summary_evaluation(
-    summary_text: str,
-    whitepaper_text: str,
-    use_judge: bool,
-) -> Dict[str, Any]:
-    result = evaluate_summary(summary_text, whitepaper_text, use_judge)
+def _summary_payload(result: SummaryEvalResult) -> Dict[str, Any]:
     return {
         "metrics": result.metrics,
         "passed": result.passed,
         "failures": result.failures,
         "judge": result.judge,
+        "judge_error": result.judge_error,
+        "judge_cached": result.judge_cached,
     }
 
 
-def run_qa_evaluation(
-    qa_items: List[Dict[str, Any]],
-    use_judge: bool,
-) -> Dict[str, Any]:
-    result = evaluate_qa(qa_items, use_judge)
+def _qa_payload(report: QAEvalReport) -> Dict[str, Any]:
     return {
         "items": [
             {
@@ -34,7 +28,39 @@ def run_qa_evaluation(
                 "failures": item.failures,
                 "retrieved_chunks": item.retrieved_chunks,
                 "judge": item.judge,
+                "judge_error": item.judge_error,
+                "judge_cached": item.judge_cached,
             }
-            for item in result.items
+            for item in report.items
         ]
     }
+
+
+def run_summary_evaluation(
+    summary_text: str,
+    whitepaper_text: str,
+    use_judge: bool,
+) -> Dict[str, Any]:
+    return _summary_payload(evaluate_summary(summary_text, whitepaper_text, use_judge))
+
+
+def run_qa_evaluation(
+    qa_items: List[Dict[str, Any]],
+    use_judge: bool,
+) -> Dict[str, Any]:
+    return _qa_payload(evaluate_qa(qa_items, use_judge))
+
+
+async def arun_summary_evaluation(
+    summary_text: str,
+    whitepaper_text: str,
+    use_judge: bool,
+) -> Dict[str, Any]:
+    return _summary_payload(await aevaluate_summary(summary_text, whitepaper_text, use_judge))
+
+
+async def arun_qa_evaluation(
+    qa_items: List[Dict[str, Any]],
+    use_judge: bool,
+) -> Dict[str, Any]:
+    return _qa_payload(await aevaluate_qa(qa_items, use_judge))
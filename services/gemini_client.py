@@ -1,60 +1,124 @@
 from __future__ import annotations
 
-import os
-import warnings
-from typing import Optional
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Iterator, Optional
 
-from dotenv import load_dotenv
-import google.generativeai as genai
-
-warnings.filterwarnings(
-    "ignore",
-    message="All support for the `google.generativeai` package has ended.*",
-    category=FutureWarning,
-)
+from services.aio import aiter_on_client_loop, iterate_sync, on_client_loop, run_sync, run_sync_with_updates
+from services.llm_provider import get_provider
+from services.llm_scheduler import get_scheduler
+from services.tokens import estimate_tokens
 
 
 DEFAULT_MODEL = "gemini-2.5-flash-lite"
 
 
-def _get_api_key() -> str:
-    """Load the Gemini API key from environment."""
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError(
-            "API key missing. Set GEMINI_API_KEY (preferred) or GOOGLE_API_KEY."
-        )
-    return api_key
+def warm_up(model: str = DEFAULT_MODEL, *, temperature: Optional[float] = 0.2) -> None:
+    """Configure the provider, build the default model and open its connection."""
+    run_sync(get_provider().awarm_up(model, temperature))
 
 
-def _get_model(model: str) -> genai.GenerativeModel:
-    """Create and return a Gemini model instance."""
-    api_key = _get_api_key()
-    genai.configure(api_key=api_key)
-    return genai.GenerativeModel(model)
+async def agenerate_text(
+    prompt: str,
+    *,
+    system_prompt: Optional[str] = None,
+    temperature: Optional[float] = 0.2,
+    model: str = DEFAULT_MODEL,
+    on_partial: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Generate text with the configured provider (Gemini by default).
 
+    Calls go through the shared request scheduler at the caller's
+    ``request_priority``. When ``on_partial`` is given the response is
+    streamed and the callback receives the accumulated text after every
+    fragment.
+    """
+    if on_partial is not None:
+        parts = []
+        async with aclosing(
+            agenerate_text_stream(
+                prompt,
+                system_prompt=system_prompt,
+                temperature=temperature,
+                model=model,
+            )
+        ) as stream:
+            async for fragment in stream:
+                parts.append(fragment)
+                on_partial("".join(parts))
+        return "".join(parts).strip()
 
-def generate_text(
+    if system_prompt:
+        prompt = f"{system_prompt}\n\n{prompt}"
+    provider = get_provider()
+    text = await get_scheduler("generate").acall(
+        lambda: on_client_loop(
+            provider.agenerate(prompt, model=model, temperature=temperature)
+        ),
+        tokens=estimate_tokens(prompt),
+    )
+    return text.strip()
+
+
+async def agenerate_text_stream(
     prompt: str,
     *,
     system_prompt: Optional[str] = None,
     temperature: Optional[float] = 0.2,
     model: str = DEFAULT_MODEL,
-) -> str:
-    """Generate text with Gemini for the given prompt."""
+) -> AsyncIterator[str]:
+    """Yield text fragments as they are generated."""
     if system_prompt:
         prompt = f"{system_prompt}\n\n{prompt}"
-    model_client = _get_model(model)
-    response = model_client.generate_content(
-        prompt,
-        generation_config={
-            "temperature": temperature,
-        },
+    provider = get_provider()
+    async with aclosing(
+        get_scheduler("generate").astream(
+            lambda: aiter_on_client_loop(
+                provider.agenerate_stream(prompt, model=model, temperature=temperature)
+            ),
+            tokens=estimate_tokens(prompt),
+        )
+    ) as stream:
+        async for fragment in stream:
+            yield fragment
+
+
+def generate_text(
+    prompt: str,
+    *,
+    system_prompt: Optional[str] = None,
+    temperature: Optional[float] = 0.2,
+    model: str = DEFAULT_MODEL,
+    on_partial: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Blocking ``agenerate_text``; ``on_partial`` runs on the calling thread."""
+    return run_sync_with_updates(
+        lambda callback: agenerate_text(
+            prompt,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            model=model,
+            on_partial=callback,
+        ),
+        on_partial,
+    )
+
+
+def generate_text_stream(
+    prompt: str,
+    *,
+    system_prompt: Optional[str] = None,
+    temperature: Optional[float] = 0.2,
+    model: str = DEFAULT_MODEL,
+) -> Iterator[str]:
+    """Blocking ``agenerate_text_stream``."""
+    return iterate_sync(
+        agenerate_text_stream(
+            prompt,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            model=model,
+        )
     )
-    if not response or not getattr(response, "text", None):
-        raise RuntimeError("Empty response from Gemini.")
-    return response.text.strip()
 
 
 def sanity_test() -> bool:
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from services.embedding_client import embed_texts
+from services.llm_scheduler import with_current_priority
+
+
+_DONE = object()
+_POLL_SECONDS = 0.1
+
+
+def _put(q: "queue.Queue[Any]", item: Any, stop: threading.Event) -> bool:
+    """Block until the item is queued, giving up once the pipeline stops."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: "queue.Queue[Any]", stop: threading.Event) -> Optional[Any]:
+    """Block for the next item; ``None`` means the pipeline stopped."""
+    while True:
+        try:
+            return q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            if stop.is_set():
+                return None
+
+
+def run_ingest(
+    batches: Iterable[List[Dict[str, Any]]],
+    write: Callable[[List[Dict[str, Any]], List[List[float]]], None],
+    *,
+    embed_workers: int,
+    queue_size: int,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Run chunk → embed → write as overlapping stages over bounded queues.
+
+    ``batches`` is consumed lazily on a producer thread, so page extraction
+    and chunking overlap with embedding. ``embed_workers`` threads embed
+    batches concurrently and the calling thread writes them with ``write``.
+    At most ``queue_size`` batches wait between stages, which bounds memory
+    independently of document size. Returns the number of chunks written;
+    the first error from any stage is re-raised after all threads stop.
+    """
+    embed_workers = max(1, embed_workers)
+    embed_q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+    write_q: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def _fail(exc: BaseException) -> None:
+        errors.append(exc)
+        stop.set()
+
+    def _produce() -> None:
+        try:
+            for batch in batches:
+                if batch and not _put(embed_q, batch, stop):
+                    return
+        except BaseException as exc:  # noqa: BLE001
+            _fail(exc)
+        finally:
+            for _ in range(embed_workers):
+                _put(embed_q, _DONE, stop)
+
+    def _embed() -> None:
+        try:
+            while True:
+                batch = _get(embed_q, stop)
+                if batch is None or batch is _DONE:
+                    return
+                vectors = embed_texts(
+                    [chunk["text"] for chunk in batch],
+                    task_type="retrieval_document",
+                    max_workers=1,
+                )
+                if not _put(write_q, (batch, vectors), stop):
+                    return
+        except BaseException as exc:  # noqa: BLE001
+            _fail(exc)
+        finally:
+            _put(write_q, _DONE, stop)
+
+    threads = [threading.Thread(target=_produce, name="ingest-producer", daemon=True)]
+    threads.extend(
+        threading.Thread(target=with_current_priority(_embed), name=f"ingest-embed-{idx}", daemon=True)
+        for idx in range(embed_workers)
+    )
+    for thread in threads:
+        thread.start()
+
+    written = 0
+    finished = 0
+    try:
+        while finished < embed_workers:
+            item = _get(write_q, stop)
+            if item is None:
+                break
+            if item is _DONE:
+                finished += 1
+                continue
+            batch, vectors = item
+            write(batch, vectors)
+            written += len(batch)
+            if on_progress is not None:
+                on_progress(written)
+    except BaseException as exc:  # noqa: BLE001
+        _fail(exc)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return written
@@ -0,0 +1,473 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from services.pdf_parser import compute_doc_id, count_pages, iter_pages, parse_document
+from services.rag_indexer import (
+    estimate_chunk_count,
+    index_document,
+    is_index_current,
+    load_manifest,
+)
+from services.summarizer import summarize_whitepaper
+from services.vector_store import VECTOR_STORE_BACKEND, claim_chroma_dir
+
+
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", "data/jobs.sqlite3"))
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "data/uploads"))
+# Worker threads per process; 0 only submits jobs for other processes to run.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# A running job without a heartbeat for this long is assumed to belong to
+# a process that died, and is queued again.
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))
+_POLL_SECONDS = 1.0
+# Partial summaries are written (and cancellation checked) at most this often.
+_FLUSH_SECONDS = 0.5
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+_COLUMNS = (
+    "id, kind, doc_id, status, source, title, progress_done, progress_total,"
+    " result, error, cancel_requested, created, updated"
+)
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its cancellation was requested."""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    doc_id: str
+    status: str
+    source: str
+    title: Optional[str]
+    progress_done: int
+    progress_total: Optional[int]
+    result: Optional[str]
+    error: Optional[str]
+    cancel_requested: bool
+    created: float
+    updated: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+
+def _row_to_job(row: Tuple) -> Job:
+    values = list(row)
+    values[10] = bool(values[10])
+    return Job(*values)
+
+
+def upload_path(doc_id: str, upload_dir: Path = UPLOAD_DIR) -> Path:
+    """Where ``store_upload`` keeps the PDF for ``doc_id``."""
+    return Path(upload_dir) / f"{doc_id}.pdf"
+
+
+def store_upload(pdf_bytes: bytes, upload_dir: Path = UPLOAD_DIR) -> Tuple[str, Path]:
+    """Save an uploaded PDF as ``<doc_id>.pdf`` and return ``(doc_id, path)``."""
+    doc_id = compute_doc_id(pdf_bytes)
+    path = upload_path(doc_id, upload_dir)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(pdf_bytes)
+        tmp.replace(path)
+    return doc_id, path
+
+
+class JobContext:
+    """Handed to a running job to report progress and observe cancellation."""
+
+    def __init__(self, queue: "JobQueue", job: Job) -> None:
+        self.queue = queue
+        self.job = job
+        self._last_flush = 0.0
+
+    def progress(self, done: int, total: Optional[int] = None) -> None:
+        """Record progress; raises ``JobCancelled`` if cancellation was requested."""
+        if self.queue._update(self.job.id, progress_done=done, progress_total=total):
+            raise JobCancelled(self.job.id)
+
+    def partial(self, text: str) -> None:
+        """Store partial output, throttled; raises ``JobCancelled`` like ``progress``."""
+        now = time.monotonic()
+        if now - self._last_flush < _FLUSH_SECONDS:
+            return
+        self._last_flush = now
+        if self.queue._update(self.job.id, result=text):
+            raise JobCancelled(self.job.id)
+
+
+def _run_index(job: Job, ctx: JobContext) -> Optional[str]:
+    if not is_index_current(job.doc_id):
+        pdf_bytes = Path(job.source).read_bytes()
+        page_count = count_pages(pdf_bytes)
+        seen = {"pages": 0, "chars": 0}
+
+        def _pages() -> Iterator[Dict[str, object]]:
+            for page in iter_pages(pdf_bytes, job.doc_id):
+                seen["pages"] += 1
+                seen["chars"] += len(str(page["text"]))
+                yield page
+
+        def _on_progress(done: int) -> None:
+            # Extrapolate the chunk total from the pages extracted so far.
+            pages = max(seen["pages"], 1)
+            chars = seen["chars"] * max(page_count, pages) // pages
+            ctx.progress(done, max(done, estimate_chunk_count(chars)))
+
+        index_document(job.doc_id, _pages(), title=job.title, on_progress=_on_progress)
+    manifest = load_manifest(job.doc_id) or {}
+    total = int(manifest.get("chunk_count", 0))
+    ctx.progress(total, total)
+    return None
+
+
+def _run_summary(job: Job, ctx: JobContext) -> Optional[str]:
+    parsed = parse_document(Path(job.source).read_bytes(), job.doc_id)
+    if not parsed.full_text.strip():
+        raise ValueError("No text could be extracted from the PDF.")
+    ctx.progress(0, 1)
+    # Long documents report each map round's segments, which is also
+    # where cancellation is checked before the final stream starts.
+    summary = summarize_whitepaper(
+        parsed.full_text,
+        pages=parsed.pages,
+        on_partial=ctx.partial,
+        on_progress=ctx.progress,
+    )
+    ctx.progress(1, 1)
+    return summary
+
+
+JOB_RUNNERS: Dict[str, Callable[[Job, JobContext], Optional[str]]] = {
+    "index": _run_index,
+    "summary": _run_summary,
+}
+
+
+class JobQueue:
+    """Persistent job table in SQLite plus worker threads that run the jobs.
+
+    Every process sharing ``JOBS_DB_PATH`` sees the same jobs, and any
+    process's workers may claim a queued one. With the Chroma backend,
+    only the process that owns ``CHROMA_DIR`` runs workers; the others
+    just submit. Jobs are deduplicated per
+    ``(kind, doc_id)``: submitting while one is queued, running or (still
+    valid and) done returns that job instead. Running jobs heartbeat; ones
+    whose process died are queued again after ``JOB_STALE_SECONDS``.
+    """
+
+    def __init__(self, path: Path = JOBS_DB_PATH, *, workers: int = JOB_WORKERS) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running: Dict[str, str] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(self.path),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " doc_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " source TEXT NOT NULL,"
+            " title TEXT,"
+            " progress_done INTEGER NOT NULL DEFAULT 0,"
+            " progress_total INTEGER,"
+            " result TEXT,"
+            " error TEXT,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " created REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_by_doc ON jobs (doc_id, kind, created)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created)")
+        if workers > 0 and VECTOR_STORE_BACKEND == "chroma" and not claim_chroma_dir():
+            # Index jobs write through this process's Chroma client, which
+            # would clobber the process that owns the directory.
+            print("Job workers disabled: another process owns the Chroma directory.")
+            workers = 0
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{idx}", daemon=True)
+            for idx in range(workers)
+        ]
+        if self._threads:
+            self._threads.append(
+                threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+            )
+        for thread in self._threads:
+            thread.start()
+
+    # -- public API --------------------------------------------------------
+
+    def submit(
+        self,
+        kind: str,
+        doc_id: str,
+        source: Path,
+        *,
+        title: Optional[str] = None,
+        force: bool = False,
+    ) -> Job:
+        """Queue a job for ``doc_id`` unless an equivalent one exists.
+
+        ``force`` ignores finished jobs (e.g. to regenerate a summary) but
+        still returns a queued or running one.
+        """
+        if kind not in JOB_RUNNERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        statuses = ACTIVE_STATUSES if force else ACTIVE_STATUSES + ("done",)
+        placeholders = ",".join("?" for _ in statuses)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE kind = ? AND doc_id = ?"
+                    f" AND status IN ({placeholders}) ORDER BY created DESC",
+                    (kind, doc_id, *statuses),
+                ).fetchall()
+                existing = next(
+                    (job for job in map(_row_to_job, rows) if self._reusable(job)),
+                    None,
+                )
+                if existing is None:
+                    existing = Job(
+                        id=uuid.uuid4().hex,
+                        kind=kind,
+                        doc_id=doc_id,
+                        status="queued",
+                        source=str(source),
+                        title=title,
+                        progress_done=0,
+                        progress_total=None,
+                        result=None,
+                        error=None,
+                        cancel_requested=False,
+                        created=now,
+                        updated=now,
+                    )
+                    self._conn.execute(
+                        f"INSERT INTO jobs ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            existing.id,
+                            kind,
+                            doc_id,
+                            "queued",
+                            existing.source,
+                            title,
+                            0,
+                            None,
+                            None,
+                            None,
+                            0,
+                            now,
+                            now,
+                        ),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._wake.set()
+        return existing
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return _row_to_job(row) if row else None
+
+    def latest(self, doc_id: str, kind: str) -> Optional[Job]:
+        """Most recent job of ``kind`` for ``doc_id``."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM jobs WHERE doc_id = ? AND kind = ?"
+                " ORDER BY created DESC LIMIT 1",
+                (doc_id, kind),
+            ).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list_jobs(self, doc_id: Optional[str] = None, limit: int = 50) -> List[Job]:
+        query = f"SELECT {_COLUMNS} FROM jobs"
+        params: Tuple = ()
+        if doc_id is not None:
+            query += " WHERE doc_id = ?"
+            params = (doc_id,)
+        query += " ORDER BY created DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, (*params, limit)).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job now, or ask a running one to stop.
+
+        Running jobs stop at their next progress report. Returns False when
+        the job is unknown or already finished.
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, updated = ?"
+                " WHERE id = ? AND status = 'queued'",
+                (now, job_id),
+            )
+            if cursor.rowcount:
+                return True
+            cursor = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'",
+                (job_id,),
+            )
+            return bool(cursor.rowcount)
+
+    # -- workers -----------------------------------------------------------
+
+    @staticmethod
+    def _reusable(job: Job) -> bool:
+        # A finished index is only reusable while it still matches the
+        # current index parameters.
+        if job.status == "done" and job.kind == "index":
+            return is_index_current(job.doc_id)
+        return True
+
+    def _update(self, job_id: str, **fields: object) -> bool:
+        """Update a job's columns and heartbeat; returns ``cancel_requested``."""
+        fields = {key: value for key, value in fields.items() if value is not None}
+        assignments = "".join(f"{key} = ?, " for key in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments}updated = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id),
+            )
+            row = self._conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return bool(row and row[0])
+
+    def _claim(self) -> Optional[Job]:
+        """Atomically move the oldest queued job to running."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN cancel_requested"
+                    " THEN 'cancelled' ELSE 'queued' END"
+                    " WHERE status = 'running' AND updated < ?",
+                    (now - JOB_STALE_SECONDS,),
+                )
+                row = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM jobs WHERE status = 'queued'"
+                    " ORDER BY created LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', updated = ? WHERE id = ?",
+                        (now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = _row_to_job(row)
+        job.status = "running"
+        return job
+
+    def _finish(
+        self,
+        job_id: str,
+        status: str,
+        *,
+        result: Optional[str] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = COALESCE(?, result), error = ?,"
+                " updated = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def _run(self, job: Job) -> None:
+        self._running[job.id] = job.kind
+        try:
+            result = JOB_RUNNERS[job.kind](job, JobContext(self, job))
+        except JobCancelled:
+            self._finish(job.id, "cancelled")
+        except Exception as exc:  # noqa: BLE001
+            self._finish(job.id, "failed", error=f"{type(exc).__name__}: {exc}")
+        else:
+            self._finish(job.id, "done", result=result)
+        finally:
+            self._running.pop(job.id, None)
+
+    def _work(self) -> None:
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as exc:
+                print(f"Job queue poll failed: {exc}")
+                job = None
+            if job is None:
+                self._wake.wait(_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(JOB_STALE_SECONDS / 4)
+            for job_id in list(self._running):
+                try:
+                    self._update(job_id)
+                except sqlite3.Error as exc:
+                    print(f"Job heartbeat failed: {exc}")
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue, starting its workers on first use."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+def submit_document(pdf_bytes: bytes, *, title: Optional[str] = None) -> Dict[str, Job]:
+    """Store an upload and start its index and summary jobs together."""
+    doc_id, path = store_upload(pdf_bytes)
+    queue = get_job_queue()
+    return {
+        "index": queue.submit("index", doc_id, path, title=title),
+        "summary": queue.submit("summary", doc_id, path, title=title),
+    }
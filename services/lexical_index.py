@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import math
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric terms; short terms keep token symbols like ETH."""
+    return [term for term in _TOKEN_RE.findall(text.lower()) if len(term) >= 2]
+
+
+class LexicalIndex:
+    """Inverted index of term -> {chunk id: term frequency} with BM25 scoring."""
+
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, chunk_id: str, text: str) -> None:
+        terms = tokenize(text)
+        previous = self.doc_lengths.get(chunk_id)
+        if previous is not None:
+            self._total_length -= previous
+        self.doc_lengths[chunk_id] = len(terms)
+        self._total_length += len(terms)
+        for term, count in Counter(terms).items():
+            self.postings.setdefault(term, {})[chunk_id] = count
+
+    def has_any_term(self, terms: Iterable[str], chunk_ids: Iterable[str]) -> bool:
+        """Whether any of ``terms`` occurs in any of ``chunk_ids``."""
+        ids = set(chunk_ids)
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings and not ids.isdisjoint(postings):
+                return True
+        return False
+
+    def search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        """Return the top chunk ids by BM25 score for the query."""
+        n_docs = len(self.doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self._total_length / n_docs or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in postings.items():
+                length = self.doc_lengths.get(chunk_id, 0)
+                norm = tf + BM25_K1 * (1.0 - BM25_B + BM25_B * length / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / norm
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n_results]
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(
+            json.dumps({"doc_lengths": self.doc_lengths, "postings": self.postings}),
+            encoding="utf-8",
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["LexicalIndex"]:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        index = cls()
+        index.doc_lengths = {str(k): int(v) for k, v in data.get("doc_lengths", {}).items()}
+        index.postings = data.get("postings", {})
+        index._total_length = sum(index.doc_lengths.values())
+        return index
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[str]:
+    """Fuse several ranked id lists; ids ranked high in any list come first."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return [chunk_id for chunk_id, _ in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
@@ -0,0 +1,659 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import warnings
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+import google.generativeai as genai
+import numpy as np
+
+from services.aio import run_blocking
+
+warnings.filterwarnings(
+    "ignore",
+    message="All support for the `google.generativeai` package has ended.*",
+    category=FutureWarning,
+)
+
+
+# "gemini" calls the API, "record" calls it and appends every response to
+# LLM_RECORDINGS_PATH, "replay" serves recordings or synthetic output offline.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+RECORDINGS_PATH = Path(os.getenv("LLM_RECORDINGS_PATH", "data/llm_recordings.jsonl"))
+# Latency specs: "recorded", "fixed:MS", "uniform:LO_MS:HI_MS",
+# "normal:MEAN_MS:STD_MS" or "lognormal:MEDIAN_MS:SIGMA".
+REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "recorded")
+REPLAY_EMBED_LATENCY = os.getenv("LLM_REPLAY_EMBED_LATENCY", REPLAY_LATENCY)
+REPLAY_ERROR_RATE = float(os.getenv("LLM_REPLAY_ERROR_RATE", "0"))
+# gemini-embedding-001 returns 3072-dimensional vectors.
+REPLAY_EMBEDDING_DIM = int(os.getenv("LLM_REPLAY_EMBEDDING_DIM", "3072"))
+REPLAY_SEED = int(os.getenv("LLM_REPLAY_SEED", "0"))
+# Term vectors kept for synthetic embeddings; 4096 x 3072 float32 is ~50 MB.
+REPLAY_TERM_CACHE_SIZE = int(os.getenv("LLM_REPLAY_TERM_CACHE_SIZE", "4096"))
+
+
+class LLMProvider(ABC):
+    """Backend for text generation and embeddings.
+
+    The ``a*`` methods run on the client loop (``services.aio``). Their
+    defaults wrap the blocking methods; providers with a native async
+    client override them.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def generate(self, prompt: str, *, model: str, temperature: Optional[float]) -> str: ...
+
+    @abstractmethod
+    def generate_stream(
+        self,
+        prompt: str,
+        *,
+        model: str,
+        temperature: Optional[float],
+    ) -> Iterator[str]: ...
+
+    @abstractmethod
+    def embed(self, texts: Sequence[str], *, model: str, task_type: str) -> List[List[float]]: ...
+
+    def warm_up(self, model: str, temperature: Optional[float]) -> None:
+        """Open connections ahead of the first real call, if that applies."""
+
+    async def agenerate(self, prompt: str, *, model: str, temperature: Optional[float]) -> str:
+        return await run_blocking(self.generate, prompt, model=model, temperature=temperature)
+
+    async def agenerate_stream(
+        self,
+        prompt: str,
+        *,
+        model: str,
+        temperature: Optional[float],
+    ) -> AsyncIterator[str]:
+        yield await self.agenerate(prompt, model=model, temperature=temperature)
+
+    async def aembed(
+        self,
+        texts: Sequence[str],
+        *,
+        model: str,
+        task_type: str,
+    ) -> List[List[float]]:
+        return await run_blocking(self.embed, texts, model=model, task_type=task_type)
+
+    async def awarm_up(self, model: str, temperature: Optional[float]) -> None:
+        await run_blocking(self.warm_up, model, temperature)
+
+
+def _get_api_key() -> str:
+    """Load the Gemini API key from environment."""
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError(
+            "API key missing. Set GEMINI_API_KEY (preferred) or GOOGLE_API_KEY."
+        )
+    return api_key
+
+
+_configure_lock = threading.Lock()
+_configured = False
+_models: Dict[Tuple[str, Tuple[Tuple[str, Any], ...]], genai.GenerativeModel] = {}
+
+
+def configure_client() -> None:
+    """Read credentials and configure the Gemini SDK once per process.
+
+    Re-running ``genai.configure`` drops the SDK's cached transport, so
+    configuring once lets every caller share the same connections.
+    """
+    global _configured
+    if _configured:
+        return
+    with _configure_lock:
+        if not _configured:
+            genai.configure(api_key=_get_api_key())
+            _configured = True
+
+
+def _config_key(generation_config: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    return tuple(sorted(generation_config.items()))
+
+
+def _get_model(
+    model: str,
+    generation_config: Optional[Dict[str, Any]] = None,
+) -> genai.GenerativeModel:
+    """Return a cached Gemini model instance for the model and config."""
+    config = {k: v for k, v in (generation_config or {}).items() if v is not None}
+    key = (model, _config_key(config))
+    model_client = _models.get(key)
+    if model_client is not None:
+        return model_client
+    configure_client()
+    with _configure_lock:
+        model_client = _models.get(key)
+        if model_client is None:
+            model_client = genai.GenerativeModel(model, generation_config=config or None)
+            _models[key] = model_client
+    return model_client
+
+
+def _chunk_text(chunk: Any) -> str:
+    try:
+        return getattr(chunk, "text", "") or ""
+    except ValueError:
+        # Raised by the SDK for chunks without text parts (e.g. safety stops).
+        return ""
+
+
+def _parse_embeddings(response: object, expected: int) -> List[List[float]]:
+    embedding = response.get("embedding") if isinstance(response, dict) else None
+    if embedding is None and hasattr(response, "embedding"):
+        embedding = response.embedding
+    if not embedding:
+        raise RuntimeError("Empty embedding response.")
+    # A single string yields a flat vector, a list of strings a list of vectors.
+    if not isinstance(embedding[0], (list, tuple)):
+        embedding = [embedding]
+    if len(embedding) != expected:
+        raise RuntimeError(
+            f"Embedding response size mismatch: expected {expected}, got {len(embedding)}."
+        )
+    return [list(vec) for vec in embedding]
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def generate(self, prompt, *, model, temperature):
+        response = _get_model(model, {"temperature": temperature}).generate_content(prompt)
+        if not response or not getattr(response, "text", None):
+            raise RuntimeError("Empty response from Gemini.")
+        return response.text
+
+    def generate_stream(self, prompt, *, model, temperature):
+        model_client = _get_model(model, {"temperature": temperature})
+        response = model_client.generate_content(prompt, stream=True)
+        produced = False
+        for chunk in response:
+            text = _chunk_text(chunk)
+            if text:
+                produced = True
+                yield text
+        if not produced:
+            raise RuntimeError("Empty response from Gemini.")
+
+    def embed(self, texts, *, model, task_type):
+        configure_client()
+        content: object = texts[0] if len(texts) == 1 else list(texts)
+        response = genai.embed_content(model=model, content=content, task_type=task_type)
+        return _parse_embeddings(response, len(texts))
+
+    def warm_up(self, model, temperature):
+        _get_model(model, {"temperature": temperature}).count_tokens("OK")
+
+    async def agenerate(self, prompt, *, model, temperature):
+        model_client = _get_model(model, {"temperature": temperature})
+        response = await model_client.generate_content_async(prompt)
+        if not response or not getattr(response, "text", None):
+            raise RuntimeError("Empty response from Gemini.")
+        return response.text
+
+    async def agenerate_stream(self, prompt, *, model, temperature):
+        model_client = _get_model(model, {"temperature": temperature})
+        response = await model_client.generate_content_async(prompt, stream=True)
+        produced = False
+        async for chunk in response:
+            text = _chunk_text(chunk)
+            if text:
+                produced = True
+                yield text
+        if not produced:
+            raise RuntimeError("Empty response from Gemini.")
+
+    async def aembed(self, texts, *, model, task_type):
+        configure_client()
+        content: object = texts[0] if len(texts) == 1 else list(texts)
+        response = await genai.embed_content_async(
+            model=model,
+            content=content,
+            task_type=task_type,
+        )
+        return _parse_embeddings(response, len(texts))
+
+    async def awarm_up(self, model, temperature):
+        await _get_model(model, {"temperature": temperature}).count_tokens_async("OK")
+
+
+def _generate_key(prompt: str, model: str, temperature: Optional[float]) -> str:
+    payload = json.dumps(["generate", model, temperature, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _embed_key(text: str, model: str, task_type: str) -> str:
+    payload = json.dumps(["embed", model, task_type, text], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecordingProvider(LLMProvider):
+    """Pass calls through to ``inner`` and append responses and latencies.
+
+    Embeddings are recorded per text so replay does not depend on how
+    texts were batched.
+    """
+
+    name = "record"
+
+    def __init__(self, inner: LLMProvider, path: Path = RECORDINGS_PATH) -> None:
+        self.inner = inner
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _append(self, records: List[Dict[str, Any]]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        with self._lock, self.path.open("a", encoding="utf-8") as handle:
+            handle.write(lines)
+
+    def _record_text(
+        self,
+        prompt: str,
+        model: str,
+        temperature: Optional[float],
+        start: float,
+        text: str,
+        fragments: Optional[int] = None,
+    ) -> None:
+        record: Dict[str, Any] = {
+            "key": _generate_key(prompt, model, temperature),
+            "kind": "generate",
+            "model": model,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "text": text,
+        }
+        if fragments is not None:
+            record["fragments"] = fragments
+        self._append([record])
+
+    def _record_vectors(
+        self,
+        texts: Sequence[str],
+        model: str,
+        task_type: str,
+        start: float,
+        vectors: List[List[float]],
+    ) -> None:
+        latency_ms = round((time.perf_counter() - start) * 1000, 1)
+        self._append(
+            [
+                {
+                    "key": _embed_key(text, model, task_type),
+                    "kind": "embed",
+                    "model": model,
+                    "latency_ms": latency_ms,
+                    "batch_size": len(texts),
+                    "vector": vector,
+                }
+                for text, vector in zip(texts, vectors)
+            ]
+        )
+
+    def generate(self, prompt, *, model, temperature):
+        start = time.perf_counter()
+        text = self.inner.generate(prompt, model=model, temperature=temperature)
+        self._record_text(prompt, model, temperature, start, text)
+        return text
+
+    def generate_stream(self, prompt, *, model, temperature):
+        start = time.perf_counter()
+        parts = []
+        for fragment in self.inner.generate_stream(prompt, model=model, temperature=temperature):
+            parts.append(fragment)
+            yield fragment
+        self._record_text(prompt, model, temperature, start, "".join(parts), len(parts))
+
+    def embed(self, texts, *, model, task_type):
+        start = time.perf_counter()
+        vectors = self.inner.embed(texts, model=model, task_type=task_type)
+        self._record_vectors(texts, model, task_type, start, vectors)
+        return vectors
+
+    def warm_up(self, model, temperature):
+        self.inner.warm_up(model, temperature)
+
+    async def agenerate(self, prompt, *, model, temperature):
+        start = time.perf_counter()
+        text = await self.inner.agenerate(prompt, model=model, temperature=temperature)
+        await run_blocking(self._record_text, prompt, model, temperature, start, text)
+        return text
+
+    async def agenerate_stream(self, prompt, *, model, temperature):
+        start = time.perf_counter()
+        parts = []
+        async for fragment in self.inner.agenerate_stream(
+            prompt,
+            model=model,
+            temperature=temperature,
+        ):
+            parts.append(fragment)
+            yield fragment
+        await run_blocking(
+            self._record_text, prompt, model, temperature, start, "".join(parts), len(parts)
+        )
+
+    async def aembed(self, texts, *, model, task_type):
+        start = time.perf_counter()
+        vectors = await self.inner.aembed(texts, model=model, task_type=task_type)
+        await run_blocking(self._record_vectors, texts, model, task_type, start, vectors)
+        return vectors
+
+    async def awarm_up(self, model, temperature):
+        await self.inner.awarm_up(model, temperature)
+
+
+class SimulatedProviderError(RuntimeError):
+    """Injected failure from the replay provider, worded like a 429."""
+
+
+def _latency_sampler(spec: str) -> Any:
+    """Return ``f(rng, recorded_ms) -> ms`` for a latency spec."""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(":") if value]
+    if kind == "recorded":
+        return lambda rng, recorded: recorded or 0.0
+    if kind == "fixed":
+        return lambda rng, recorded: values[0]
+    if kind == "uniform":
+        return lambda rng, recorded: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda rng, recorded: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda rng, recorded: values[0] * rng.lognormvariate(0.0, values[1])
+    raise ValueError(f"Unknown latency spec: {spec}")
+
+
+_HEADING_RE = re.compile(r"^[A-Z][A-Z /&]{3,}$")
+# Input labels such as "CONTEXT CHUNKS:" end the output-format block.
+_LABEL_RE = re.compile(r"^[A-Z][A-Z0-9 ()/,_-]*:$")
+_CHUNK_REF_RE = re.compile(r"^\[Chunk \d+\] (.*?Page \S+ \| Section: .+)$", re.MULTILINE)
+_JSON_FIELD_RE = re.compile(r'"(\w+)":\s*(0-5|"[^"]*"|\[[^\]]*\])')
+_SENTENCE_RE = re.compile(r"[A-Z][^.!?\n]{20,200}[.!?]")
+
+
+def _format_headings(prompt: str) -> Tuple[List[str], str]:
+    """Headings of the prompt's output format, and the input text after it."""
+    marker = prompt.find("OUTPUT FORMAT")
+    if marker == -1:
+        return [], prompt
+    headings: List[str] = []
+    lines = prompt[marker:].splitlines()
+    for idx, line in enumerate(lines[1:], start=1):
+        line = line.strip()
+        if _LABEL_RE.match(line):
+            return headings, "\n".join(lines[idx:])
+        if _HEADING_RE.match(line) and line not in headings:
+            headings.append(line)
+    return headings, prompt
+
+
+def _synthetic_text(prompt: str, seed: int) -> str:
+    """Deterministic, correctly shaped output for the prompt families here.
+
+    Judge prompts get JSON with every requested field, prompts with an
+    OUTPUT FORMAT get each heading filled with sentences from the prompt's
+    own input text, and REFERENCES cite the prompt's context chunks.
+    """
+    rng = random.Random(seed)
+    if "Return JSON only" in prompt:
+        fields: Dict[str, Any] = {}
+        for name, shape in _JSON_FIELD_RE.findall(prompt):
+            if shape == "0-5":
+                fields[name] = rng.randint(3, 5)
+            elif shape.startswith("["):
+                fields[name] = []
+            else:
+                fields[name] = "Synthetic judge verdict."
+        return json.dumps(fields)
+
+    headings, source = _format_headings(prompt)
+    if not headings:
+        return "OK"
+    sentences = _SENTENCE_RE.findall(source) or ["Synthetic output for offline testing."]
+    refs = list(dict.fromkeys(_CHUNK_REF_RE.findall(prompt)))[:3]
+    blocks = []
+    for heading in headings:
+        if heading == "REFERENCES":
+            body = "\n".join(f"- {ref}" for ref in refs) or "- Page 1 | Section: Introduction"
+        else:
+            picks = rng.sample(sentences, min(2, len(sentences)))
+            body = "\n".join(f"- {sentence}" for sentence in picks)
+        blocks.append(f"{heading}\n{body}")
+    return "\n\n".join(blocks)
+
+
+class ReplayProvider(LLMProvider):
+    """Offline stand-in serving recorded or synthetic responses.
+
+    Recorded responses are used when the request hash matches. Otherwise
+    embeddings are a normalized sum of hash-seeded vectors per term (so
+    similar texts stay close), and text follows the prompt's output format.
+    Latency follows ``REPLAY_LATENCY`` and ``error_rate`` of calls raise
+    ``SimulatedProviderError``.
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        path: Path = RECORDINGS_PATH,
+        *,
+        latency: str = REPLAY_LATENCY,
+        embed_latency: str = REPLAY_EMBED_LATENCY,
+        error_rate: float = REPLAY_ERROR_RATE,
+        dim: int = REPLAY_EMBEDDING_DIM,
+        seed: int = REPLAY_SEED,
+        term_cache_size: int = REPLAY_TERM_CACHE_SIZE,
+    ) -> None:
+        self.dim = dim
+        self.term_cache_size = term_cache_size
+        self.error_rate = error_rate
+        self._latency = _latency_sampler(latency)
+        self._embed_latency = _latency_sampler(embed_latency)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._seed = seed
+        self._texts: Dict[str, Tuple[str, float]] = {}
+        self._vectors: Dict[str, Tuple[List[float], float]] = {}
+        self._term_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._load(Path(path))
+
+    def _load(self, path: Path) -> None:
+        if not path.exists():
+            return
+        with path.open(encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                latency = float(record.get("latency_ms", 0.0))
+                if record.get("kind") == "generate":
+                    self._texts[record["key"]] = (record["text"], latency)
+                elif record.get("kind") == "embed":
+                    self._vectors[record["key"]] = (record["vector"], latency)
+
+    def _sample(self, sampler: Any, recorded_ms: float) -> Tuple[float, bool]:
+        """Draw (delay in seconds, whether the call fails)."""
+        with self._lock:
+            delay_ms = sampler(self._rng, recorded_ms)
+            fail = self._rng.random() < self.error_rate
+        return max(0.0, delay_ms) / 1000.0, fail
+
+    def _simulate(self, sampler: Any, recorded_ms: float) -> None:
+        delay, fail = self._sample(sampler, recorded_ms)
+        time.sleep(delay)
+        if fail:
+            raise SimulatedProviderError("429 Resource has been exhausted (simulated).")
+
+    async def _asimulate(self, sampler: Any, recorded_ms: float) -> None:
+        delay, fail = self._sample(sampler, recorded_ms)
+        await asyncio.sleep(delay)
+        if fail:
+            raise SimulatedProviderError("429 Resource has been exhausted (simulated).")
+
+    def _term_vector(self, term: str) -> np.ndarray:
+        with self._lock:
+            vector = self._term_vectors.get(term)
+            if vector is not None:
+                self._term_vectors.move_to_end(term)
+        if vector is not None:
+            return vector
+        digest = hashlib.sha256(f"{self._seed}:{term}".encode("utf-8")).digest()
+        rng = np.random.default_rng(int.from_bytes(digest[:8], "little"))
+        vector = rng.standard_normal(self.dim).astype(np.float32)
+        with self._lock:
+            self._term_vectors[term] = vector
+            while len(self._term_vectors) > self.term_cache_size:
+                self._term_vectors.popitem(last=False)
+        return vector
+
+    def _synthetic_vector(self, text: str) -> List[float]:
+        terms = re.findall(r"[a-z0-9]+", text.lower()) or [text]
+        total = np.zeros(self.dim, dtype=np.float32)
+        for term in terms:
+            total += self._term_vector(term)
+        norm = float(np.linalg.norm(total))
+        return (total / norm if norm else total).tolist()
+
+    def _text_for(
+        self,
+        prompt: str,
+        model: str,
+        temperature: Optional[float],
+    ) -> Tuple[str, float]:
+        key = _generate_key(prompt, model, temperature)
+        recorded = self._texts.get(key)
+        if recorded is not None:
+            return recorded
+        return _synthetic_text(prompt, int(key[:8], 16) ^ self._seed), 0.0
+
+    def generate(self, prompt, *, model, temperature):
+        text, recorded_ms = self._text_for(prompt, model, temperature)
+        self._simulate(self._latency, recorded_ms)
+        return text
+
+    def generate_stream(self, prompt, *, model, temperature):
+        text, recorded_ms = self._text_for(prompt, model, temperature)
+        delay, fail = self._sample(self._latency, recorded_ms)
+        # Half the latency is spent before the first fragment (or the
+        # error); the rest is spread over the remaining fragments.
+        time.sleep(delay / 2)
+        if fail:
+            raise SimulatedProviderError("429 Resource has been exhausted (simulated).")
+        fragments = re.findall(r"\S+\s*", text) or [text]
+        per_fragment = delay / 2 / max(1, len(fragments) - 1)
+        for idx, fragment in enumerate(fragments):
+            if idx:
+                time.sleep(per_fragment)
+            yield fragment
+
+    def _vectors_for(
+        self,
+        texts: Sequence[str],
+        model: str,
+        task_type: str,
+    ) -> Tuple[List[List[float]], float]:
+        vectors = []
+        recorded_ms = 0.0
+        for text in texts:
+            recorded = self._vectors.get(_embed_key(text, model, task_type))
+            if recorded is not None:
+                vectors.append(list(recorded[0]))
+                recorded_ms = max(recorded_ms, recorded[1])
+            else:
+                vectors.append(self._synthetic_vector(text))
+        return vectors, recorded_ms
+
+    def embed(self, texts, *, model, task_type):
+        vectors, recorded_ms = self._vectors_for(texts, model, task_type)
+        self._simulate(self._embed_latency, recorded_ms)
+        return vectors
+
+    async def agenerate(self, prompt, *, model, temperature):
+        text, recorded_ms = self._text_for(prompt, model, temperature)
+        await self._asimulate(self._latency, recorded_ms)
+        return text
+
+    async def agenerate_stream(self, prompt, *, model, temperature):
+        text, recorded_ms = self._text_for(prompt, model, temperature)
+        delay, fail = self._sample(self._latency, recorded_ms)
+        await asyncio.sleep(delay / 2)
+        if fail:
+            raise SimulatedProviderError("429 Resource has been exhausted (simulated).")
+        fragments = re.findall(r"\S+\s*", text) or [text]
+        per_fragment = delay / 2 / max(1, len(fragments) - 1)
+        for idx, fragment in enumerate(fragments):
+            if idx:
+                await asyncio.sleep(per_fragment)
+            yield fragment
+
+    async def aembed(self, texts, *, model, task_type):
+        vectors, recorded_ms = await run_blocking(self._vectors_for, texts, model, task_type)
+        await self._asimulate(self._embed_latency, recorded_ms)
+        return vectors
+
+    async def awarm_up(self, model, temperature):
+        return None
+
+
+def model_tag(model: str) -> str:
+    """Model name qualified by provider, for caches that outlive a process.
+
+    Recording passes real responses through, so it shares the plain name;
+    replayed output is namespaced so it never mixes with real results.
+    """
+    provider = get_provider()
+    if provider.name in ("gemini", "record"):
+        return model
+    return f"{model}@{provider.name}"
+
+
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> LLMProvider:
+    """Return the process-wide provider selected by ``LLM_PROVIDER``."""
+    global _provider
+    if _provider is not None:
+        return _provider
+    with _provider_lock:
+        if _provider is None:
+            if LLM_PROVIDER == "gemini":
+                _provider = GeminiProvider()
+            elif LLM_PROVIDER == "record":
+                _provider = RecordingProvider(GeminiProvider())
+            elif LLM_PROVIDER == "replay":
+                _provider = ReplayProvider()
+            else:
+                raise ValueError(f"Unknown LLM provider: {LLM_PROVIDER}")
+    return _provider
+
+
+def set_provider(provider: Optional[LLMProvider]) -> None:
+    """Replace the process-wide provider; ``None`` reselects from ``LLM_PROVIDER``."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,442 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import aclosing, contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+# Lower values are admitted first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_BULK: "bulk",
+}
+
+# Per-minute quotas; 0 disables a bucket.
+LLM_RPM = int(os.getenv("LLM_RPM", "1000"))
+LLM_TPM = int(os.getenv("LLM_TPM", "1000000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+EMBED_RPM = int(os.getenv("EMBED_RPM", "1500"))
+EMBED_TPM = int(os.getenv("EMBED_TPM", "1000000"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "64"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1.0"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+# Waiters re-check the buckets at least this often.
+_POLL_SECONDS = 0.25
+# Concurrency is halved at most once per window, so one burst of 429s
+# from calls that were already in flight counts as a single signal.
+_DECREASE_WINDOW_SECONDS = 1.0
+_WAIT_SAMPLES = 1000
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar(
+    "llm_priority", default=PRIORITY_NORMAL
+)
+_attempt_timeout: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "llm_attempt_timeout", default=None
+)
+
+
+class request_priority:
+    """Run provider calls made inside the block at ``level``.
+
+    Also usable as a decorator on plain and ``async`` functions.
+    """
+
+    def __init__(self, level: int) -> None:
+        self.level = level
+        self._tokens: list[contextvars.Token[int]] = []
+
+    def __enter__(self) -> None:
+        self._tokens.append(_priority.set(self.level))
+
+    def __exit__(self, *exc_info: Any) -> None:
+        _priority.reset(self._tokens.pop())
+
+    def __call__(self, fn: Callable[..., T]) -> Callable[..., T]:
+        level = self.level
+        if asyncio.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def _async(*args: Any, **kwargs: Any) -> Any:
+                with request_priority(level):
+                    return await fn(*args, **kwargs)
+
+            return _async  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def _sync(*args: Any, **kwargs: Any) -> T:
+            with request_priority(level):
+                return fn(*args, **kwargs)
+
+        return _sync
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+@contextmanager
+def attempt_timeout(seconds: Optional[float]) -> Iterator[None]:
+    """Limit each admitted ``acall`` attempt inside the block to ``seconds``.
+
+    Time spent queued for admission or backing off between retries does
+    not count; a timed-out attempt is retried like any other failure.
+    """
+    token = _attempt_timeout.set(seconds)
+    try:
+        yield
+    finally:
+        _attempt_timeout.reset(token)
+
+
+def with_current_priority(fn: Callable[..., T]) -> Callable[..., T]:
+    """Bind the caller's priority to ``fn`` so worker threads inherit it."""
+    level = _priority.get()
+
+    @functools.wraps(fn)
+    def _run(*args: Any, **kwargs: Any) -> T:
+        token = _priority.set(level)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _priority.reset(token)
+
+    return _run
+
+
+def is_throttle_error(exc: BaseException) -> bool:
+    """True for rate-limit responses (HTTP 429 / RESOURCE_EXHAUSTED)."""
+    if getattr(exc, "code", None) == 429:
+        return True
+    if type(exc).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(exc)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "quota" in message.lower()
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """Configuration and request errors fail fast; everything else is retried."""
+    if isinstance(exc, (ValueError, TypeError)):
+        return False
+    if type(exc).__name__ in ("InvalidArgument", "PermissionDenied", "Unauthenticated", "NotFound"):
+        return False
+    return True
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter for the given 1-based attempt."""
+    return random.uniform(0.0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class _TokenBucket:
+    """Refills ``per_minute`` units evenly over a minute, bursting up to a minute's worth."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 when they are)."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+
+class _Waiter:
+    """Queued call; granting it wakes a future on the awaiting task's loop."""
+
+    __slots__ = ("priority", "seq", "tokens", "queued", "granted", "loop", "future")
+
+    def __init__(self, priority: int, seq: int, tokens: int) -> None:
+        self.priority = priority
+        self.seq = seq
+        self.tokens = tokens
+        self.queued = time.monotonic()
+        self.granted = threading.Event()
+        self.loop = asyncio.get_running_loop()
+        self.future: asyncio.Future[None] = self.loop.create_future()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def grant(self) -> None:
+        self.granted.set()
+        self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self) -> None:
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class RequestScheduler:
+    """Admits provider calls under rate limits, in priority order.
+
+    Each call waits for a concurrency slot plus room in the requests- and
+    tokens-per-minute buckets. Waiters are served strictly by priority,
+    then arrival. The concurrency limit grows by one slot per window of
+    successes and halves on throttling (AIMD); throttled and transient
+    failures are retried with jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        rpm: int,
+        tpm: int,
+        max_concurrency: int,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE_SECONDS,
+        backoff_max: float = LLM_BACKOFF_MAX_SECONDS,
+    ) -> None:
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max(1, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._lock = threading.Lock()
+        self._requests = _TokenBucket(rpm)
+        self._tokens = _TokenBucket(tpm)
+        self._limit = float(self.max_concurrency)
+        self._last_decrease = 0.0
+        self._in_flight = 0
+        self._heap: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._waits: deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._counters = {"admitted": 0, "throttled": 0, "retries": 0, "failed": 0}
+
+    # -- admission ---------------------------------------------------------
+
+    def _dispatch_locked(self) -> Optional[float]:
+        """Admit waiters from the head of the queue while capacity allows.
+
+        Returns how long the head must wait for the buckets, or ``None``
+        when it is blocked on concurrency (a release will wake it).
+        """
+        while self._heap:
+            if self._in_flight >= int(self._limit):
+                return None
+            head = self._heap[0]
+            now = time.monotonic()
+            delay = max(self._requests.delay(1, now), self._tokens.delay(head.tokens, now))
+            if delay > 0:
+                return delay
+            heapq.heappop(self._heap)
+            self._requests.take(1)
+            self._tokens.take(head.tokens)
+            self._in_flight += 1
+            self._counters["admitted"] += 1
+            self._waits.append(now - head.queued)
+            head.grant()
+        return None
+
+    async def aacquire(self, tokens: int, priority: Optional[int] = None) -> None:
+        """Wait until a call of ``tokens`` estimated tokens may start.
+
+        A cancelled waiter leaves the queue (or frees its slot).
+        """
+        level = current_priority() if priority is None else priority
+        waiter = _Waiter(level, next(self._seq), max(0, tokens))
+        with self._lock:
+            heapq.heappush(self._heap, waiter)
+            delay = self._dispatch_locked()
+        try:
+            while not waiter.granted.is_set():
+                await asyncio.wait(
+                    [waiter.future],
+                    timeout=min(delay or _POLL_SECONDS, _POLL_SECONDS),
+                )
+                with self._lock:
+                    delay = self._dispatch_locked()
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted.is_set()
+                if not granted:
+                    self._heap.remove(waiter)
+                    heapq.heapify(self._heap)
+            if granted:
+                self.release()
+            raise
+
+    def release(self, *, throttled: bool = False) -> None:
+        """Free the slot taken by ``aacquire`` and adapt the concurrency limit."""
+        with self._lock:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self._counters["throttled"] += 1
+                if now - self._last_decrease >= _DECREASE_WINDOW_SECONDS:
+                    self._limit = max(1.0, self._limit / 2.0)
+                    self._last_decrease = now
+            else:
+                self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            self._dispatch_locked()
+
+    # -- calls -------------------------------------------------------------
+
+    def _should_retry(self, exc: BaseException, attempt: int, retries: int) -> bool:
+        if attempt >= retries or not is_retryable_error(exc):
+            with self._lock:
+                self._counters["failed"] += 1
+            return False
+        with self._lock:
+            self._counters["retries"] += 1
+        return True
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        *,
+        tokens: int = 0,
+        priority: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+    ) -> T:
+        """Await ``fn()`` once admitted.
+
+        Throttled and transient failures are retried up to ``retries``
+        times with jittered exponential backoff.
+        """
+        retries = self.max_retries if retries is None else max(1, retries)
+        base = self.backoff_base if backoff_base is None else backoff_base
+        timeout = _attempt_timeout.get()
+        for attempt in itertools.count(1):
+            await self.aacquire(tokens, priority)
+            try:
+                result = await asyncio.wait_for(fn(), timeout)
+            except Exception as exc:  # noqa: BLE001
+                self.release(throttled=is_throttle_error(exc))
+                if not self._should_retry(exc, attempt, retries):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, base, self.backoff_max))
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release()
+            return result
+        raise AssertionError("unreachable")
+
+    async def astream(
+        self,
+        open_stream: Callable[[], AsyncIterator[T]],
+        *,
+        tokens: int = 0,
+        priority: Optional[int] = None,
+    ) -> AsyncIterator[T]:
+        """Yield from ``open_stream()`` while holding a slot.
+
+        Failures before the first item are retried like ``acall``; once
+        output has been yielded the error is raised to the caller.
+        """
+        for attempt in itertools.count(1):
+            await self.aacquire(tokens, priority)
+            started = False
+            try:
+                async with aclosing(open_stream()) as stream:
+                    async for item in stream:
+                        started = True
+                        yield item
+            except Exception as exc:  # noqa: BLE001
+                self.release(throttled=is_throttle_error(exc))
+                if started or not self._should_retry(exc, attempt, self.max_retries):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, self.backoff_base, self.backoff_max))
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release()
+            return
+
+    # -- metrics -----------------------------------------------------------
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, wait times and limiter state for this scheduler."""
+        with self._lock:
+            waits = sorted(self._waits)
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for waiter in self._heap:
+                key = PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))
+                depth[key] = depth.get(key, 0) + 1
+            return {
+                "queue_depth": len(self._heap),
+                "queue_depth_by_priority": depth,
+                "in_flight": self._in_flight,
+                "concurrency_limit": int(self._limit),
+                "wait_p50_s": round(waits[len(waits) // 2], 4) if waits else 0.0,
+                "wait_p95_s": round(waits[int(0.95 * (len(waits) - 1))], 4) if waits else 0.0,
+                "wait_max_s": round(waits[-1], 4) if waits else 0.0,
+                **self._counters,
+            }
+
+
+_schedulers: Dict[str, RequestScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(kind: str) -> RequestScheduler:
+    """Return the process-wide scheduler for ``"generate"`` or ``"embed"`` calls.
+
+    The two kinds have separate quotas on the Gemini API, so each gets its
+    own buckets and concurrency limit.
+    """
+    scheduler = _schedulers.get(kind)
+    if scheduler is None:
+        with _schedulers_lock:
+            scheduler = _schedulers.get(kind)
+            if scheduler is None:
+                if kind == "embed":
+                    scheduler = RequestScheduler(
+                        kind,
+                        rpm=EMBED_RPM,
+                        tpm=EMBED_TPM,
+                        max_concurrency=EMBED_MAX_CONCURRENCY,
+                    )
+                elif kind == "generate":
+                    scheduler = RequestScheduler(
+                        kind,
+                        rpm=LLM_RPM,
+                        tpm=LLM_TPM,
+                        max_concurrency=LLM_MAX_CONCURRENCY,
+                    )
+                else:
+                    raise ValueError(f"Unknown scheduler kind: {kind}")
+                _schedulers[kind] = scheduler
+    return scheduler
+
+
+def scheduler_metrics() -> Dict[str, Dict[str, Any]]:
+    """Metrics for every scheduler created in this process."""
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {kind: scheduler.metrics() for kind, scheduler in schedulers.items()}
@@ -1,25 +1,412 @@
 from __future__ import annotations
 
-from typing import BinaryIO, Dict, List
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
 
 import fitz  # PyMuPDF
 
+from services.sectionizer import (
+    MAX_HEADING_CHARS,
+    DocumentOutline,
+    FontLine,
+    OutlineBuilder,
+)
+
+
+PARSED_CACHE_SIZE = int(os.getenv("PARSED_DOC_CACHE_SIZE", "8"))
+PARSED_CACHE_DIR = Path(os.getenv("PARSED_DOC_CACHE_DIR", "data/parsed"))
+PERSIST_PARSED_DOCS = os.getenv("PERSIST_PARSED_DOCS", "1") not in ("0", "false", "False")
+# Documents with at least this many pages are extracted on a process pool;
+# 0 (the default) always extracts serially. Measure with
+# benchmarks/bench_pdf_extraction.py on the target machine before enabling:
+# process start-up costs more than it saves on small files or few cores.
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "0"))
+PDF_MAX_PROCESSES = int(os.getenv("PDF_MAX_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Pages are joined with this separator in full_text; chunk offsets and
+# section offsets index into that text.
+PAGE_SEPARATOR = "\n\n"
+_BOLD_FLAG = 16
+
+# (page text, font lines, characters per font size) for one page.
+_PageRecord = Tuple[str, List[FontLine], Dict[float, int]]
+
+_cache: "OrderedDict[str, ParsedDocument]" = OrderedDict()
+_cache_lock = threading.Lock()
+# doc_id -> [lock, holders and waiters]; guarded by _cache_lock.
+_parse_locks: Dict[str, List[Any]] = {}
+
+
+@dataclass
+class ParsedDocument:
+    """Text of a PDF extracted once and shared by summary, indexing and eval."""
+
+    doc_id: str
+    pages: List[Dict[str, object]]
+    full_text: str
+    # Section outline: {"offset", "page_number", "section"} in offset order,
+    # with offsets into full_text.
+    sections: List[Dict[str, object]] = field(default_factory=list)
+
+    def outline(self) -> DocumentOutline:
+        return DocumentOutline.from_entries(self.sections)
+
+    def text_span(self, char_start: int, char_end: int) -> str:
+        """Rebuild chunk text from the offsets recorded at index time."""
+        return self.full_text[char_start:char_end]
+
+
+def compute_doc_id(pdf_bytes: bytes) -> str:
+    return hashlib.sha256(pdf_bytes).hexdigest()[:16]
+
+
+_worker_doc: Optional[fitz.Document] = None
+
+
+def _init_worker(pdf_source: object) -> None:
+    """Open the document once per worker process from a path or bytes."""
+    global _worker_doc
+    if isinstance(pdf_source, str):
+        _worker_doc = fitz.open(pdf_source)
+    else:
+        _worker_doc = fitz.open(stream=pdf_source, filetype="pdf")
+
+
+def _font_lines(page_dict: Dict[str, Any]) -> Tuple[List[FontLine], Dict[float, int]]:
+    """Collect short lines with their font size/boldness and a size histogram."""
+    lines: List[FontLine] = []
+    size_chars: Dict[float, int] = defaultdict(int)
+    for block in page_dict.get("blocks", []):
+        if block.get("type") != 0:
+            continue
+        for line in block.get("lines", []):
+            spans = [span for span in line.get("spans", []) if span.get("text", "").strip()]
+            if not spans:
+                continue
+            for span in spans:
+                size_chars[round(span["size"], 1)] += len(span["text"].strip())
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            if len(text) > MAX_HEADING_CHARS:
+                continue
+            bold = all(
+                span.get("flags", 0) & _BOLD_FLAG or "bold" in span.get("font", "").lower()
+                for span in spans
+            )
+            lines.append((text, round(max(span["size"] for span in spans), 1), bool(bold)))
+    return lines, dict(size_chars)
+
+
+def _extract_page(page: fitz.Page, structured: bool) -> _PageRecord:
+    if not structured:
+        return page.get_text("text") or "", [], {}
+    # One structured-text pass serves both the plain text and the fonts.
+    textpage = page.get_textpage()
+    text = page.get_text("text", textpage=textpage) or ""
+    lines, size_chars = _font_lines(page.get_text("dict", textpage=textpage))
+    return text, lines, size_chars
+
+
+def _extract_range(task: Tuple[int, int, bool]) -> List[_PageRecord]:
+    start, stop, structured = task
+    if _worker_doc is None:
+        raise RuntimeError("Worker document is not initialized.")
+    return [_extract_page(_worker_doc[idx], structured) for idx in range(start, stop)]
+
+
+def _page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    size = max(1, -(-page_count // parts))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+
+def _iter_page_records(
+    pdf_bytes: bytes,
+    *,
+    path: Optional[str] = None,
+    parallel: Optional[bool] = None,
+    max_workers: int = PDF_MAX_PROCESSES,
+    structured: bool = False,
+) -> Iterator[_PageRecord]:
+    doc = fitz.open(path) if path else fitz.open(stream=pdf_bytes, filetype="pdf")
+    page_count = doc.page_count
+    if parallel is None:
+        parallel = 0 < PARALLEL_MIN_PAGES <= page_count
+    if not parallel or max_workers <= 1 or page_count < 2:
+        try:
+            for page in doc:
+                yield _extract_page(page, structured)
+        finally:
+            doc.close()
+        return
+    doc.close()
+
+    # More ranges than workers balances pages with uneven extraction cost.
+    tasks = [
+        (start, stop, structured)
+        for start, stop in _page_ranges(page_count, max_workers * 4)
+    ]
+    source: object = path if path else pdf_bytes
+    # Never fork: callers run on threads (job workers, the client loop) and a
+    # forked child can inherit their locks mid-acquire.
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(tasks)),
+        mp_context=multiprocessing.get_context(method),
+        initializer=_init_worker,
+        initargs=(source,),
+    ) as executor:
+        # map() yields each range as soon as it and its predecessors finish.
+        for records in executor.map(_extract_range, tasks):
+            yield from records
+
+
+def iter_page_texts(
+    pdf_bytes: bytes,
+    *,
+    path: Optional[str] = None,
+    parallel: Optional[bool] = None,
+    max_workers: int = PDF_MAX_PROCESSES,
+) -> Iterator[str]:
+    """Yield raw text for every page, in page order, as pages are extracted.
+
+    Large documents are split into page ranges across a process pool; each
+    worker opens the document once from ``path`` or the shared bytes.
+    ``parallel`` forces the mode; by default it depends on page count.
+    """
+    for text, _lines, _sizes in _iter_page_records(
+        pdf_bytes,
+        path=path,
+        parallel=parallel,
+        max_workers=max_workers,
+    ):
+        yield text
+
+
+def extract_page_texts(
+    pdf_bytes: bytes,
+    *,
+    path: Optional[str] = None,
+    parallel: Optional[bool] = None,
+    max_workers: int = PDF_MAX_PROCESSES,
+) -> List[str]:
+    """Extract raw text for every page, in page order."""
+    return list(
+        iter_page_texts(
+            pdf_bytes,
+            path=path,
+            parallel=parallel,
+            max_workers=max_workers,
+        )
+    )
+
+
+def count_pages(pdf_bytes: bytes) -> int:
+    """Page count without extracting any text."""
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return doc.page_count
+    finally:
+        doc.close()
+
+
+def _read_toc(pdf_bytes: bytes) -> List[List[object]]:
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        return doc.get_toc(simple=True)
+    finally:
+        doc.close()
+
+
+def _parse_pdf_bytes(doc_id: str, pdf_bytes: bytes) -> ParsedDocument:
+    """Extract every page once and build the parsed document."""
+    return _build_document(doc_id, list(_iter_page_dicts(pdf_bytes)))
+
+
+def _iter_page_dicts(pdf_bytes: bytes) -> Iterator[Dict[str, object]]:
+    """Yield pages with the section headings found on each."""
+    builder = OutlineBuilder(_read_toc(pdf_bytes))
+    offset = 0
+    seen_text = False
+    records = _iter_page_records(pdf_bytes, structured=True)
+    for idx, (raw_text, font_lines, size_chars) in enumerate(records, start=1):
+        text = raw_text.strip()
+        headings: List[Dict[str, object]] = []
+        if text:
+            if seen_text:
+                offset += len(PAGE_SEPARATOR)
+            seen_text = True
+            headings = builder.add_page(idx, text, offset, font_lines, size_chars)
+            offset += len(text)
+        yield {
+            "page_number": idx,
+            "text": text,
+            "headings": headings,
+        }
+
+
+def _build_document(doc_id: str, pages: List[Dict[str, object]]) -> ParsedDocument:
+    full_text = PAGE_SEPARATOR.join(str(page["text"]) for page in pages if page["text"])
+    sections = [
+        {**heading, "page_number": page["page_number"]}
+        for page in pages
+        for heading in page.get("headings", [])
+    ]
+    return ParsedDocument(
+        doc_id=doc_id,
+        pages=[
+            {"page_number": page["page_number"], "text": page["text"]}
+            for page in pages
+        ],
+        full_text=full_text,
+        sections=sections,
+    )
+
+
+def _cache_path(doc_id: str) -> Path:
+    return PARSED_CACHE_DIR / f"{doc_id}.json"
+
+
+def _load_from_disk(doc_id: str) -> Optional[ParsedDocument]:
+    path = _cache_path(doc_id)
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        parsed = ParsedDocument(**data)
+    except (OSError, ValueError, TypeError):
+        return None
+    # Files written before sections carried offsets are re-parsed.
+    if any("offset" not in entry for entry in parsed.sections):
+        return None
+    return parsed
+
+
+def _save_to_disk(parsed: ParsedDocument) -> None:
+    try:
+        PARSED_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _cache_path(parsed.doc_id)
+        tmp_path = path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(asdict(parsed)), encoding="utf-8")
+        tmp_path.replace(path)
+    except OSError:
+        pass
+
+
+def _remember(parsed: ParsedDocument) -> None:
+    with _cache_lock:
+        _cache[parsed.doc_id] = parsed
+        _cache.move_to_end(parsed.doc_id)
+        while len(_cache) > PARSED_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+@contextmanager
+def _parsing(doc_id: str) -> Iterator[None]:
+    """Serialize extraction of one document so concurrent callers parse it once."""
+    with _cache_lock:
+        entry = _parse_locks.setdefault(doc_id, [threading.Lock(), 0])
+        entry[1] += 1
+    # A plain Lock: iter_pages may be closed on another thread than the
+    # one that started it.
+    entry[0].acquire()
+    try:
+        yield
+    finally:
+        entry[0].release()
+        with _cache_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                _parse_locks.pop(doc_id, None)
+
+
+def get_parsed_document(doc_id: str) -> Optional[ParsedDocument]:
+    """Return a previously parsed document from memory or disk, if present."""
+    with _cache_lock:
+        parsed = _cache.get(doc_id)
+        if parsed is not None:
+            _cache.move_to_end(doc_id)
+            return parsed
+    if PERSIST_PARSED_DOCS:
+        parsed = _load_from_disk(doc_id)
+        if parsed is not None:
+            _remember(parsed)
+            return parsed
+    return None
+
+
+def parse_document(pdf_bytes: bytes, doc_id: Optional[str] = None) -> ParsedDocument:
+    """Parse PDF bytes once, serving repeat requests from the cache.
+
+    Concurrent calls (or an ``iter_pages`` in progress) for the same
+    document wait for the first extraction instead of repeating it.
+    """
+    doc_id = doc_id or compute_doc_id(pdf_bytes)
+    parsed = get_parsed_document(doc_id)
+    if parsed is not None:
+        return parsed
+    if not pdf_bytes:
+        return ParsedDocument(doc_id=doc_id, pages=[], full_text="")
+
+    with _parsing(doc_id):
+        parsed = get_parsed_document(doc_id)
+        if parsed is not None:
+            return parsed
+        parsed = _parse_pdf_bytes(doc_id, pdf_bytes)
+        _remember(parsed)
+        if PERSIST_PARSED_DOCS:
+            _save_to_disk(parsed)
+    return parsed
+
+
+def _cached_pages(parsed: ParsedDocument) -> Iterator[Dict[str, object]]:
+    headings: Dict[object, List[Dict[str, object]]] = defaultdict(list)
+    for entry in parsed.sections:
+        headings[entry["page_number"]].append(
+            {"offset": entry["offset"], "section": entry["section"]}
+        )
+    for page in parsed.pages:
+        yield {**page, "headings": headings.get(page["page_number"], [])}
+
+
+def iter_pages(pdf_bytes: bytes, doc_id: Optional[str] = None) -> Iterator[Dict[str, object]]:
+    """Yield page dicts as they are extracted, filling the cache when done.
+
+    A document already in the cache is served from it without reopening
+    the PDF. While pages stream, other callers parsing the same document
+    wait for this extraction.
+    """
+    doc_id = doc_id or compute_doc_id(pdf_bytes)
+    parsed = get_parsed_document(doc_id)
+    if parsed is None and pdf_bytes:
+        with _parsing(doc_id):
+            parsed = get_parsed_document(doc_id)
+            if parsed is None:
+                pages: List[Dict[str, object]] = []
+                for page in _iter_page_dicts(pdf_bytes):
+                    pages.append(page)
+                    yield page
+                parsed = _build_document(doc_id, pages)
+                _remember(parsed)
+                if PERSIST_PARSED_DOCS:
+                    _save_to_disk(parsed)
+                return
+    if parsed is not None:
+        yield from _cached_pages(parsed)
+
 
 def extract_text_from_pdf(file: BinaryIO) -> str:
     """Extract and clean text from all pages of a PDF file."""
     pdf_bytes = file.read()
     if not pdf_bytes:
         return ""
-
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages_text = []
-    for page in doc:
-        text = page.get_text("text")
-        if text:
-            pages_text.append(text.strip())
-
-    doc.close()
-    return "\n\n".join(pages_text).strip()
+    return parse_document(pdf_bytes).full_text
 
 
 def extract_pages_from_pdf(file: BinaryIO) -> List[Dict[str, object]]:
@@ -27,17 +414,4 @@ def extract_pages_from_pdf(file: BinaryIO) -> List[Dict[str, object]]:
     pdf_bytes = file.read()
     if not pdf_bytes:
         return []
-
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    pages = []
-    for idx, page in enumerate(doc, start=1):
-        text = page.get_text("text") or ""
-        pages.append(
-            {
-                "page_number": idx,
-                "text": text.strip(),
-            }
-        )
-
-    doc.close()
-    return pages
+    return [dict(page) for page in parse_document(pdf_bytes).pages]
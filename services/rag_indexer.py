@@ -1,27 +1,46 @@
 from __future__ import annotations
 
+import json
 import os
 import re
+import threading
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional
 
-os.environ.setdefault("CHROMA_TELEMETRY", "FALSE")
-os.environ.setdefault("POSTHOG_DISABLED", "1")
+from services.answer_cache import get_answer_cache
+from services.embedding_client import EMBED_BATCH_SIZE, EMBED_MAX_WORKERS, EMBEDDING_MODEL
+from services.ingest_pipeline import run_ingest
+from services.lexical_index import LexicalIndex
+from services.llm_provider import model_tag
+from services.llm_scheduler import PRIORITY_BULK, request_priority
+from services.pdf_parser import PAGE_SEPARATOR
+from services.sectionizer import DocumentOutline, heading_title
+from services.tokens import CHARS_PER_TOKEN, estimate_tokens
+from services.vector_store import (
+    CHROMA_DIR,
+    STORE_CACHE_SIZE,
+    VECTOR_STORE_BACKEND,
+    VectorStore,
+    drop_store,
+    open_store,
+)
 
-import chromadb
-from chromadb.config import Settings
-import pydantic
 
-from services.embedding_client import embed_text
-from services.sectionizer import iter_lines_with_section
+MANIFEST_DIR = CHROMA_DIR / "manifests"
+LEXICAL_DIR = CHROMA_DIR / "lexical"
+# Bump when chunk ids, metadata, chunking or companion index files change.
+INDEX_VERSION = 5
+# Approximate tokens; gemini-embedding-001 accepts up to 2048 per input.
+CHUNK_TARGET_TOKENS = 400
+CHUNK_OVERLAP_TOKENS = 50
+# Batches allowed to wait between ingest stages.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
 
-
-CHROMA_DIR = Path("data/chroma")
-
-
-class _NoOpEmbeddingFunction:
-    def __call__(self, texts: list[str]) -> list[list[float]]:
-        return [[0.0] for _ in texts]
+_lexical_lock = threading.Lock()
+_lexical_indexes: "OrderedDict[str, LexicalIndex]" = OrderedDict()
+# Manifest mtime seen when each collection's pooled handles were opened.
+_manifest_seen: Dict[str, Optional[int]] = {}
 
 
 def _safe_collection_name(doc_id: str) -> str:
@@ -29,118 +48,374 @@ def _safe_collection_name(doc_id: str) -> str:
     return f"doc_{safe}"
 
 
-def _get_client() -> chromadb.Client:
-    CHROMA_DIR.mkdir(parents=True, exist_ok=True)
-    chroma_version = getattr(chromadb, "__version__", "unknown")
-    print(f"ChromaDB version: {chroma_version}")
-    pyd_version = getattr(pydantic, "__version__", "unknown")
-    print(f"Pydantic version: {pyd_version}")
-    if pyd_version != "unknown":
-        major = int(pyd_version.split(".", maxsplit=1)[0])
-        if major >= 2:
-            raise RuntimeError("Pydantic>=2 detected. Please install pydantic<2.")
-
-    return chromadb.Client(
-        Settings(
-            chroma_db_impl="duckdb+parquet",
-            persist_directory=str(CHROMA_DIR),
-            anonymized_telemetry=False,
-        )
-    )
+def _manifest_path(doc_id: str) -> Path:
+    return MANIFEST_DIR / f"{_safe_collection_name(doc_id)}.json"
 
 
-def build_or_load_index(doc_id: str) -> chromadb.Collection:
-    """Create or load a persistent Chroma collection for the doc."""
-    client = _get_client()
-    return client.get_or_create_collection(
-        name=_safe_collection_name(doc_id),
-        metadata={"hnsw:space": "cosine"},
-        embedding_function=_NoOpEmbeddingFunction(),
-    )
+def _index_params() -> Dict[str, Any]:
+    return {
+        "index_version": INDEX_VERSION,
+        "embedding_model": model_tag(EMBEDDING_MODEL),
+        "vector_store": VECTOR_STORE_BACKEND,
+        "chunker": {
+            "target_tokens": CHUNK_TARGET_TOKENS,
+            "overlap_tokens": CHUNK_OVERLAP_TOKENS,
+        },
+    }
 
 
-def _chunk_page_text(
-    page_text: str,
-    *,
-    target_size: int = 1600,
-    overlap: int = 200,
-) -> List[Dict[str, str]]:
-    """Chunk a page's text while tracking current section."""
-    lines = page_text.splitlines()
-    buffer = ""
-    chunks: List[Dict[str, str]] = []
-    last_section = "Unknown Section"
-
-    for section, line in iter_lines_with_section(lines):
-        if line.strip():
-            last_section = section
-        line_with_break = line.strip() + "\n"
-        buffer += line_with_break
-
-        if len(buffer) >= target_size:
-            chunks.append(
-                {
-                    "text": buffer.strip(),
-                    "section": last_section,
-                }
-            )
-            buffer = buffer[-overlap:].lstrip()
+def load_manifest(doc_id: str) -> Optional[Dict[str, Any]]:
+    """Return the stored index manifest for a doc, if any."""
+    path = _manifest_path(doc_id)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
 
-    if buffer.strip():
-        chunks.append({"text": buffer.strip(), "section": last_section})
-    return chunks
 
+def _write_manifest(doc_id: str, chunk_count: int, title: Optional[str] = None) -> None:
+    MANIFEST_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "doc_id": doc_id,
+        "collection": _safe_collection_name(doc_id),
+        "title": title or doc_id,
+        **_index_params(),
+        "chunk_count": chunk_count,
+        "complete": True,
+    }
+    path = _manifest_path(doc_id)
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
 
-def index_document(doc_id: str, pages: List[Dict[str, object]]) -> None:
-    """Index a document's pages into Chroma."""
-    client = _get_client()
-    collection = client.get_or_create_collection(
-        name=_safe_collection_name(doc_id),
-        metadata={"hnsw:space": "cosine"},
-        embedding_function=_NoOpEmbeddingFunction(),
-    )
+
+def _clear_manifest(doc_id: str) -> None:
     try:
-        collection.delete(where={"doc_id": doc_id})
-    except Exception:  # noqa: BLE001
+        _manifest_path(doc_id).unlink()
+    except FileNotFoundError:
         pass
 
-    ids: List[str] = []
-    documents: List[str] = []
-    metadatas: List[Dict[str, object]] = []
-    embeddings: List[List[float]] = []
 
-    chunk_id = 0
+def is_index_current(doc_id: str) -> bool:
+    """Whether a complete index built with the current parameters exists."""
+    manifest = load_manifest(doc_id)
+    if not manifest or not manifest.get("complete"):
+        return False
+    if manifest.get("doc_id") != doc_id:
+        return False
+    return all(manifest.get(key) == value for key, value in _index_params().items())
+
+
+def _manifest_mtime(doc_id: str) -> Optional[int]:
+    try:
+        return _manifest_path(doc_id).stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _refresh_if_rebuilt(doc_id: str) -> None:
+    """Drop pooled handles for a doc whose manifest changed since they were opened.
+
+    Another process (an API worker or job runner) may have re-indexed it.
+    """
+    name = _safe_collection_name(doc_id)
+    mtime = _manifest_mtime(doc_id)
+    with _lexical_lock:
+        if _manifest_seen.get(name, mtime) == mtime:
+            _manifest_seen[name] = mtime
+            return
+        _manifest_seen[name] = mtime
+        _lexical_indexes.pop(name, None)
+    drop_store(name)
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        answer_cache.invalidate(doc_id)
+
+
+def list_indexed_documents() -> List[Dict[str, Any]]:
+    """Return manifests of every document with a current, complete index."""
+    if not MANIFEST_DIR.exists():
+        return []
+    params = _index_params()
+    manifests = []
+    for path in sorted(MANIFEST_DIR.glob("*.json")):
+        try:
+            manifest = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if not manifest.get("complete") or not manifest.get("doc_id"):
+            continue
+        if all(manifest.get(key) == value for key, value in params.items()):
+            manifests.append(manifest)
+    return manifests
+
+
+def _lexical_path(doc_id: str) -> Path:
+    return LEXICAL_DIR / f"{_safe_collection_name(doc_id)}.json"
+
+
+def get_lexical_index(doc_id: str) -> Optional[LexicalIndex]:
+    """Return the doc's BM25 index, loading it once and keeping it pooled."""
+    _refresh_if_rebuilt(doc_id)
+    name = _safe_collection_name(doc_id)
+    with _lexical_lock:
+        index = _lexical_indexes.get(name)
+        if index is not None:
+            _lexical_indexes.move_to_end(name)
+            return index
+    index = LexicalIndex.load(_lexical_path(doc_id))
+    if index is None:
+        return None
+    with _lexical_lock:
+        _lexical_indexes[name] = index
+        while len(_lexical_indexes) > STORE_CACHE_SIZE:
+            _lexical_indexes.popitem(last=False)
+    return index
+
+
+def build_or_load_index(doc_id: str) -> VectorStore:
+    """Create or load the doc's vector store on the configured backend."""
+    _refresh_if_rebuilt(doc_id)
+    return open_store(_safe_collection_name(doc_id), doc_id)
+
+
+class _Line(NamedTuple):
+    page_number: int
+    page_text: str
+    # Span within page_text, and the page's offset in the document text.
+    start: int
+    end: int
+    page_offset: int
+    tokens: int
+    section: str
+
+
+def _iter_lines(
+    pages: Iterable[Dict[str, object]],
+    max_line_chars: int,
+) -> Iterator[_Line]:
+    """Yield line spans of the document text with their section labels.
+
+    Sections come from each page's ``headings`` (document offsets from
+    ``pdf_parser.iter_pages``) and are looked up in a growing outline.
+    Pages without ``headings`` fall back to per-line heading heuristics.
+    """
+    outline = DocumentOutline()
+    doc_offset = 0
+    first_page = True
     for page in pages:
-        page_number = int(page.get("page_number", 0))
         page_text = str(page.get("text", "") or "")
-        if not page_text.strip():
+        if not page_text:
             continue
+        if not first_page:
+            doc_offset += len(PAGE_SEPARATOR)
+        first_page = False
+        page_number = int(page.get("page_number", 0))
+        headings = page.get("headings")
+        if isinstance(headings, list):
+            for heading in headings:
+                outline.add(int(heading["offset"]), str(heading["section"]))
 
-        chunks = _chunk_page_text(page_text)
-        for chunk in chunks:
-            chunk_text = chunk["text"]
-            if not chunk_text.strip():
-                continue
-            section = chunk.get("section", "Unknown Section")
-            chunk_id += 1
-            chunk_key = f"{doc_id}_p{page_number}_c{chunk_id}"
-            ids.append(chunk_key)
-            documents.append(chunk_text)
-            metadatas.append(
-                {
-                    "doc_id": doc_id,
-                    "page": page_number,
-                    "section": section,
-                    "chunk_id": chunk_id,
-                }
+        start = 0
+        length = len(page_text)
+        while start <= length:
+            end = page_text.find("\n", start)
+            if end == -1:
+                end = length
+            if headings is None:
+                heading = heading_title(page_text[start:end])
+                if heading is not None:
+                    outline.add(doc_offset + start, heading)
+            section = outline.section_at(doc_offset + start)
+            # Overlong lines are cut at spaces into max_line_chars pieces.
+            while end - start > max_line_chars:
+                cut = page_text.rfind(" ", start + 1, start + max_line_chars)
+                if cut == -1:
+                    cut = start + max_line_chars
+                piece = page_text[start:cut]
+                yield _Line(
+                    page_number, page_text, start, cut, doc_offset,
+                    estimate_tokens(piece.strip()), section,
+                )
+                start = cut
+            piece = page_text[start:end]
+            yield _Line(
+                page_number, page_text, start, end, doc_offset,
+                estimate_tokens(piece.strip()), section,
             )
-            embeddings.append(embed_text(chunk_text, task_type="retrieval_document"))
+            start = end + 1
+        doc_offset += length
+
+
+def _emit_chunk(window: Deque[_Line]) -> Optional[Dict[str, Any]]:
+    lines = [line for line in window if line.tokens]
+    if not lines:
+        return None
+    first, last = lines[0], lines[-1]
+    parts: List[str] = []
+    segment_start = first
+    previous = first
+    for line in lines[1:]:
+        if line.page_number != previous.page_number:
+            parts.append(segment_start.page_text[segment_start.start : previous.end])
+            segment_start = line
+        previous = line
+    parts.append(segment_start.page_text[segment_start.start : last.end])
+    return {
+        "text": PAGE_SEPARATOR.join(parts),
+        "section": last.section,
+        "page": first.page_number,
+        "page_end": last.page_number,
+        "char_start": first.page_offset + first.start,
+        "char_end": last.page_offset + last.end,
+    }
+
+
+def _keep_overlap(window: Deque[_Line], window_tokens: int, overlap_tokens: int) -> int:
+    """Trim ``window`` to a tail of whole lines within ``overlap_tokens``."""
+    while window and window_tokens > overlap_tokens:
+        window_tokens -= window.popleft().tokens
+    while window and not window[0].tokens:
+        window.popleft()
+    return window_tokens
+
+
+def _chunk_pages(
+    pages: Iterable[Dict[str, object]],
+    *,
+    target_tokens: int = CHUNK_TARGET_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Dict[str, Any]]:
+    """Chunk a document's pages in one linear pass over line offsets.
+
+    Chunks hold up to about ``target_tokens`` approximate tokens, may span
+    page boundaries and repeat up to ``overlap_tokens`` of the previous
+    chunk. Each chunk records its page span and its character span in the
+    document text (pages joined by ``PAGE_SEPARATOR``), so its text equals
+    ``ParsedDocument.full_text[char_start:char_end]``.
+    """
+    window: Deque[_Line] = deque()
+    window_tokens = 0
+    has_new_lines = False
+    # Overlong lines are split to a quarter of the target, and the window
+    # is flushed before a line that would overflow it.
+    max_line_chars = max(1, target_tokens // 4) * CHARS_PER_TOKEN
+    for line in _iter_lines(pages, max_line_chars):
+        if not window and not line.tokens:
+            continue
+        if has_new_lines and window_tokens + line.tokens > target_tokens:
+            chunk = _emit_chunk(window)
+            if chunk is not None:
+                yield chunk
+            has_new_lines = False
+            window_tokens = _keep_overlap(window, window_tokens, overlap_tokens)
+        window.append(line)
+        window_tokens += line.tokens
+        has_new_lines = True
+        if window_tokens < target_tokens:
+            continue
+
+        chunk = _emit_chunk(window)
+        if chunk is not None:
+            yield chunk
+        has_new_lines = False
+        window_tokens = _keep_overlap(window, window_tokens, overlap_tokens)
 
-    if ids:
-        collection.add(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas,
+    if has_new_lines:
+        chunk = _emit_chunk(window)
+        if chunk is not None:
+            yield chunk
+
+
+def estimate_chunk_count(chars: int) -> int:
+    """Rough number of chunks ``index_document`` writes for ``chars`` of text."""
+    stride = (CHUNK_TARGET_TOKENS - CHUNK_OVERLAP_TOKENS) * CHARS_PER_TOKEN
+    return max(1, -(-chars // stride))
+
+
+def _iter_chunks(doc_id: str, pages: Iterable[Dict[str, object]]) -> Iterator[Dict[str, Any]]:
+    """Lazily chunk pages into records ready for embedding and storage."""
+    for chunk_id, chunk in enumerate(_chunk_pages(pages), start=1):
+        yield {
+            "id": f"{doc_id}_p{chunk['page']}_c{chunk_id}",
+            "text": chunk["text"],
+            "metadata": {
+                "doc_id": doc_id,
+                "page": chunk["page"],
+                "page_end": chunk["page_end"],
+                "section": chunk["section"],
+                "chunk_id": chunk_id,
+                "char_start": chunk["char_start"],
+                "char_end": chunk["char_end"],
+            },
+        }
+
+
+def _iter_batches(chunks: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch: List[Dict[str, Any]] = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@request_priority(PRIORITY_BULK)
+def index_document(
+    doc_id: str,
+    pages: Iterable[Dict[str, object]],
+    *,
+    force: bool = False,
+    title: Optional[str] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> None:
+    """Index a document's pages into the configured vector store.
+
+    ``pages`` may be a lazy iterator (see ``pdf_parser.iter_pages``):
+    extraction, chunking, embedding and batched writes overlap, and
+    memory is bounded by ``INGEST_QUEUE_SIZE`` batches.
+
+    Skipped when a complete manifest with matching parameters exists,
+    unless ``force`` is set. ``title`` (e.g. the upload's file name) is
+    recorded in the manifest so corpus search can cite the document.
+    ``on_progress`` receives the number of chunks written after each batch;
+    an exception raised from it aborts indexing.
+    """
+    if not force and is_index_current(doc_id):
+        return
+
+    _clear_manifest(doc_id)
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        answer_cache.invalidate(doc_id)
+    with _lexical_lock:
+        _lexical_indexes.pop(_safe_collection_name(doc_id), None)
+    store = build_or_load_index(doc_id)
+    store.reset()
+    lexical = LexicalIndex()
+
+    def _write(batch: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
+        for chunk in batch:
+            lexical.add(chunk["id"], chunk["text"])
+        store.add(
+            ids=[chunk["id"] for chunk in batch],
+            documents=[chunk["text"] for chunk in batch],
+            metadatas=[chunk["metadata"] for chunk in batch],
             embeddings=embeddings,
         )
-        client.persist()
\ No newline at end of file
+
+    chunk_count = run_ingest(
+        _iter_batches(_iter_chunks(doc_id, pages), EMBED_BATCH_SIZE),
+        _write,
+        embed_workers=EMBED_MAX_WORKERS,
+        queue_size=INGEST_QUEUE_SIZE,
+        on_progress=on_progress,
+    )
+    if chunk_count:
+        store.persist()
+    lexical.save(_lexical_path(doc_id))
+    _write_manifest(doc_id, chunk_count, title)
@@ -1,21 +1,34 @@
 from __future__ import annotations
 
+import os
 import re
 from pathlib import Path
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional, Sequence
 
-from services.embedding_client import embed_text
-from services.gemini_client import generate_text
-from services.rag_indexer import build_or_load_index
+from services.aio import run_blocking, run_sync, run_sync_with_updates
+from services.answer_cache import ANSWER_CACHE_SIMILARITY, context_digest, get_answer_cache
+from services.answer_format import CORPUS_NOT_FOUND_ANSWER, NOT_FOUND_ANSWER
+from services.context_builder import CONTEXT_MAX_CHUNKS, ContextChunk, assemble_context
+from services.corpus_search import asearch_corpus
+from services.embedding_client import aembed_text
+from services.gemini_client import DEFAULT_MODEL, agenerate_text
+from services.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from services.llm_scheduler import PRIORITY_INTERACTIVE, request_priority
+from services.rag_indexer import build_or_load_index, get_lexical_index
 
 
 PROMPT_PATH = Path("prompts/mvp2_qa_system_prompt.txt")
+CORPUS_PROMPT_PATH = Path("prompts/corpus_qa_system_prompt.txt")
+# "hybrid" fuses BM25 and vector rankings; "vector" uses embeddings only.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+TOP_K = 5
+HYBRID_CANDIDATES = 20
 
 
-def _load_system_prompt() -> str:
-    if not PROMPT_PATH.exists():
-        raise FileNotFoundError(f"Prompt file not found: {PROMPT_PATH}")
-    return PROMPT_PATH.read_text(encoding="utf-8").strip()
+def _load_system_prompt(path: Path = PROMPT_PATH) -> str:
+    if not path.exists():
+        raise FileNotFoundError(f"Prompt file not found: {path}")
+    return path.read_text(encoding="utf-8").strip()
 
 
 def _keyword_set(text: str) -> set[str]:
@@ -23,10 +36,19 @@ def _keyword_set(text: str) -> set[str]:
     return {w for w in words if len(w) >= 4}
 
 
-def _has_keyword_overlap(question: str, documents: List[str]) -> bool:
+def _has_keyword_overlap(
+    question: str,
+    documents: List[str],
+    *,
+    ids: Optional[Sequence[str]] = None,
+    lexical: Optional[LexicalIndex] = None,
+) -> bool:
     q_words = _keyword_set(question)
     if not q_words:
         return True
+    if lexical is not None and ids:
+        # Postings were built at index time; no need to re-tokenize chunks.
+        return lexical.has_any_term(q_words, ids)
     for doc in documents:
         if q_words & _keyword_set(doc):
             return True
@@ -55,74 +77,222 @@ def _format_context(documents: List[str], metadatas: List[Dict[str, object]]) ->
     return "\n\n".join(blocks) if blocks else "None"
 
 
+def _format_corpus_context(hits: List[Dict[str, object]]) -> str:
+    blocks = []
+    for idx, hit in enumerate(hits, start=1):
+        header = (
+            f"[Chunk {idx}] Document {hit['title']} | Page {hit['page']}"
+            f" | Section: {hit['section']}"
+        )
+        blocks.append(f"{header}\n{hit['text']}")
+    return "\n\n".join(blocks) if blocks else "None"
+
+
 def _response_has_references(text: str) -> bool:
     return "REFERENCES" in text.upper() and "PAGE" in text.upper()
 
 
-def _retrieve_chunks(doc_id: str, question: str) -> Dict[str, List[object]]:
-    collection = build_or_load_index(doc_id)
-    query_embedding = embed_text(question, task_type="retrieval_query")
-    result = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=5,
-        include=["documents", "metadatas", "distances"],
-    )
-    documents = result.get("documents", [[]])[0] if result else []
-    metadatas = result.get("metadatas", [[]])[0] if result else []
-    distances = result.get("distances", [[]])[0] if result else []
+def _retrieve_chunks(
+    doc_id: str,
+    question: str,
+    *,
+    mode: str = RETRIEVAL_MODE,
+    query_embedding: Sequence[float],
+    n_results: int = TOP_K,
+    include_embeddings: bool = False,
+) -> Dict[str, List[object]]:
+    """Blocking vector (+ BM25) retrieval; run it with ``run_blocking``."""
+    store = build_or_load_index(doc_id)
+    lexical = get_lexical_index(doc_id) if mode == "hybrid" else None
+    n_candidates = max(HYBRID_CANDIDATES, n_results) if lexical is not None else n_results
+    result = store.query(query_embedding, n_candidates, include_embeddings=include_embeddings)
+    ids = result["ids"]
+    documents = result["documents"]
+    metadatas = result["metadatas"]
+    distances = result["distances"]
+    embeddings = result["embeddings"] or [None] * len(ids)
+    min_distance = min(distances) if distances else None
+
+    if lexical is not None:
+        bm25_ids = [chunk_id for chunk_id, _ in lexical.search(question, n_candidates)]
+        fused = reciprocal_rank_fusion([ids, bm25_ids])[:n_results]
+        by_id = {
+            chunk_id: (doc, meta, dist, vec)
+            for chunk_id, doc, meta, dist, vec in zip(
+                ids, documents, metadatas, distances, embeddings
+            )
+        }
+        missing = [chunk_id for chunk_id in fused if chunk_id not in by_id]
+        if missing:
+            extra = store.get(missing, include_embeddings=include_embeddings)
+            for chunk_id, doc, meta, vec in zip(
+                extra["ids"],
+                extra["documents"],
+                extra["metadatas"],
+                extra["embeddings"] or [None] * len(extra["ids"]),
+            ):
+                # Lexical-only hits have no vector distance.
+                by_id[str(chunk_id)] = (doc, meta, None, vec)
+        ids = [chunk_id for chunk_id in fused if chunk_id in by_id]
+        documents = [by_id[chunk_id][0] for chunk_id in ids]
+        metadatas = [by_id[chunk_id][1] for chunk_id in ids]
+        distances = [by_id[chunk_id][2] for chunk_id in ids]
+        embeddings = [by_id[chunk_id][3] for chunk_id in ids]
+    else:
+        ids = ids[:n_results]
+        documents = documents[:n_results]
+        metadatas = metadatas[:n_results]
+        distances = distances[:n_results]
+        embeddings = embeddings[:n_results]
+
     return {
+        "ids": ids,
         "documents": documents,
         "metadatas": metadatas,
         "distances": distances,
+        "embeddings": embeddings,
+        "min_distance": min_distance,
+        "lexical": lexical,
     }
 
 
-def answer_question_with_debug(
+@request_priority(PRIORITY_INTERACTIVE)
+async def aanswer_question_with_debug(
     doc_id: str,
     question: str,
     chat_history: List[Dict[str, str]],
+    *,
+    on_partial: Optional[Callable[[str], None]] = None,
 ) -> Dict[str, object]:
-    """Answer a question and return debug retrieval context."""
+    """Answer a question and return debug retrieval context.
+
+    ``on_partial`` receives the answer text as it streams in. The final
+    ``answer_text`` may differ when the reference check rejects it.
+
+    Answers are cached per doc, normalized question, history and prompt;
+    the payload's ``cache`` entry says whether (and how) it was a hit.
+    ``context`` reports how retrieved chunks were assembled into the
+    prompt, including ``tokens_saved``.
+    """
     if not question.strip():
         return {
-            "answer_text": "Information not found in the document.",
+            "answer_text": NOT_FOUND_ANSWER,
             "retrieved_chunks": [],
         }
 
-    retrieval = _retrieve_chunks(doc_id, question)
+    system_prompt = _load_system_prompt()
+    history_block = _format_history(chat_history)
+    cache = get_answer_cache()
+    digest = context_digest(
+        system_prompt,
+        history_block,
+        DEFAULT_MODEL,
+        RETRIEVAL_MODE,
+        str(TOP_K),
+    )
+    query_embedding: Optional[List[float]] = None
+    if cache is not None:
+        cached = cache.lookup(doc_id, question, digest)
+        if cached is None and ANSWER_CACHE_SIMILARITY > 0:
+            # Retrieval reuses this embedding on a miss.
+            query_embedding = await aembed_text(question, task_type="retrieval_query")
+            cached = cache.lookup_similar(
+                doc_id,
+                query_embedding,
+                digest,
+                ANSWER_CACHE_SIMILARITY,
+            )
+        if cached is not None:
+            if on_partial is not None:
+                on_partial(str(cached["answer_text"]))
+            return cached
+
+    result = await _aanswer_from_index(
+        doc_id,
+        question,
+        system_prompt=system_prompt,
+        history_block=history_block,
+        query_embedding=query_embedding,
+        on_partial=on_partial,
+    )
+    if cache is not None:
+        cache.store(doc_id, question, digest, result, query_embedding)
+    result["cache"] = {"hit": False}
+    return result
+
+
+async def _aanswer_from_index(
+    doc_id: str,
+    question: str,
+    *,
+    system_prompt: str,
+    history_block: str,
+    query_embedding: Optional[Sequence[float]],
+    on_partial: Optional[Callable[[str], None]],
+) -> Dict[str, object]:
+    if query_embedding is None:
+        query_embedding = await aembed_text(question, task_type="retrieval_query")
+    retrieval = await run_blocking(
+        _retrieve_chunks,
+        doc_id,
+        question,
+        n_results=CONTEXT_MAX_CHUNKS,
+        query_embedding=query_embedding,
+        include_embeddings=True,
+    )
     documents = retrieval["documents"]
     metadatas = retrieval["metadatas"]
-    distances = retrieval["distances"]
 
     if not documents:
         return {
-            "answer_text": "Information not found in the document.",
+            "answer_text": NOT_FOUND_ANSWER,
             "retrieved_chunks": [],
         }
 
-    min_distance = min(distances) if distances else None
+    # Closest vector match among all candidates, including ones that
+    # hybrid fusion ranked out of the final list.
+    min_distance = retrieval["min_distance"]
     documents_short = all(len(doc.strip()) < 200 for doc in documents)
-    keyword_overlap = _has_keyword_overlap(question, documents)
+    keyword_overlap = _has_keyword_overlap(
+        question,
+        documents,
+        ids=retrieval["ids"],
+        lexical=retrieval["lexical"],
+    )
 
     if min_distance is None:
         return {
-            "answer_text": "Information not found in the document.",
+            "answer_text": NOT_FOUND_ANSWER,
             "retrieved_chunks": [],
         }
     if documents_short and not keyword_overlap:
         return {
-            "answer_text": "Information not found in the document.",
+            "answer_text": NOT_FOUND_ANSWER,
             "retrieved_chunks": [],
         }
     if min_distance > 0.35 and not keyword_overlap:
         return {
-            "answer_text": "Information not found in the document.",
+            "answer_text": NOT_FOUND_ANSWER,
             "retrieved_chunks": [],
         }
 
-    system_prompt = _load_system_prompt()
+    blocks, context_stats = assemble_context(
+        [
+            ContextChunk(str(chunk_id), doc, meta, dist, vec)
+            for chunk_id, doc, meta, dist, vec in zip(
+                retrieval["ids"],
+                documents,
+                metadatas,
+                retrieval["distances"],
+                retrieval["embeddings"],
+            )
+        ],
+        baseline_k=TOP_K,
+        query_embedding=query_embedding,
+    )
+    documents = [block.text for block in blocks]
+    metadatas = [block.metadata for block in blocks]
     context_block = _format_context(documents, metadatas)
-    history_block = _format_history(chat_history)
 
     user_prompt = (
         "CONVERSATION MEMORY (LAST 2 TURNS EACH SIDE):\n"
@@ -133,9 +303,12 @@ def answer_question_with_debug(
         f"{question}\n"
     )
 
-    response = generate_text(f"{system_prompt}\n\n{user_prompt}")
+    response = await agenerate_text(
+        f"{system_prompt}\n\n{user_prompt}",
+        on_partial=on_partial,
+    )
     if not _response_has_references(response):
-        response = "Information not found in the document."
+        response = NOT_FOUND_ANSWER
 
     retrieved_chunks = []
     for doc, meta in zip(documents, metadatas):
@@ -150,14 +323,119 @@ def answer_question_with_debug(
     return {
         "answer_text": response,
         "retrieved_chunks": retrieved_chunks,
+        "context": context_stats,
     }
 
 
-def answer_question(
+async def aanswer_question(
     doc_id: str,
     question: str,
     chat_history: List[Dict[str, str]],
 ) -> str:
     """Answer a question using only retrieved document chunks."""
-    result = answer_question_with_debug(doc_id, question, chat_history)
-    return str(result.get("answer_text", "Information not found in the document."))
+    result = await aanswer_question_with_debug(doc_id, question, chat_history)
+    return str(result.get("answer_text", NOT_FOUND_ANSWER))
+
+
+def answer_question_with_debug(
+    doc_id: str,
+    question: str,
+    chat_history: List[Dict[str, str]],
+    *,
+    on_partial: Optional[Callable[[str], None]] = None,
+) -> Dict[str, object]:
+    """Blocking ``aanswer_question_with_debug``; ``on_partial`` runs on the calling thread."""
+    return run_sync_with_updates(
+        lambda callback: aanswer_question_with_debug(
+            doc_id,
+            question,
+            chat_history,
+            on_partial=callback,
+        ),
+        on_partial,
+    )
+
+
+def answer_question(
+    doc_id: str,
+    question: str,
+    chat_history: List[Dict[str, str]],
+) -> str:
+    """Blocking ``aanswer_question``."""
+    return run_sync(aanswer_question(doc_id, question, chat_history))
+
+
+@request_priority(PRIORITY_INTERACTIVE)
+async def aanswer_corpus_question_with_debug(
+    question: str,
+    chat_history: List[Dict[str, str]],
+    *,
+    doc_ids: Optional[Sequence[str]] = None,
+    on_partial: Optional[Callable[[str], None]] = None,
+) -> Dict[str, object]:
+    """Answer a question across all indexed documents (or ``doc_ids``).
+
+    Retrieved chunks carry ``doc_id`` and ``title`` alongside page and
+    section, and the answer's references name the source document.
+    """
+    not_found = {
+        "answer_text": CORPUS_NOT_FOUND_ANSWER,
+        "retrieved_chunks": [],
+    }
+    if not question.strip():
+        return not_found
+
+    hits = await asearch_corpus(question, doc_ids=doc_ids)
+    if not hits:
+        return not_found
+    documents = [str(hit["text"]) for hit in hits]
+    if hits[0]["distance"] > 0.35 and not _has_keyword_overlap(question, documents):
+        return not_found
+
+    user_prompt = (
+        "CONVERSATION MEMORY (LAST 2 TURNS EACH SIDE):\n"
+        f"{_format_history(chat_history)}\n\n"
+        "CONTEXT CHUNKS:\n"
+        f"{_format_corpus_context(hits)}\n\n"
+        "QUESTION:\n"
+        f"{question}\n"
+    )
+    response = await agenerate_text(
+        f"{_load_system_prompt(CORPUS_PROMPT_PATH)}\n\n{user_prompt}",
+        on_partial=on_partial,
+    )
+    if not _response_has_references(response):
+        response = not_found["answer_text"]
+
+    return {
+        "answer_text": response,
+        "retrieved_chunks": [
+            {
+                "doc_id": hit["doc_id"],
+                "title": hit["title"],
+                "page": hit["page"],
+                "section": hit["section"],
+                "text": hit["text"],
+            }
+            for hit in hits
+        ],
+    }
+
+
+def answer_corpus_question_with_debug(
+    question: str,
+    chat_history: List[Dict[str, str]],
+    *,
+    doc_ids: Optional[Sequence[str]] = None,
+    on_partial: Optional[Callable[[str], None]] = None,
+) -> Dict[str, object]:
+    """Blocking ``aanswer_corpus_question_with_debug``."""
+    return run_sync_with_updates(
+        lambda callback: aanswer_corpus_question_with_debug(
+            question,
+            chat_history,
+            doc_ids=doc_ids,
+            on_partial=callback,
+        ),
+        on_partial,
+    )
@@ -1,6 +1,15 @@
 from __future__ import annotations
 
-from typing import Iterable, Iterator, Tuple
+from bisect import bisect_right
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# A line whose font is this much larger than the body text is a heading.
+HEADING_SIZE_RATIO = 1.15
+MAX_HEADING_CHARS = 120
+# (text, font size, bold) for one visual line from PyMuPDF's "dict" output.
+FontLine = Tuple[str, float, bool]
 
 
 def is_heading(line: str) -> bool:
@@ -23,12 +32,154 @@ def is_heading(line: str) -> bool:
     return False
 
 
+def heading_title(line: str) -> Optional[str]:
+    """Return the section name if the line is a heading, else ``None``."""
+    cleaned = line.strip()
+    if not cleaned or not is_heading(cleaned):
+        return None
+    heading = cleaned.lstrip("#").strip().rstrip(":").strip()
+    return heading or "Unknown Section"
+
+
 def iter_lines_with_section(lines: Iterable[str]) -> Iterator[Tuple[str, str]]:
     """Yield (section_name, line) pairs using heading heuristics."""
     current_section = "Unknown Section"
     for line in lines:
-        cleaned = line.strip()
-        if cleaned and is_heading(cleaned):
-            heading = cleaned.lstrip("#").strip().rstrip(":").strip()
-            current_section = heading or "Unknown Section"
+        heading = heading_title(line)
+        if heading is not None:
+            current_section = heading
         yield current_section, line
+
+
+class DocumentOutline:
+    """Interval index from document character offsets to section names."""
+
+    def __init__(self) -> None:
+        self._starts: List[int] = []
+        self._titles: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def add(self, offset: int, title: str) -> None:
+        if not self._starts or offset >= self._starts[-1]:
+            if self._starts and offset == self._starts[-1] and self._titles[-1] == title:
+                return
+            self._starts.append(offset)
+            self._titles.append(title)
+            return
+        idx = bisect_right(self._starts, offset)
+        self._starts.insert(idx, offset)
+        self._titles.insert(idx, title)
+
+    def section_at(self, offset: int) -> str:
+        """Return the section in effect at ``offset`` in O(log n)."""
+        idx = bisect_right(self._starts, offset) - 1
+        return self._titles[idx] if idx >= 0 else "Unknown Section"
+
+    def entries(self) -> List[Dict[str, object]]:
+        return [
+            {"offset": offset, "section": title}
+            for offset, title in zip(self._starts, self._titles)
+        ]
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, object]]) -> "DocumentOutline":
+        outline = cls()
+        for entry in entries:
+            outline.add(int(entry["offset"]), str(entry["section"]))
+        return outline
+
+
+def _clean_title(text: str) -> str:
+    return " ".join(text.split()).lstrip("#").strip().rstrip(":").strip()
+
+
+class OutlineBuilder:
+    """Detect section headings page by page while a PDF is being read.
+
+    Sources, in order of preference: PDF bookmarks (``get_toc``), lines set
+    in a larger or bold font than the body text, and finally the
+    ``is_heading`` text heuristics when the PDF carries no structure.
+    """
+
+    def __init__(self, toc: Sequence[Sequence[object]] = ()) -> None:
+        self.outline = DocumentOutline()
+        self._toc: Dict[int, List[str]] = defaultdict(list)
+        for entry in toc:
+            if len(entry) >= 3 and int(entry[2]) > 0:
+                title = _clean_title(str(entry[1]))
+                if title:
+                    self._toc[int(entry[2])].append(title)
+        self._size_chars: Dict[float, int] = defaultdict(int)
+        self._structured = bool(self._toc)
+
+    def _body_size(self) -> float:
+        if not self._size_chars:
+            return 0.0
+        return max(self._size_chars.items(), key=lambda item: item[1])[0]
+
+    def _font_headings(self, font_lines: Sequence[FontLine]) -> List[str]:
+        body = self._body_size()
+        if not body:
+            return []
+        titles = []
+        for text, size, bold in font_lines:
+            cleaned = text.strip()
+            if len(cleaned) < 3 or len(cleaned) > MAX_HEADING_CHARS:
+                continue
+            if not any(ch.isalpha() for ch in cleaned):
+                continue
+            larger = size >= body * HEADING_SIZE_RATIO
+            bold_line = bold and size >= body and len(cleaned.split()) <= 12 and not cleaned.endswith(".")
+            if larger or bold_line:
+                titles.append(cleaned)
+        return titles
+
+    def add_page(
+        self,
+        page_number: int,
+        page_text: str,
+        page_offset: int,
+        font_lines: Sequence[FontLine] = (),
+        size_chars: Optional[Dict[float, int]] = None,
+    ) -> List[Dict[str, object]]:
+        """Record the headings on one page; offsets are document offsets."""
+        for size, chars in (size_chars or {}).items():
+            self._size_chars[size] += chars
+
+        found: List[Tuple[int, str]] = []
+        lowered = page_text.lower()
+        for title in self._toc.get(page_number, []):
+            idx = lowered.find(title.lower())
+            found.append((max(idx, 0), title))
+
+        cursor = 0
+        for text in self._font_headings(font_lines):
+            idx = page_text.find(text, cursor)
+            if idx == -1:
+                continue
+            cursor = idx + len(text)
+            found.append((idx, _clean_title(text)))
+        if found:
+            self._structured = True
+
+        if not self._structured:
+            start = 0
+            for line in page_text.split("\n"):
+                heading = heading_title(line)
+                if heading is not None:
+                    found.append((start, heading))
+                start += len(line) + 1
+
+        # Bookmarks win over font matches that land on the same line start.
+        by_offset: Dict[int, str] = {}
+        for idx, title in found:
+            if title:
+                by_offset.setdefault(idx, title)
+
+        headings = []
+        for idx, title in sorted(by_offset.items()):
+            self.outline.add(page_offset + idx, title)
+            headings.append({"offset": page_offset + idx, "section": title})
+        return headings
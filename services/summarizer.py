@@ -1,18 +1,50 @@
 from __future__ import annotations
 
+import os
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from services.gemini_client import generate_text
+from services.aio import gather_limited, run_blocking, run_sync_with_updates
+from services.gemini_client import agenerate_text
+from services.sectionizer import is_heading
+from services.tokens import CHARS_PER_TOKEN, estimate_tokens
 
 
 PROMPT_PATH = Path("prompts/summary_system_prompt.txt")
+SEGMENT_PROMPT_PATH = Path("prompts/summary_segment_prompt.txt")
+REDUCE_PROMPT_PATH = Path("prompts/summary_reduce_prompt.txt")
+
+# Documents up to this size are summarized in a single call.
+SINGLE_SHOT_TOKEN_LIMIT = int(os.getenv("SUMMARY_SINGLE_SHOT_TOKENS", "60000"))
+SEGMENT_TOKEN_BUDGET = int(os.getenv("SUMMARY_SEGMENT_TOKENS", "20000"))
+SEGMENT_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+
+
+@dataclass
+class _Segment:
+    first_page: int
+    last_page: int
+    text: str
+
+    @property
+    def label(self) -> str:
+        if not self.first_page:
+            return "Part"
+        if self.first_page == self.last_page:
+            return f"Page {self.first_page}"
+        return f"Pages {self.first_page}-{self.last_page}"
+
+
+def _load_prompt(path: Path) -> str:
+    if not path.exists():
+        raise FileNotFoundError(f"Prompt file not found: {path}")
+    return path.read_text(encoding="utf-8").strip()
 
 
 def _load_system_prompt() -> str:
     """Load the summary system prompt from disk."""
-    if not PROMPT_PATH.exists():
-        raise FileNotFoundError(f"Prompt file not found: {PROMPT_PATH}")
-    return PROMPT_PATH.read_text(encoding="utf-8").strip()
+    return _load_prompt(PROMPT_PATH)
 
 
 def contains_investment_language(text: str) -> bool:
@@ -32,18 +64,196 @@ def contains_investment_language(text: str) -> bool:
     return any(term in text_lower for term in banned_terms)
 
 
-def summarize_whitepaper(whitepaper_text: str) -> str:
-    """Apply the summary prompt and return the structured summary."""
+def _split_oversized(segment: _Segment, budget: int) -> List[_Segment]:
+    """Split a block larger than the budget at line, then character, limits."""
+    max_chars = budget * CHARS_PER_TOKEN
+    pieces: List[_Segment] = []
+    current: List[str] = []
+    size = 0
+    for line in segment.text.splitlines():
+        while len(line) > max_chars:
+            pieces.append(_Segment(segment.first_page, segment.last_page, line[:max_chars]))
+            line = line[max_chars:]
+        if current and size + len(line) + 1 > max_chars:
+            pieces.append(_Segment(segment.first_page, segment.last_page, "\n".join(current)))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        pieces.append(_Segment(segment.first_page, segment.last_page, "\n".join(current)))
+    return pieces
+
+
+def _split_units(
+    whitepaper_text: str,
+    pages: Optional[List[Dict[str, object]]],
+    budget: int,
+) -> List[_Segment]:
+    """Split the document into blocks at page and section-heading boundaries."""
+    if pages:
+        sources = [
+            (int(page.get("page_number", 0)), str(page.get("text", "") or ""))
+            for page in pages
+        ]
+    else:
+        sources = [(0, block) for block in whitepaper_text.split("\n\n")]
+
+    units: List[_Segment] = []
+    for page_number, text in sources:
+        block: List[str] = []
+        for line in text.splitlines():
+            if block and is_heading(line):
+                units.append(_Segment(page_number, page_number, "\n".join(block)))
+                block = []
+            block.append(line)
+        if block:
+            units.append(_Segment(page_number, page_number, "\n".join(block)))
+
+    sized: List[_Segment] = []
+    for unit in units:
+        if not unit.text.strip():
+            continue
+        if estimate_tokens(unit.text) > budget:
+            sized.extend(_split_oversized(unit, budget))
+        else:
+            sized.append(unit)
+    return sized
+
+
+def _pack_segments(units: List[_Segment], budget: int) -> List[_Segment]:
+    """Greedily pack consecutive blocks into segments within the token budget."""
+    segments: List[_Segment] = []
+    current: List[_Segment] = []
+    tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit.text)
+        if current and tokens + unit_tokens > budget:
+            segments.append(_merge(current))
+            current, tokens = [], 0
+        current.append(unit)
+        tokens += unit_tokens
+    if current:
+        segments.append(_merge(current))
+    return segments
+
+
+def _merge(units: List[_Segment]) -> _Segment:
+    pages = [unit.first_page for unit in units if unit.first_page] + [
+        unit.last_page for unit in units if unit.last_page
+    ]
+    return _Segment(
+        min(pages) if pages else 0,
+        max(pages) if pages else 0,
+        "\n\n".join(unit.text for unit in units),
+    )
+
+
+async def _summarize_segments(
+    segments: List[_Segment],
+    max_workers: int,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[_Segment]:
+    """Run the segment prompt over all segments concurrently, keeping order.
+
+    ``on_progress`` receives ``(segments done, segments)`` at the start
+    and after each segment.
+    """
+    segment_prompt = _load_prompt(SEGMENT_PROMPT_PATH)
+    done = 0
+    if on_progress is not None:
+        on_progress(done, len(segments))
+
+    async def _run(segment: _Segment) -> _Segment:
+        nonlocal done
+        notes = await agenerate_text(
+            f"{segment_prompt}\n\n"
+            f"SEGMENT TEXT ({segment.label}):\n"
+            f"{segment.text}"
+        )
+        done += 1
+        if on_progress is not None:
+            on_progress(done, len(segments))
+        return _Segment(segment.first_page, segment.last_page, f"[{segment.label}]\n{notes}")
+
+    return await gather_limited(
+        max_workers,
+        [lambda segment=segment: _run(segment) for segment in segments],
+    )
+
+
+async def _collect_segment_notes(
+    whitepaper_text: str,
+    pages: Optional[List[Dict[str, object]]],
+    *,
+    segment_token_budget: int,
+    single_shot_token_limit: int,
+    max_workers: int,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> str:
+    """Map the document to per-segment notes, collapsing until they fit."""
+    units = await run_blocking(_split_units, whitepaper_text, pages, segment_token_budget)
+    segments = _pack_segments(units, segment_token_budget)
+    notes = await _summarize_segments(segments, max_workers, on_progress)
+    while len(notes) > 1:
+        combined = "\n\n".join(note.text for note in notes)
+        if estimate_tokens(combined) <= single_shot_token_limit:
+            break
+        regrouped = _pack_segments(notes, segment_token_budget)
+        if len(regrouped) >= len(notes):
+            break
+        notes = await _summarize_segments(regrouped, max_workers, on_progress)
+    return "\n\n".join(note.text for note in notes)
+
+
+async def asummarize(
+    whitepaper_text: str,
+    *,
+    pages: Optional[List[Dict[str, object]]] = None,
+    on_partial: Optional[Callable[[str], None]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    segment_token_budget: int = SEGMENT_TOKEN_BUDGET,
+    single_shot_token_limit: int = SINGLE_SHOT_TOKEN_LIMIT,
+    max_workers: int = SEGMENT_MAX_WORKERS,
+) -> str:
+    """Apply the summary prompt and return the structured summary.
+
+    Documents above ``single_shot_token_limit`` are split into segments
+    along page and section boundaries, summarized concurrently and then
+    reduced into the final format. ``pages`` gives exact page boundaries
+    when available.
+
+    ``on_partial`` receives the summary text as it streams in; a retry
+    after banned language restarts the stream from empty. For segmented
+    documents ``on_progress`` receives ``(segments done, segments)`` for
+    each map and collapse round; an exception raised from either
+    callback aborts the summary.
+    """
     if not whitepaper_text.strip():
         raise ValueError("Whitepaper text is empty.")
 
     system_prompt = _load_system_prompt()
-    user_prompt = (
-        f"{system_prompt}\n\n"
-        "WHITEPAPER TEXT:\n"
-        f"{whitepaper_text}"
-    )
-    summary = generate_text(user_prompt)
+    if estimate_tokens(whitepaper_text) <= single_shot_token_limit:
+        user_prompt = (
+            f"{system_prompt}\n\n"
+            "WHITEPAPER TEXT:\n"
+            f"{whitepaper_text}"
+        )
+    else:
+        notes = await _collect_segment_notes(
+            whitepaper_text,
+            pages,
+            segment_token_budget=segment_token_budget,
+            single_shot_token_limit=single_shot_token_limit,
+            max_workers=max_workers,
+            on_progress=on_progress,
+        )
+        user_prompt = (
+            f"{system_prompt}\n\n"
+            f"{_load_prompt(REDUCE_PROMPT_PATH)}\n\n"
+            "SEGMENT NOTES:\n"
+            f"{notes}"
+        )
+    summary = await agenerate_text(user_prompt, on_partial=on_partial)
 
     if contains_investment_language(summary):
         retry_prompt = (
@@ -52,6 +262,51 @@ def summarize_whitepaper(whitepaper_text: str) -> str:
             "You must regenerate the summary and strictly avoid all investment or "
             "trading terms."
         )
-        summary = generate_text(retry_prompt)
+        summary = await agenerate_text(retry_prompt, on_partial=on_partial)
 
     return summary
+
+
+def summarize_whitepaper(
+    whitepaper_text: str,
+    *,
+    pages: Optional[List[Dict[str, object]]] = None,
+    on_partial: Optional[Callable[[str], None]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    segment_token_budget: int = SEGMENT_TOKEN_BUDGET,
+    single_shot_token_limit: int = SINGLE_SHOT_TOKEN_LIMIT,
+    max_workers: int = SEGMENT_MAX_WORKERS,
+) -> str:
+    """Blocking ``asummarize``; the callbacks run on the calling thread.
+
+    Both callbacks share one update channel, so when updates pile up only
+    the latest is delivered (each is cumulative).
+    """
+
+    def _deliver(update: Tuple[str, Any]) -> None:
+        kind, value = update
+        if kind == "partial":
+            if on_partial is not None:
+                on_partial(value)
+        elif on_progress is not None:
+            on_progress(*value)
+
+    def _start(callback: Optional[Callable[[Tuple[str, Any]], None]]):
+        return asummarize(
+            whitepaper_text,
+            pages=pages,
+            on_partial=(lambda text: callback(("partial", text)))
+            if callback and on_partial
+            else None,
+            on_progress=(lambda done, total: callback(("progress", (done, total))))
+            if callback and on_progress
+            else None,
+            segment_token_budget=segment_token_budget,
+            single_shot_token_limit=single_shot_token_limit,
+            max_workers=max_workers,
+        )
+
+    return run_sync_with_updates(
+        _start,
+        _deliver if on_partial is not None or on_progress is not None else None,
+    )
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+
+# Gemini tokenizers average roughly four characters per token on English prose.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the token count of text without calling the API."""
+    if not text:
+        return 0
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
@@ -0,0 +1,409 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+os.environ.setdefault("CHROMA_TELEMETRY", "FALSE")
+os.environ.setdefault("POSTHOG_DISABLED", "1")
+
+import chromadb
+from chromadb.config import Settings
+import numpy as np
+import pydantic
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process guard.
+    fcntl = None
+
+
+# "chroma" (persistent Chroma 0.3.x) or "numpy" (in-process exact search).
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+CHROMA_DIR = Path(os.getenv("CHROMA_DIR", "data/chroma"))
+NUMPY_DIR = Path(os.getenv("NUMPY_VECTOR_DIR", "data/vectors"))
+STORE_CACHE_SIZE = int(os.getenv("CHROMA_COLLECTION_CACHE_SIZE", "32"))
+
+_client: Optional[chromadb.Client] = None
+_lock = threading.RLock()
+_env_checked = False
+_chroma_dir_lock: Optional[Any] = None
+_stores: "OrderedDict[tuple[str, str], VectorStore]" = OrderedDict()
+# Pool size; grows past STORE_CACHE_SIZE to hold every document a running
+# corpus search fans out to (see ``reserved_stores``).
+_store_capacity = STORE_CACHE_SIZE
+_reservations: List[int] = []
+
+
+class VectorStore(ABC):
+    """Per-document store of chunk embeddings, texts and metadata.
+
+    ``query`` returns flat lists under ``ids``, ``documents``, ``metadatas``,
+    ``distances`` (cosine distance) and, when requested, ``embeddings``.
+    """
+
+    @abstractmethod
+    def add(
+        self,
+        ids: Sequence[str],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+        embeddings: Sequence[Sequence[float]],
+    ) -> None: ...
+
+    @abstractmethod
+    def query(
+        self,
+        embedding: Sequence[float],
+        n_results: int,
+        *,
+        include_embeddings: bool = False,
+    ) -> Dict[str, List[Any]]: ...
+
+    @abstractmethod
+    def get(
+        self,
+        ids: Sequence[str],
+        *,
+        include_embeddings: bool = False,
+    ) -> Dict[str, List[Any]]: ...
+
+    @abstractmethod
+    def count(self) -> int: ...
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Remove every record for the document."""
+
+    @abstractmethod
+    def persist(self) -> None: ...
+
+
+class _NoOpEmbeddingFunction:
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        return [[0.0] for _ in texts]
+
+
+def check_environment() -> None:
+    """Log dependency versions and reject pydantic>=2, once per process."""
+    global _env_checked
+    if _env_checked:
+        return
+    with _lock:
+        if _env_checked:
+            return
+        chroma_version = getattr(chromadb, "__version__", "unknown")
+        print(f"ChromaDB version: {chroma_version}")
+        pyd_version = getattr(pydantic, "__version__", "unknown")
+        print(f"Pydantic version: {pyd_version}")
+        if pyd_version != "unknown":
+            major = int(pyd_version.split(".", maxsplit=1)[0])
+            if major >= 2:
+                raise RuntimeError("Pydantic>=2 detected. Please install pydantic<2.")
+        _env_checked = True
+
+
+def claim_chroma_dir() -> bool:
+    """Take this process's exclusive lock on ``CHROMA_DIR``.
+
+    Chroma 0.3 (duckdb+parquet) loads collections into memory once per
+    client and ``persist`` writes that copy back over the files, so two
+    processes on one directory overwrite each other's documents. Returns
+    False when another process holds the lock.
+    """
+    global _chroma_dir_lock
+    with _lock:
+        if _chroma_dir_lock is not None or fcntl is None:
+            return True
+        CHROMA_DIR.mkdir(parents=True, exist_ok=True)
+        handle = open(CHROMA_DIR / ".process.lock", "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        _chroma_dir_lock = handle
+        return True
+
+
+def _get_client() -> chromadb.Client:
+    """Return the process-wide Chroma client, creating it on first use."""
+    global _client
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is None:
+            check_environment()
+            if not claim_chroma_dir():
+                raise RuntimeError(
+                    f"{CHROMA_DIR} is in use by another process. Chroma cannot share "
+                    "a data directory between processes; set VECTOR_STORE_BACKEND=numpy "
+                    "to run several."
+                )
+            CHROMA_DIR.mkdir(parents=True, exist_ok=True)
+            _client = chromadb.Client(
+                Settings(
+                    chroma_db_impl="duckdb+parquet",
+                    persist_directory=str(CHROMA_DIR),
+                    anonymized_telemetry=False,
+                )
+            )
+    return _client
+
+
+def _first(result: Dict[str, Any], key: str) -> List[Any]:
+    values = result.get(key) if result else None
+    return list(values[0]) if values else []
+
+
+class ChromaVectorStore(VectorStore):
+    def __init__(self, name: str, doc_id: str) -> None:
+        self.doc_id = doc_id
+        self.collection = _get_client().get_or_create_collection(
+            name=name,
+            metadata={"hnsw:space": "cosine"},
+            embedding_function=_NoOpEmbeddingFunction(),
+        )
+
+    def add(self, ids, documents, metadatas, embeddings) -> None:
+        self.collection.add(
+            ids=list(ids),
+            documents=list(documents),
+            metadatas=list(metadatas),
+            embeddings=[list(vec) for vec in embeddings],
+        )
+
+    def query(self, embedding, n_results, *, include_embeddings=False):
+        n_results = min(n_results, self.count())
+        if n_results <= 0:
+            return {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        result = self.collection.query(
+            query_embeddings=[list(embedding)],
+            n_results=n_results,
+            include=include,
+        )
+        return {
+            "ids": [str(chunk_id) for chunk_id in _first(result, "ids")],
+            "documents": _first(result, "documents"),
+            "metadatas": _first(result, "metadatas"),
+            "distances": _first(result, "distances"),
+            "embeddings": _first(result, "embeddings") if include_embeddings else [],
+        }
+
+    def get(self, ids, *, include_embeddings=False):
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": [], "embeddings": []}
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        result = self.collection.get(ids=list(ids), include=include)
+        return {
+            "ids": [str(chunk_id) for chunk_id in result.get("ids", [])],
+            "documents": list(result.get("documents", [])),
+            "metadatas": list(result.get("metadatas", [])),
+            "embeddings": list(result.get("embeddings") or []) if include_embeddings else [],
+        }
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def reset(self) -> None:
+        try:
+            self.collection.delete(where={"doc_id": self.doc_id})
+        except Exception:  # noqa: BLE001
+            pass
+
+    def persist(self) -> None:
+        with _lock:
+            _get_client().persist()
+
+
+class NumpyVectorStore(VectorStore):
+    """Exact cosine search over a memory-mapped float32 matrix.
+
+    Rows are L2-normalized at write time, so a query is one matrix-vector
+    product followed by ``argpartition`` for the top k.
+    """
+
+    def __init__(self, name: str, doc_id: str) -> None:
+        self.doc_id = doc_id
+        self.directory = NUMPY_DIR / name
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._pending: List[np.ndarray] = []
+        self._row_of: Dict[str, int] = {}
+        self._load()
+
+    @property
+    def _matrix_path(self) -> Path:
+        return self.directory / "embeddings.npy"
+
+    @property
+    def _records_path(self) -> Path:
+        return self.directory / "records.json"
+
+    def _load(self) -> None:
+        if not self._matrix_path.exists() or not self._records_path.exists():
+            return
+        try:
+            records = json.loads(self._records_path.read_text(encoding="utf-8"))
+            matrix = np.load(self._matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return
+        if matrix.ndim != 2 or matrix.shape[0] != len(records.get("ids", [])):
+            return
+        self._matrix = matrix
+        self._ids = [str(chunk_id) for chunk_id in records["ids"]]
+        self._documents = list(records["documents"])
+        self._metadatas = list(records["metadatas"])
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+
+    def _all_rows(self) -> Optional[np.ndarray]:
+        if self._pending:
+            parts = ([self._matrix] if self._matrix is not None else []) + self._pending
+            self._matrix = np.vstack(parts).astype(np.float32, copy=False)
+            self._pending = []
+        return self._matrix
+
+    def add(self, ids, documents, metadatas, embeddings) -> None:
+        rows = np.asarray(embeddings, dtype=np.float32)
+        if rows.ndim != 2 or rows.shape[0] != len(ids):
+            raise ValueError("Embeddings must be a 2D array with one row per id.")
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        rows = rows / np.where(norms == 0.0, 1.0, norms)
+        with self._lock:
+            for chunk_id in ids:
+                if str(chunk_id) in self._row_of:
+                    raise ValueError(f"Duplicate id: {chunk_id}")
+                self._row_of[str(chunk_id)] = len(self._ids)
+                self._ids.append(str(chunk_id))
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            self._pending.append(rows)
+
+    def query(self, embedding, n_results, *, include_embeddings=False):
+        with self._lock:
+            matrix = self._all_rows()
+            if matrix is None or not len(self._ids) or n_results <= 0:
+                return {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+            query = np.asarray(embedding, dtype=np.float32)
+            norm = float(np.linalg.norm(query))
+            if norm:
+                query = query / norm
+            scores = matrix @ query
+            k = min(n_results, scores.shape[0])
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return {
+                "ids": [self._ids[row] for row in top],
+                "documents": [self._documents[row] for row in top],
+                "metadatas": [self._metadatas[row] for row in top],
+                "distances": [float(1.0 - scores[row]) for row in top],
+                "embeddings": [matrix[row].tolist() for row in top] if include_embeddings else [],
+            }
+
+    def get(self, ids, *, include_embeddings=False):
+        with self._lock:
+            rows = [self._row_of[str(chunk_id)] for chunk_id in ids if str(chunk_id) in self._row_of]
+            matrix = self._all_rows() if include_embeddings else None
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "documents": [self._documents[row] for row in rows],
+                "metadatas": [self._metadatas[row] for row in rows],
+                "embeddings": [matrix[row].tolist() for row in rows] if matrix is not None else [],
+            }
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._matrix = None
+            self._pending = []
+            self._ids, self._documents, self._metadatas = [], [], []
+            self._row_of = {}
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def persist(self) -> None:
+        with self._lock:
+            matrix = self._all_rows()
+            if matrix is None:
+                return
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_matrix = self.directory / "embeddings.tmp.npy"
+            np.save(tmp_matrix, np.ascontiguousarray(matrix, dtype=np.float32))
+            tmp_records = self._records_path.with_suffix(".json.tmp")
+            tmp_records.write_text(
+                json.dumps(
+                    {
+                        "ids": self._ids,
+                        "documents": self._documents,
+                        "metadatas": self._metadatas,
+                    }
+                ),
+                encoding="utf-8",
+            )
+            tmp_matrix.replace(self._matrix_path)
+            tmp_records.replace(self._records_path)
+            self._matrix = np.load(self._matrix_path, mmap_mode="r")
+
+
+_BACKENDS = {
+    "chroma": ChromaVectorStore,
+    "numpy": NumpyVectorStore,
+}
+
+
+def open_store(name: str, doc_id: str, backend: Optional[str] = None) -> VectorStore:
+    """Return a pooled store handle, keeping the most recently used ones open."""
+    backend = backend or VECTOR_STORE_BACKEND
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown vector store backend: {backend}")
+    key = (backend, name)
+    with _lock:
+        store = _stores.get(key)
+        if store is not None:
+            _stores.move_to_end(key)
+            return store
+        store = _BACKENDS[backend](name, doc_id)
+        _stores[key] = store
+        while len(_stores) > _store_capacity:
+            _stores.popitem(last=False)
+    return store
+
+
+@contextmanager
+def reserved_stores(count: int) -> Iterator[None]:
+    """Keep at least ``count`` handles pooled until the block exits.
+
+    Corpus search opens every indexed document on each query; with a pool
+    smaller than the corpus, each query would evict and reopen handles.
+    Afterwards the pool shrinks back to ``STORE_CACHE_SIZE`` on the next
+    ``open_store``, so back-to-back corpus queries keep their handles.
+    """
+    global _store_capacity
+    with _lock:
+        _reservations.append(count)
+        _store_capacity = max([STORE_CACHE_SIZE, *_reservations])
+    try:
+        yield
+    finally:
+        with _lock:
+            _reservations.remove(count)
+            _store_capacity = max([STORE_CACHE_SIZE, *_reservations])
+
+
+def drop_store(name: str, backend: Optional[str] = None) -> None:
+    """Forget a pooled handle so the next ``open_store`` reloads it from disk."""
+    with _lock:
+        _stores.pop((backend or VECTOR_STORE_BACKEND, name), None)